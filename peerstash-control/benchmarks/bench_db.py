@@ -0,0 +1,102 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the per-call overhead of the DB layer.
+
+Compares opening a new connection for every query (how the DB layer used to
+work) with the per-thread connection of peerstash.core.db.
+
+    python -m benchmarks.bench_db [CALLS]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import timeit
+from contextlib import closing
+
+import peerstash.core.db as db
+from peerstash.core.db_migrations import migrate
+from peerstash.core.db_schemas import TaskRead
+
+SCHEMA = """
+    CREATE TABLE tasks (
+        name TEXT PRIMARY KEY,
+        include TEXT NOT NULL,
+        exclude TEXT,
+        hostname TEXT NOT NULL,
+        schedule TEXT NOT NULL,
+        retention TEXT NOT NULL,
+        prune_schedule TEXT NOT NULL,
+        last_run DATETIME,
+        last_exit_code INTEGER,
+        status TEXT DEFAULT 'new'
+    );
+    CREATE TABLE node_data (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        username TEXT,
+        invite_code TEXT
+    );
+    INSERT INTO node_data (id, username) VALUES (1, 'bench');
+    INSERT INTO tasks (name, include, hostname, schedule, retention, prune_schedule)
+    VALUES ('bench', '/mnt/peerstash_root/bench', 'peerstash-bench', '0 3 * * *', '7d', '0 4 * * 0');
+"""
+
+
+def get_task_new_connection(name: str):
+    with closing(
+        sqlite3.connect(db.DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
+    ) as conn:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {db.TASK_COLUMNS} FROM tasks WHERE name=?", (name,))
+            return TaskRead(*cursor.fetchone())
+
+
+def report(label: str, seconds: float, calls: int, unit: str = "call") -> float:
+    per_call = seconds / calls * 1e6
+    print(f"{label:<28} {per_call:8.1f} us/{unit}")
+    return per_call
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "peerstash.db")
+        with closing(sqlite3.connect(db.DB_PATH)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            migrate(conn)
+
+        before = report(
+            "connection per call",
+            timeit.timeit(lambda: get_task_new_connection("bench"), number=calls),
+            calls,
+        )
+        after = report(
+            "reused connection",
+            timeit.timeit(lambda: db.db_get_task("bench"), number=calls),
+            calls,
+        )
+        db.db_close()
+
+    print(f"{'speedup':<28} {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures mapping many task rows to objects.
+
+Compares validating each row with a pydantic model (how the DB layer used to
+map rows) with building the slotted dataclasses returned by peerstash.core.db.
+
+    python -m benchmarks.bench_rows [ROWS]
+"""
+
+import dataclasses
+import os
+import sqlite3
+import sys
+import tempfile
+import timeit
+from contextlib import closing
+from datetime import datetime
+
+from pydantic import create_model
+
+import peerstash.core.db as db
+from peerstash.core.db_migrations import migrate
+from peerstash.core.db_schemas import TaskRead
+from benchmarks.bench_db import SCHEMA, report
+
+# the pydantic model TaskRead used to be
+ValidatedTaskRead = create_model(
+    "ValidatedTaskRead",
+    **{f.name: (f.type, ...) for f in dataclasses.fields(TaskRead)},  # type: ignore
+)
+KEYS = [f.name for f in dataclasses.fields(TaskRead)]
+
+
+def list_tasks_validated() -> list:
+    with closing(sqlite3.connect(db.DB_PATH)) as conn:
+        results = conn.execute("SELECT * FROM tasks").fetchall()
+    return [
+        ValidatedTaskRead(**{key: res[i] for i, key in enumerate(KEYS)})
+        for res in results
+    ]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    runs = 10
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "peerstash.db")
+        with closing(sqlite3.connect(db.DB_PATH)) as conn:
+            conn.executescript(SCHEMA)
+            migrate(conn)
+            conn.executemany(
+                "INSERT INTO tasks (name, include, hostname, schedule, retention, prune_schedule, last_run, last_exit_code, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (f"task{i}", f"/mnt/peerstash_root/{i}", "peerstash-bench", "0 3 * * *", "7d", "0 4 * * 0", datetime.now(), 0, "idle")
+                    for i in range(rows)
+                ],
+            )
+            conn.commit()
+
+        assert len(db.db_list_tasks()) == len(list_tasks_validated()) == rows + 1
+        print(f"{rows} rows")
+        before = report(
+            "pydantic validation",
+            timeit.timeit(list_tasks_validated, number=runs),
+            runs * rows,
+            "row",
+        )
+        after = report(
+            "slotted dataclass",
+            timeit.timeit(db.db_list_tasks, number=runs),
+            runs * rows,
+            "row",
+        )
+        db.db_close()
+
+    print(f"{'speedup':<28} {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,14 +16,60 @@
 
 __version__ = "0.10.2"
 
-from typing import Annotated
+import importlib
+import os
+from typing import Annotated, Optional
 
 import typer
+from typer.core import TyperCommand, TyperGroup
+
+# subcommand -> module in peerstash.cli that defines it, in the order shown by --help.
+# modules are only imported when their command runs, so a command does not pay for
+# the dependencies of the others (restic, paramiko, requests, ...)
+COMMANDS = {
+    "setup": "cmd_setup",
+    "id": "cmd_id",
+    "register": "cmd_register",
+    "evict": "cmd_evict",
+    "schedule": "cmd_schedule",
+    "cancel": "cmd_cancel",
+    "restore": "cmd_restore",
+    "backup": "cmd_backup",
+    "prune": "cmd_prune",
+    "list": "cmd_list",
+    "snapshots": "cmd_snapshots",
+    "history": "cmd_history",
+    "peers": "cmd_peers",
+    "queue": "cmd_queue",
+    "status": "cmd_status",
+    "mount": "cmd_mount",
+    "unmount": "cmd_unmount",
+}
+# commands that a thin client (PEERSTASH_THIN_CLIENT=1) hands to peerstashd
+DAEMON_COMMANDS = ("backup", "prune", "snapshots")
+
+
+class LazyGroup(TyperGroup):
+    """
+    Command group that imports the module of a subcommand when it is looked up.
+    As a thin client, it forwards the commands that peerstashd can run instead.
+    """
+
+    thin_client = os.getenv("PEERSTASH_THIN_CLIENT", "0") not in ("", "0")
+
+    def list_commands(self, ctx: typer.Context) -> list[str]:
+        return list(COMMANDS)
+
+    def get_command(self, ctx: typer.Context, cmd_name: str) -> Optional[TyperCommand]:
+        if cmd_name not in COMMANDS:
+            return None
+        if self.thin_client and cmd_name in DAEMON_COMMANDS:
+            from peerstash.cli.thin import thin_command
 
-from peerstash.cli import (cmd_backup, cmd_cancel, cmd_evict, cmd_id, cmd_list,
-                           cmd_mount, cmd_peers, cmd_prune, cmd_register,
-                           cmd_restore, cmd_schedule, cmd_setup, cmd_snapshots,
-                           cmd_unmount)
+            return thin_command(cmd_name)
+        module = importlib.import_module(f"peerstash.cli.{COMMANDS[cmd_name]}")
+        # each module's app holds just its own command
+        return typer.main.get_command(module.app)
 
 
 def version_callback(value: bool):
@@ -33,7 +79,7 @@ def version_callback(value: bool):
 
 
 # Create the main cli app
-app = typer.Typer(help="PeerStash CLI Tool",no_args_is_help=True)
+app = typer.Typer(help="PeerStash CLI Tool", no_args_is_help=True, cls=LazyGroup)
 
 
 @app.callback(invoke_without_command=True)
@@ -54,23 +100,8 @@ def cli(
     pass
 
 
-
-# create subcommands for the main cli app
-app.command(name="setup")(cmd_setup.setup)
-app.command(name="id")(cmd_id.print_id)
-app.command(name="register")(cmd_register.register_peer)
-app.command(name="evict")(cmd_evict.evict_peer)
-app.command(name="schedule")(cmd_schedule.schedule)
-app.command(name="cancel")(cmd_cancel.cancel)
-app.command(name="restore")(cmd_restore.restore)
-app.command(name="backup")(cmd_backup.backup)
-app.command(name="prune")(cmd_prune.prune)
-app.command(name="list")(cmd_list.list)
-app.command(name="snapshots")(cmd_snapshots.snapshots)
-app.command(name="peers")(cmd_peers.peers)
-app.command(name="mount")(cmd_mount.mount)
-app.command(name="unmount")(cmd_unmount.unmount)
-
-
 def main():
+    from peerstash.core.logs import setup_logging
+
+    setup_logging()
     app()
@@ -25,14 +25,13 @@ app = typer.Typer()
 @app.command(name="backup")
 def backup(
     name: str = typer.Argument(..., help="Name of the backup task to run."),
-    offset: int = typer.Argument(0, help="Random delay in minutes."),
 ):
     """
     Runs a backup task. This is run automatically when scheduling a task.
     """
     check_setup()
     try:
-        run_backup(name, offset=offset)
+        run_backup(name)
         typer.secho(
             f"Backup task '{name}' completed.",
             fg=typer.colors.GREEN,
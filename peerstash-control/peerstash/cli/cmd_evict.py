@@ -20,7 +20,7 @@ import typer
 
 from peerstash.cli.utils import check_setup
 from peerstash.core import registration
-from peerstash.core.backup import remove_schedule
+from peerstash.core.backup import remove_schedules
 from peerstash.core.db import db_get_tasks_for_host, db_host_exists
 
 DEFAULT_QUOTA_GB = os.getenv("DEFAULT_QUOTA_GB", "10")
@@ -57,9 +57,7 @@ def evict_peer(
         registration.delete_peer(username)
 
         # cancel tasks
-        tasks = db_get_tasks_for_host(f"peerstash-{username}")
-        for task in tasks:
-            remove_schedule(task)
+        remove_schedules(db_get_tasks_for_host(f"peerstash-{username}"))
 
         typer.secho(
             f"Removed '{username}' from peers list.",
@@ -0,0 +1,129 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json as jsonlib
+from statistics import mean
+
+import typer
+
+from peerstash.cli.utils import check_setup
+from peerstash.core.db import db_get_task, db_list_task_runs
+from peerstash.core.db_schemas import TaskRunRead
+from peerstash.core.utils import duration_fmt, sizeof_fmt
+
+app = typer.Typer()
+
+
+def _throughput(run: TaskRunRead) -> float | None:
+    """Bytes processed per second of upload, None if the run did not upload."""
+    upload = run.phases.get("upload")
+    if run.kind != "backup" or not run.bytes_processed or not upload:
+        return None
+    return run.bytes_processed / upload
+
+
+def _trend(label: str, values: list[float], fmt) -> str | None:
+    """Compares the average of the newer half of the values with the older half."""
+    if len(values) < 2:
+        return None
+    half = len(values) // 2
+    before, recent = mean(values[:half]), mean(values[half:])
+    change = f" ({(recent - before) / before * 100:+.0f}%)" if before else ""
+    return f"{label}: {fmt(recent)} recently, {fmt(before)} before{change}"
+
+
+@app.command(name="history")
+def history(
+    name: str = typer.Argument(..., help="Name of the task."),
+    kind: str = typer.Option(
+        None, "--kind", "-k", help="Only show 'backup' or 'prune' runs"
+    ),
+    limit: int = typer.Option(20, "--limit", "-n", help="Number of runs to show"),
+    json: bool = typer.Option(False, "--json", "-j", help="Format in JSON"),
+):
+    """
+    Shows the latest backup and prune runs of a task and how their speed changes.
+    """
+    check_setup()
+    if kind not in (None, "backup", "prune"):
+        typer.secho(
+            f"Invalid kind '{kind}', must be 'backup' or 'prune'.",
+            fg=typer.colors.RED,
+            err=True,
+        )
+        raise typer.Exit(1)
+
+    try:
+        if db_get_task(name) is None:
+            typer.secho(f"Task '{name}' does not exist.", fg=typer.colors.RED, err=True)
+            raise typer.Exit(1)
+        runs = db_list_task_runs(name, kind, limit)
+    except typer.Exit:
+        raise
+    except Exception as e:
+        typer.secho(f"System Error: {e}", fg=typer.colors.RED, err=True)
+        raise typer.Exit(1)
+
+    if json:
+        typer.echo(jsonlib.dumps([r.model_dump(mode="json") for r in runs]))
+        return
+
+    if not runs:
+        typer.echo(f"Task '{name}' has not run yet.")
+        return
+
+    for run in runs:
+        line = f"{run.started:%Y-%m-%d %H:%M} {run.kind:<6}"
+        line += f" | {run.hostname.removeprefix('peerstash-')}"
+        line += f" {duration_fmt(run.duration)} ({run.exit_code})"
+        if run.bytes_processed is not None:
+            line += f" {sizeof_fmt(run.bytes_processed)} processed"
+        if run.bytes_added is not None:
+            line += f", {sizeof_fmt(run.bytes_added)} added"
+        throughput = _throughput(run)
+        if throughput is not None:
+            line += f", {sizeof_fmt(throughput)}/s"
+        typer.secho(
+            line, fg=typer.colors.GREEN if run.exit_code == 0 else typer.colors.RED
+        )
+        typer.secho(
+            "    "
+            + " ".join(f"{p}={duration_fmt(s)}" for p, s in run.phases.items()),
+            fg=typer.colors.CYAN,
+        )
+
+    # only successful runs are comparable
+    succeeded = [r for r in runs if r.exit_code == 0]
+    trends = [
+        _trend(
+            "Backup duration",
+            [r.duration for r in succeeded if r.kind == "backup"],
+            duration_fmt,
+        ),
+        _trend(
+            "Upload throughput",
+            [t for r in succeeded if (t := _throughput(r)) is not None],
+            lambda v: f"{sizeof_fmt(v)}/s",
+        ),
+        _trend(
+            "Prune duration",
+            [r.duration for r in succeeded if r.kind == "prune"],
+            duration_fmt,
+        ),
+    ]
+    for trend in trends:
+        if trend:
+            typer.secho(trend, fg=typer.colors.YELLOW)
@@ -91,6 +91,7 @@ def list(
         typer.secho(f"    exclusions= {task.exclude}", fg=typer.colors.BRIGHT_RED)
         typer.secho(f"    prune=      {task.prune_schedule}", fg=typer.colors.YELLOW)
         typer.secho(f"    retention=  {task.retention}", fg=typer.colors.BRIGHT_YELLOW)
+        typer.secho(f"    catch up=   {task.catch_up}", fg=typer.colors.BRIGHT_WHITE)
         if all:
             typer.secho(
                 f"    last run=   {task.last_run} ({task.last_exit_code})",
@@ -18,7 +18,8 @@ import typer
 
 from peerstash.cli.utils import check_setup
 from peerstash.core.db import db_get_user, db_list_hosts
-from peerstash.core.utils import get_disk_usage, sizeof_fmt
+from peerstash.core.sftp import SFTP_PORT, get_disk_usage
+from peerstash.core.utils import sizeof_fmt
 
 app = typer.Typer()
 
@@ -41,7 +42,7 @@ def peers():
         typer.secho(f"Error: unknown user.", fg=typer.colors.RED, err=True)
         raise typer.Exit(1)
     for host in hosts:
-        total, used, _ = get_disk_usage(user, host.hostname, 2022)
+        total, used, _ = get_disk_usage(user, host.hostname, SFTP_PORT)
         typer.echo(
             f"{host.hostname.removeprefix("peerstash-")} ({sizeof_fmt(used)} used / {sizeof_fmt(total)})"
         )
@@ -0,0 +1,49 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import typer
+
+from peerstash.cli.utils import check_setup
+from peerstash.core.utils import send_to_daemon
+
+app = typer.Typer()
+
+
+@app.command(name="queue")
+def queue():
+    """
+    Shows scheduled jobs that are waiting or running.
+    """
+    check_setup()
+    try:
+        status = send_to_daemon("queue_status")
+    except Exception as e:
+        typer.secho(f"Error: {e}", fg=typer.colors.RED, err=True)
+        raise typer.Exit(1)
+
+    typer.echo(
+        f"{status['depth']} job(s) waiting (average wait {status['average_wait']:.0f}s)"
+    )
+    for job in status["running"]:
+        typer.secho(
+            f"{job['task_name']} {job['kind']} | {job['peer'].removeprefix('peerstash-')} running for {job['running']:.0f}s",
+            fg=typer.colors.GREEN,
+        )
+    for job in status["pending"]:
+        typer.secho(
+            f"{job['task_name']} {job['kind']} | {job['peer'].removeprefix('peerstash-')} waiting for {job['waiting']:.0f}s",
+            fg=typer.colors.YELLOW,
+        )
@@ -51,6 +51,10 @@ def schedule(
             help="An exclusion regex pattern to ignore in the backup. Use this option multiple times to set multiple exclusion patterns."
         ),
     ] = None,
+    catch_up: str = typer.Option(
+        "once",
+        help="What to do with runs missed while the node was down: 'once' runs each missed backup and prune once, 'skip' waits for the next scheduled run.",
+    ),
     update: bool = typer.Option(
         False, "--update", "-u", help="Update the backup task if it exists."
     ),
@@ -79,7 +83,7 @@ def schedule(
             typer.secho(f"Creating new task {name}...", fg=typer.colors.GREEN)
 
         task_name = schedule_backup(
-            include, peer, retention, schedule, prune_schedule, exclude, name
+            include, peer, retention, schedule, prune_schedule, exclude, name, catch_up
         )
         typer.secho(
             f"Backup task '{task_name}' created.",
@@ -20,7 +20,7 @@ import typer
 
 from peerstash.cli.utils import check_setup
 from peerstash.core.backup import get_snapshots
-from peerstash.core.db import db_get_task
+from peerstash.core.db import db_get_task, db_list_tasks
 
 app = typer.Typer()
 
@@ -28,66 +28,77 @@ app = typer.Typer()
 @app.command(name="snapshots")
 def snapshots(
     name: str = typer.Argument(
-        ..., help="Name of the backup task to get snapshots from."
+        None, help="Name of the backup task to get snapshots from. Lists every task if omitted."
     ),
     snapshot: str = typer.Argument(None, help="Snapshot ID to get info from."),
     json: bool = typer.Option(False, "--json", "-j", help="Format in JSON"),
+    refresh: bool = typer.Option(
+        False, "--refresh", "-r", help="Reload the snapshots from the peer"
+    ),
 ):
     """
     Lists the snapshots taken for a task.
     """
     check_setup()
-    task = db_get_task(name)
-    if task is None:
-        typer.secho(
-            f"Task '{name}' does not exist.",
-            fg=typer.colors.RED,
-            err=True,
-        )
-        raise typer.Exit(1)
-
-    if task.status == "new":
-        typer.secho(
-            f"Repo for task '{name}' has not been backed up yet.",
-            fg=typer.colors.RED,
-            err=True,
-        )
-        raise typer.Exit(1)
+    if name is None:
+        tasks = [t for t in db_list_tasks() if t.status != "new"]
+    else:
+        task = db_get_task(name)
+        if task is None:
+            typer.secho(
+                f"Task '{name}' does not exist.",
+                fg=typer.colors.RED,
+                err=True,
+            )
+            raise typer.Exit(1)
 
-    try:
-        snapshot_list = get_snapshots(name, snapshot)
-    except Exception as e:
-        typer.secho(f"Error: {e}", fg=typer.colors.RED, err=True)
-        raise typer.Exit(1)
+        if task.status == "new":
+            typer.secho(
+                f"Repo for task '{name}' has not been backed up yet.",
+                fg=typer.colors.RED,
+                err=True,
+            )
+            raise typer.Exit(1)
+        tasks = [task]
 
     final_list: list[dict[str, str | list[str]]] = []
 
-    for s in snapshot_list:
-        date = datetime.fromisoformat(s["time"].replace(" ", ""))
-        if json:
-            final_list.append(
-                {
+    for task in tasks:
+        try:
+            snapshot_list = get_snapshots(task.name, snapshot, refresh)
+        except Exception as e:
+            typer.secho(f"Error: {e}", fg=typer.colors.RED, err=True)
+            raise typer.Exit(1)
+
+        for s in snapshot_list:
+            date = datetime.fromisoformat(s["time"].replace(" ", ""))
+            if json:
+                entry: dict[str, str | list[str]] = {
                     "short_id": s["short_id"],
                     "id": s["id"],
                     "date": f"{date}",
                     "includes": s["paths"],
                 }
-            )
-        else:
-            typer.secho(s["id"], fg=typer.colors.BRIGHT_WHITE)
-            typer.secho(
-                f"    Short ID: {s['short_id']}", fg=typer.colors.BRIGHT_MAGENTA
-            )
-            typer.secho(
-                f"    Date:     {date.strftime("%d %B %Y %I:%M:%S %p %Z")}",
-                fg=typer.colors.CYAN,
-            )
-            typer.secho(f"    Includes: ", fg=typer.colors.BRIGHT_GREEN)
-            for p in s["paths"]:
+                if name is None:
+                    entry["task"] = task.name
+                final_list.append(entry)
+            else:
+                typer.secho(s["id"], fg=typer.colors.BRIGHT_WHITE)
+                if name is None:
+                    typer.secho(f"    Task:     {task.name}", fg=typer.colors.YELLOW)
+                typer.secho(
+                    f"    Short ID: {s['short_id']}", fg=typer.colors.BRIGHT_MAGENTA
+                )
                 typer.secho(
-                    f"      - {p.replace('/mnt/peerstash_root','.')}",
-                    fg=typer.colors.GREEN,
+                    f"    Date:     {date.strftime("%d %B %Y %I:%M:%S %p %Z")}",
+                    fg=typer.colors.CYAN,
                 )
+                typer.secho(f"    Includes: ", fg=typer.colors.BRIGHT_GREEN)
+                for p in s["paths"]:
+                    typer.secho(
+                        f"      - {p.replace('/mnt/peerstash_root','.')}",
+                        fg=typer.colors.GREEN,
+                    )
 
     if json:
         typer.echo(f"{final_list}")
@@ -0,0 +1,100 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+import typer
+
+from peerstash.cli.utils import check_setup
+from peerstash.core.db import db_get_task, db_list_progress, db_list_tasks
+from peerstash.core.db_schemas import ProgressRead, TaskRead
+from peerstash.core.utils import duration_fmt, sizeof_fmt
+
+# seconds between polls of the database while following
+FOLLOW_INTERVAL = 2
+
+app = typer.Typer()
+
+
+def _format_status(task: TaskRead, progress: ProgressRead | None) -> str:
+    line = f"{task.name} [{task.status}]"
+    if task.status != "running" or progress is None:
+        return line
+    line += f" {progress.percent_done * 100:.1f}%"
+    line += f" {sizeof_fmt(progress.bytes_done)}"
+    if progress.total_bytes:
+        line += f"/{sizeof_fmt(progress.total_bytes)}"
+    line += f" {sizeof_fmt(progress.bytes_per_second)}/s"
+    line += f" {progress.files_done}"
+    if progress.total_files:
+        line += f"/{progress.total_files}"
+    line += " files"
+    if progress.eta_seconds is not None:
+        line += f" ETA {duration_fmt(progress.eta_seconds)}"
+    return line
+
+
+def _get_tasks(name: str | None) -> list[TaskRead]:
+    if name is None:
+        return db_list_tasks()
+    task = db_get_task(name)
+    if task is None:
+        raise ValueError(f"Task '{name}' not found.")
+    return [task]
+
+
+@app.command(name="status")
+def status(
+    name: str = typer.Argument(None, help="Name of the task. Shows all tasks if omitted."),
+    follow: bool = typer.Option(
+        False, "--follow", "-f", help="Keep printing progress until interrupted"
+    ),
+):
+    """
+    Shows the status and live backup progress of tasks.
+    """
+    check_setup()
+    seen: dict[str, tuple] = {}
+    try:
+        while True:
+            tasks = _get_tasks(name)
+            progress = {p.task_name: p for p in db_list_progress()}
+            for task in tasks:
+                current = progress.get(task.name)
+                # only print what changed since the last poll
+                key = (task.status, current.updated if current else None)
+                if seen.get(task.name) == key:
+                    continue
+                seen[task.name] = key
+                typer.secho(
+                    _format_status(task, current),
+                    fg=(
+                        typer.colors.GREEN
+                        if task.status == "running"
+                        else typer.colors.BRIGHT_WHITE
+                    ),
+                )
+            if not follow:
+                break
+            time.sleep(FOLLOW_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        typer.secho(f"Error: {e}", fg=typer.colors.RED, err=True)
+        raise typer.Exit(1)
+    except Exception as e:
+        typer.secho(f"System Error: {e}", fg=typer.colors.RED, err=True)
+        raise typer.Exit(1)
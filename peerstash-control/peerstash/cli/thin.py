@@ -0,0 +1,164 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, TextIO
+
+import typer
+from typer.core import TyperCommand
+
+from peerstash.core.ipc import ProtocolError, stream_request
+
+# thread id -> function receiving (stream name, text) written by that thread
+_sinks: dict[int, Callable[[str, str], None]] = {}
+
+
+# --- client ---
+
+
+def run_in_daemon(argv: list[str]) -> int:
+    """
+    Runs a CLI command inside peerstashd, printing its output as it arrives.
+    Returns the exit code of the command.
+    """
+
+    def on_message(message: dict[str, Any]) -> None:
+        stream = sys.stderr if message.get("stream") == "stderr" else sys.stdout
+        stream.write(message.get("output", ""))
+        stream.flush()
+
+    try:
+        response = stream_request("run_command", {"argv": argv}, on_message)
+    except (OSError, ProtocolError) as e:
+        typer.secho(
+            f"Error: peerstashd is not reachable ({e}). Unset PEERSTASH_THIN_CLIENT to run the command locally.",
+            fg=typer.colors.RED,
+            err=True,
+        )
+        return 1
+
+    if response["status"] == "error":
+        typer.secho(
+            f"Daemon Error: {response.get('message')}", fg=typer.colors.RED, err=True
+        )
+        return 1
+    return response.get("exit_code", 1)
+
+
+def thin_command(name: str) -> TyperCommand:
+    """
+    Builds a command that passes its arguments, unparsed, to `name` in peerstashd.
+    """
+    app = typer.Typer()
+
+    @app.command(
+        name=name,
+        help=f"Runs '{name}' in peerstashd (PEERSTASH_THIN_CLIENT is set).",
+        context_settings={
+            "allow_extra_args": True,
+            "ignore_unknown_options": True,
+            # --help is answered by the daemon too
+            "help_option_names": [],
+        },
+    )
+    def forward(ctx: typer.Context):
+        raise typer.Exit(run_in_daemon([name, *ctx.args]))
+
+    return typer.main.get_command(app)  # type: ignore[return-value]
+
+
+# --- daemon ---
+
+
+class ThreadOutput(io.TextIOBase):
+    """
+    Replaces stdout or stderr in the daemon. Text written by a thread that is
+    running a command for a client goes to that client, the rest to `stream`.
+    """
+
+    def __init__(self, stream: TextIO, name: str):
+        self._stream = stream
+        self.stream_name = name
+
+    @property
+    def encoding(self) -> str:  # type: ignore[override]
+        return getattr(self._stream, "encoding", "utf-8")
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return False
+
+    def write(self, text: str | bytes) -> int:
+        # click writes bytes to streams that have no binary buffer
+        if isinstance(text, bytes):
+            text = text.decode(self.encoding, errors="replace")
+        sink = _sinks.get(threading.get_ident())
+        if sink is None:
+            return self._stream.write(text)
+        sink(self.stream_name, text)
+        return len(text)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+def route_output() -> None:
+    """
+    Lets threads of this process send their output to a client with capture_output().
+    """
+    if not isinstance(sys.stdout, ThreadOutput):
+        sys.stdout = ThreadOutput(sys.stdout, "stdout")
+    if not isinstance(sys.stderr, ThreadOutput):
+        sys.stderr = ThreadOutput(sys.stderr, "stderr")
+
+
+@contextmanager
+def capture_output(sink: Callable[[str, str], None]) -> Iterator[None]:
+    """
+    Sends what the current thread prints to `sink` as (stream name, text).
+    """
+    ident = threading.get_ident()
+    _sinks[ident] = sink
+    try:
+        yield
+    finally:
+        del _sinks[ident]
+
+
+def run_cli(argv: list[str]) -> int:
+    """
+    Runs a CLI command in this process and returns its exit code.
+    """
+    from peerstash.cli import app
+
+    command = typer.main.get_command(app)
+    # never forward a command back to the daemon
+    command.thin_client = False  # type: ignore[attr-defined]
+    try:
+        command.main(args=argv, prog_name="peerstash")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        return 1
+    except Exception as e:
+        print(f"System Error: {e}", file=sys.stderr)
+        return 1
+    return 0
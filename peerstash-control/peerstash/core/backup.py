@@ -15,52 +15,272 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import errno
+import json
 import os
-import random
 import shutil
+import signal
 import subprocess
+import tempfile
 import time
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
 from pathlib import Path
 from subprocess import CalledProcessError
 from typing import Any, Optional
 
-import paramiko
-import restic
+import restic.errors
+
+from peerstash.core.db import (db_add_removal, db_add_snapshot, db_add_task,
+                               db_delete_removal, db_delete_task, db_get_task,
+                               db_get_user, db_get_verification,
+                               db_host_exists, db_list_removals,
+                               db_list_snapshots, db_set_progress,
+                               db_set_snapshots, db_set_verification,
+                               db_task_exists, db_update_task)
+from peerstash.core.db_schemas import (ProgressUpdate, SnapshotCreate,
+                                       TaskRead, TaskUpdate,
+                                       VerificationUpdate)
+from peerstash.core.restic_runner import ResticRunner, summary_numbers
+from peerstash.core.sftp import (SFTP_PORT, get_disk_usage,
+                                 invalidate_disk_usage, remove_tree)
+from peerstash.core.spans import Span
+from peerstash.core.task_state import TaskState
+from peerstash.core.utils import (CATCH_UP_POLICIES, Retention,
+                                  acquire_task_lock, generate_sha1, log,
+                                  logger, release_lock, send_batch_to_daemon,
+                                  send_to_daemon, validate_catch_up,
+                                  validate_paths, validate_retention,
+                                  validate_schedule, validate_task_name)
+
+# room left on the peer for pack files restic has not reported yet
+QUOTA_HEADROOM = 64 * 1024 * 1024
+RESTORE_ROOT = "/mnt/peerstash_restore"
+MOUNT_ROOT = "/tmp/peerstash_mnt"
+# backup progress is saved at most this often (seconds)
+PROGRESS_INTERVAL = 2
+# how long a manual run waits for a running job of the same task
+LOCK_TIMEOUT = 60 * 60
+
+
+def _positive_env(name: str, default: int) -> int:
+    """
+    Reads a setting that must be a positive integer, falling back to the
+    default if it is not.
+    """
+    value = os.getenv(name, str(default))
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        logger.warning(f"{name}={value} is not a positive integer, using {default}")
+        return default
+    return number
 
-from peerstash.core.db import (db_add_task, db_delete_task, db_get_task,
-                               db_get_user, db_host_exists, db_task_exists,
-                               db_update_task)
-from peerstash.core.db_schemas import TaskUpdate
-from peerstash.core.utils import (Retention, acquire_task_lock, generate_sha1,
-                                  get_disk_usage, log, logger, release_lock,
-                                  send_to_daemon, validate_paths,
-                                  validate_retention, validate_schedule,
-                                  validate_task_name)
 
-SFTP_PORT = 2022
+# the whole repo is read over this many days, split into this many slices
+VERIFY_PERIOD_DAYS = _positive_env("VERIFY_PERIOD_DAYS", 28)
+VERIFY_SLICES = _positive_env("VERIFY_SLICES", 14)
 
 
-def _verify_backup_size(name: str) -> tuple[int, int]:
+class QuotaExceededError(Exception):
+    """Raised when a backup is aborted because it would exceed the SFTPGo quota."""
+
+    def __init__(self, free_bytes: int, added_bytes: int):
+        self.free_bytes = free_bytes
+        self.added_bytes = added_bytes
+        super().__init__(
+            f"only {free_bytes} bytes available, but backup had already added {added_bytes} bytes"
+        )
+
+
+def _stream_backup(
+    name: str,
+    runner: ResticRunner,
+    paths: list[str],
+    exclude_patterns: Optional[list[str]],
+    free_bytes: int,
+) -> dict[str, Any]:
     """
-    Checks if a backup will exceed the SFTPGo quota. Must be run with root permissions to access password file.
+    Runs a restic backup while reading its JSON output, aborting before the data
+    added to the repo gets within QUOTA_HEADROOM of the free space on the peer.
+    Returns the restic summary. Must be run with root permissions to access password file.
     """
-    # pull info from DB
-    task = db_get_task(name)
-    if not task:
-        raise ValueError(f"Task '{name}' not found")
+    cmd = runner.command(
+        "backup",
+        *paths,
+        "--skip-if-unchanged",
+        # verbose status messages report the bytes each file added to the repo
+        "--verbose=2",
+    )
+    for pattern in exclude_patterns or []:
+        cmd.extend(["--exclude", pattern])
+
+    with Span("restic backup", dry_run=False) as span:
+        # resticpy only returns once the backup is done, call it directly to stream the output
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            text=True,
+        )
+
+        summary: dict[str, Any] = {}
+        errors: deque[str] = deque(maxlen=10)
+        added_bytes = 0
+        try:
+            _save_progress(name, ProgressUpdate())
+            last_progress = time.monotonic()
+            for line in process.stdout or []:
+                try:
+                    msg: Any = json.loads(line)
+                except json.JSONDecodeError:
+                    msg = None
+                if not isinstance(msg, dict):
+                    if line.strip():
+                        errors.append(line.strip())
+                    continue
+
+                match msg.get("message_type"):
+                    case "verbose_status":
+                        added_bytes += msg.get("data_size_in_repo", 0)
+                        added_bytes += msg.get("metadata_size_in_repo", 0)
+                        if added_bytes > 0 and added_bytes + QUOTA_HEADROOM > free_bytes:
+                            logger.warning(
+                                f"[{name}] Aborting backup: {added_bytes} bytes added, {free_bytes} bytes available"
+                            )
+                            # SIGINT lets restic remove its lock before exiting
+                            process.send_signal(signal.SIGINT)
+                            try:
+                                process.wait(timeout=60)
+                            except subprocess.TimeoutExpired:
+                                process.kill()
+                                process.wait()
+                            raise QuotaExceededError(free_bytes, added_bytes)
+                    case "status":
+                        now = time.monotonic()
+                        if now - last_progress >= PROGRESS_INTERVAL:
+                            last_progress = now
+                            _save_progress(name, _progress_from_status(msg))
+                    case "summary":
+                        summary = msg
+                        _save_progress(name, _progress_from_summary(msg))
+                    case "error":
+                        errors.append(str(msg.get("error", {}).get("message", msg)))
+
+            returncode = process.wait()
+        finally:
+            # restic must not outlive the job, e.g. when its output can't be read
+            if process.returncode is None:
+                process.kill()
+                process.wait()
+
+        if returncode != 0:
+            raise restic.errors.ResticFailedError(
+                f"Restic failed with exit code {returncode}: " + "\n".join(errors)
+            )
+
+        span.set(**summary_numbers(summary))
+        return summary
+
+
+def _progress_from_status(msg: dict[str, Any]) -> ProgressUpdate:
+    """
+    Converts a restic status message into the progress of a backup.
+    """
+    elapsed = msg.get("seconds_elapsed", 0)
+    bytes_done = msg.get("bytes_done", 0)
+    return ProgressUpdate(
+        percent_done=msg.get("percent_done", 0),
+        bytes_done=bytes_done,
+        total_bytes=msg.get("total_bytes"),
+        bytes_per_second=bytes_done / elapsed if elapsed else 0,
+        files_done=msg.get("files_done", 0),
+        total_files=msg.get("total_files"),
+        eta_seconds=msg.get("seconds_remaining"),
+    )
+
+
+def _progress_from_summary(msg: dict[str, Any]) -> ProgressUpdate:
+    """
+    Converts a restic summary message into the final progress of a backup.
+    """
+    duration = msg.get("total_duration", 0)
+    bytes_done = msg.get("total_bytes_processed", 0)
+    files_done = msg.get("total_files_processed", 0)
+    return ProgressUpdate(
+        percent_done=1,
+        bytes_done=bytes_done,
+        total_bytes=bytes_done,
+        bytes_per_second=bytes_done / duration if duration else 0,
+        files_done=files_done,
+        total_files=files_done,
+        eta_seconds=0,
+    )
+
+
+def _save_progress(name: str, progress: ProgressUpdate) -> None:
+    # progress is only informational, never fail a backup over it
+    try:
+        db_set_progress(name, progress)
+    except Exception as e:
+        logger.warning(f"[{name}] Could not save backup progress: {e}")
+
+
+def _verify_repo(name: str, runner: ResticRunner) -> bool:
+    """
+    Checks the structure of a repo using the local cache. When due, also reads the
+    next slice of pack files so the whole repo is read once every VERIFY_PERIOD_DAYS.
+    Must be run with root permissions to access password file.
+    """
+    now = datetime.now()
+    verification = db_get_verification(name)
+
+    # restart the rotation if the number of slices changed
+    cursor = 0
+    last_data_check = None
+    if verification and verification.slices == VERIFY_SLICES:
+        cursor = verification.cursor
+        last_data_check = verification.last_data_check
+
+    interval = timedelta(days=VERIFY_PERIOD_DAYS) / VERIFY_SLICES
+    data_check = last_data_check is None or now - last_data_check >= interval
+    subset = None
+    if data_check:
+        subset = f"{cursor % VERIFY_SLICES + 1}/{VERIFY_SLICES}"
+        log(f"[{name}] Reading data subset {subset}...")
+
+    try:
+        runner.check(read_data_subset=subset)
+    except CalledProcessError as e:
+        logger.error(f"[{name}] Repo check failed: {e.stderr}")
+        return False
 
-    # get free space in SFTP server
-    free_bytes = get_disk_usage(db_get_user(), task.hostname, SFTP_PORT)[2]
+    update = VerificationUpdate(slices=VERIFY_SLICES, last_check=now)
+    if data_check:
+        update.cursor = (cursor + 1) % VERIFY_SLICES
+        update.last_data_check = now
+    db_set_verification(name, update)
+    return True
 
-    # get added bytes
-    res = run_backup(name, True)
-    if res is None:
-        raise RuntimeError("Failed to get added bytes from dry run.")
-    added_bytes: int = res["data_added"]
 
-    # return true if there will be space after the backup (for pruning purposes)
-    return (free_bytes, added_bytes)
+def _sync_snapshots(name: str, runner: ResticRunner) -> None:
+    """
+    Reloads the cached snapshots of a task from its repo.
+    """
+    db_set_snapshots(
+        name,
+        [
+            SnapshotCreate(
+                id=s["id"],
+                short_id=s["short_id"],
+                time=s["time"],
+                paths="|".join(s.get("paths", [])),
+            )
+            for s in runner.snapshots()
+        ],
+    )
 
 
 def _init_repo(name: str) -> None:
@@ -73,9 +293,7 @@ def _init_repo(name: str) -> None:
         raise ValueError(f"Task '{name}' not found")
 
     # initialize repo
-    restic.repository = f"sftp://{db_get_user()}@{task.hostname}:{SFTP_PORT}/{task.name}"
-    restic.password_file = "/var/lib/peerstash/restic_password"
-    restic.init()
+    ResticRunner.for_task(task).init()
 
 
 def schedule_backup(
@@ -86,6 +304,7 @@ def schedule_backup(
     prune_schedule: str = "0 4 * * 0",  # default to weekly prunes at 4AM (local time)
     exclude_patterns: Optional[str | list[str]] = None,
     name: Optional[str] = None,
+    catch_up: str = "once",  # default to running missed jobs once
 ) -> str:
     """
     Schedules a recurring backup.
@@ -132,13 +351,19 @@ def schedule_backup(
     if not validate_schedule(prune_schedule):
         raise ValueError(f"cron prune schedule '{schedule}' is invalid.")
 
+    # validate catch-up policy
+    if not validate_catch_up(catch_up):
+        raise ValueError(
+            f"Catch-up policy '{catch_up}' invalid. Use one of: {', '.join(CATCH_UP_POLICIES)}"
+        )
+
     # validate retention amount
     if retention_error := validate_retention(retention):
         raise ValueError(
             f"Retention '{retention}' invalid: {retention_error}. E.g. '1y2m3w4d5h6r'"
         )
 
-    logger.info(f"[{name}] Creating scheduled task: include={include}, exclude={exclude}, hostname={hostname}, schedule={schedule}, retention={retention}, prune_schedule={prune_schedule}")
+    logger.info(f"[{name}] Creating scheduled task: include={include}, exclude={exclude}, hostname={hostname}, schedule={schedule}, retention={retention}, prune_schedule={prune_schedule}, catch_up={catch_up}")
 
     # insert into db
     if db_task_exists(name):
@@ -151,18 +376,24 @@ def schedule_backup(
                 schedule=schedule,
                 retention=retention,
                 prune_schedule=prune_schedule,
+                catch_up=catch_up,
             ),
         )
     else:
         db_add_task(
-            name, include, exclude, hostname, schedule, retention, prune_schedule
+            name, include, exclude, hostname, schedule, retention, prune_schedule, catch_up
         )
 
-    # create or update cronjob
+    # create or update scheduled jobs
     try:
         send_to_daemon(
             "create_task",
-            {"task_name": name, "schedule": schedule, "prune_schedule": prune_schedule},
+            {
+                "task_name": name,
+                "schedule": schedule,
+                "prune_schedule": prune_schedule,
+                "catch_up": catch_up,
+            },
         )
     except RuntimeError as e:
         raise RuntimeError(f"Failed to create backup task ({e})")
@@ -172,18 +403,10 @@ def schedule_backup(
     return name
 
 
-def run_backup(
-    name: str, dry_run: bool = False, offset: int = 0
-) -> Optional[dict[str, Any]]:
+def run_backup(name: str) -> dict[str, Any]:
     """
     Runs a backup. 
     """
-    # randomly wait up to <offset> minutes
-    wait = random.randint(0, offset * 60)
-    if wait > 0:
-        log(f"[{name}] Starting backup in {wait}s")
-    time.sleep(wait)
-
     # pull info from DB
     task = db_get_task(name)
     if not task:
@@ -193,123 +416,123 @@ def run_backup(
     # parse include and exclude delimited strings
     paths = task.include.split("|")
     exclude_patterns = task.exclude.split("|") if task.exclude else None
-
-    # if dry run, just return the added bytes
-    if dry_run:
-        log(f"[{name}] Calculating added bytes...")
-        restic.repository = f"sftp://{db_get_user()}@{task.hostname}:{SFTP_PORT}/{task.name}"
-        restic.password_file = "/var/lib/peerstash/restic_password"
-        res = restic.backup(
-            paths=paths, exclude_patterns=exclude_patterns, dry_run=True
-        )
-        return res
+    runner = ResticRunner.for_task(task)
 
     try:
-        _lock = acquire_task_lock(name)
+        with Span("lock") as waited:
+            _lock = acquire_task_lock(name, timeout=LOCK_TIMEOUT)
     except Exception as e:
         logger.warning(f"Attempted backup task for '{name}' but could not acquire lock.")
         raise RuntimeError(e)
 
     logger.info(f"[{name}] Starting backup task...")
+    init = task.status == "new"
+    state = TaskState(task, "backup", waited)
+    # the lock is always released, and a job that stopped on an unexpected
+    # error still ends with a failed status
+    try:
+        state.start()
 
-    # initialize repo
-    init = False
-    if task.status == "new":
-        init = True
-        log(f"[{name}] First run, initializing repo...")
-        db_update_task(
-            task.name,
-            TaskUpdate(last_run=datetime.now(), last_exit_code=-1, status="init"),
-        )
+        # initialize repo
+        if init:
+            log(f"[{name}] First run, initializing repo...")
+            state.phase("init")
+            try:
+                _init_repo(name)
+            except Exception as e:
+                state.finish(1, status="new")
+                _sftp_recursive_remove(task.hostname, task.name)
+                logger.error(f"Attempted backup task for '{name}' but could not initialize repo: {e}")
+                raise RuntimeError(f"Failed to initialize repo ({e})")
+
+        # get free space in SFTP server
+        state.phase("space_check")
+        free_space = get_disk_usage(db_get_user(), task.hostname, SFTP_PORT)[2]
+
+        # run backup, aborting before the peer's quota is hit
+        log(f"[{name}] Running backup task...")
+        state.phase("upload")
+        res = None
+        retry = False
         try:
-            _init_repo(name)
+            res = _stream_backup(name, runner, paths, exclude_patterns, free_space)
+        except QuotaExceededError as e:
+            if init:
+                _sftp_recursive_remove(task.hostname, task.name)
+                # the repo was removed, initialize it again on the next run
+                state.finish(2, status="new")
+                logger.error(f"Attempted backup task for '{name}' but could not create initial backup: {e}")
+                raise RuntimeError(
+                    f"Not enough storage to create initial backup for task '{name}' ({e})"
+                )
+            # attempt to prune, leaving only 1 snapshot (also removes the aborted upload)
+            log(f"[{name}] Not enough free space, attempting to prune...")
+            state.phase("prune")
+            prune_repo(name, "1r", repack=False)
+            retry = True
         except Exception as e:
-            release_lock(_lock)
-            db_update_task(task.name, TaskUpdate(last_exit_code=1, status="new"))
-            _sftp_recursive_remove(task.hostname, task.name)
-            logger.error(f"Attempted backup task for '{name}' but could not initialize repo: {e}")
-            raise RuntimeError(f"Failed to initialize repo ({e})")
-
-    db_update_task(
-        task.name,
-        TaskUpdate(last_run=datetime.now(), last_exit_code=-1, status="started"),
-    )
-
-    # dry run first to see if there's enough storage
-    log(f"[{name}] Verifying free space...")
-    db_update_task(task.name, TaskUpdate(status="space_check"))
-    free_space, backup_size = _verify_backup_size(name)
-    if free_space < backup_size:
-        if init:
-            _sftp_recursive_remove(task.hostname, task.name)
-            release_lock(_lock)
-            db_update_task(task.name, TaskUpdate(last_exit_code=2, status="idle"))
-            logger.error(f"Attempted backup task for '{name}' but could not create initial backup: only {free_space} bytes available, but size is {backup_size}")
-            raise RuntimeError(
-                f"Not enough storage to create initial backup for task '{name}' (only {free_space} bytes available, but size is {backup_size})"
-            )
-        # attempt to prune, leaving only 1 snapshot
-        log(f"[{name}] Not enough free space, attempting to prune...")
-        prune_repo(name, "1r", repack=False)
-        free_space_2, backup_size_2 = _verify_backup_size(name)
-        if free_space_2 < backup_size_2:
-            release_lock(_lock)
-            db_update_task(task.name, TaskUpdate(last_exit_code=2, status="idle"))
-            logger.error(f"Attempted backup task for '{name}' but not enough storage: only {free_space_2} bytes available, but size is {backup_size_2}")
-            raise RuntimeError(
-                f"Not enough storage to complete task '{name}' (only {free_space_2} bytes available, but size is {backup_size_2})"
+            state.finish(3)
+            logger.error(f"Attempted backup task for '{name}' but failed: {e}")
+            raise RuntimeError(f"[{name}] Backup failed! ({e})")
+        finally:
+            # the upload changed the used space on the peer
+            invalidate_disk_usage(task.hostname)
+
+        if retry:
+            log(f"[{name}] Running backup task again after prune...")
+            state.resume()
+            state.phase("space_check")
+            free_space = get_disk_usage(db_get_user(), task.hostname, SFTP_PORT)[2]
+            state.phase("upload")
+            try:
+                res = _stream_backup(name, runner, paths, exclude_patterns, free_space)
+            except QuotaExceededError as e:
+                state.finish(2)
+                logger.error(f"Attempted backup task for '{name}' but not enough storage: {e}")
+                raise RuntimeError(f"Not enough storage to complete task '{name}' ({e})")
+            except Exception as e:
+                state.finish(3)
+                logger.error(f"Attempted backup task for '{name}' but failed: {e}")
+                raise RuntimeError(f"[{name}] Backup failed! ({e})")
+            finally:
+                invalidate_disk_usage(task.hostname)
+
+        # cache the new snapshot so listing snapshots does not need the peer
+        if res and res.get("snapshot_id"):
+            db_add_snapshot(
+                name,
+                SnapshotCreate(
+                    id=res["snapshot_id"],
+                    short_id=res["snapshot_id"][:8],
+                    time=res.get("backup_start") or datetime.now().astimezone().isoformat(),
+                    paths="|".join(paths),
+                ),
             )
 
-    # run backup
-    log(f"[{name}] Running backup task...")
-    db_update_task(task.name, TaskUpdate(status="running"))
-    restic.repository = f"sftp://{db_get_user()}@{task.hostname}:{SFTP_PORT}/{task.name}"
-    restic.password_file = "/var/lib/peerstash/restic_password"
-    res = None
-    try:
-        res = restic.backup(
-            paths=paths,
-            exclude_patterns=exclude_patterns,
-            dry_run=False,
-            scan=False,
-            skip_if_unchanged=True,
-        )
-    except Exception as e:
-        release_lock(_lock)
-        db_update_task(task.name, TaskUpdate(last_exit_code=3, status="idle"))
-        logger.error(f"Attempted backup task for '{name}' but failed: {e}")
-        raise RuntimeError(f"[{name}] Backup failed! ({e})")
-
-    log(f"[{name}] Checking repo...")
-    db_update_task(task.name, TaskUpdate(status="checking"))
-    if not restic.check():
-        release_lock(_lock)
-        db_update_task(task.name, TaskUpdate(last_exit_code=4, status="idle"))
-        logger.error(f"Repository for '{name}' is not healthy. Check failed.")
-        raise RuntimeError(f"[{name}] Repository '{restic.repository}' is corrupted.")
-    log(f"[{name}] Repo healthy. Backup complete.")
+        log(f"[{name}] Checking repo...")
+        state.phase("check")
+        if not _verify_repo(name, runner):
+            state.finish(4, res)
+            logger.error(f"Repository for '{name}' is not healthy. Check failed.")
+            raise RuntimeError(f"[{name}] Repository '{runner.repository}' is corrupted.")
+        log(f"[{name}] Repo healthy. Backup complete.")
 
-    release_lock(_lock)
-    db_update_task(task.name, TaskUpdate(last_exit_code=0, status="idle"))
+        state.finish(0, res)
 
-    return res
+        return res
+    finally:
+        state.abort(3)
+        release_lock(_lock)
 
 
 def prune_repo(
     name: str,
     forced_retention: Optional[str] = None,
-    offset: int = 0,
     repack: bool = True,
 ) -> None:
     """
     Prunes a repo according to retention policy. 
     """
-    # randomly wait up to <offset> minutes
-    wait = random.randint(0, offset * 60)
-    if wait > 0:
-        log(f"[{name}] Starting prune in {wait}s")
-    time.sleep(wait)
-
     # pull info from DB
     task = db_get_task(name)
     if not task:
@@ -323,7 +546,8 @@ def prune_repo(
     logger.info(f"[{name}] Starting prune task...")
 
     try:
-        _lock = acquire_task_lock(name)
+        with Span("lock") as waited:
+            _lock = acquire_task_lock(name, timeout=LOCK_TIMEOUT)
     except Exception as e:
         logger.warning(f"Attempted prune task for '{name}' but could not acquire lock.")
         raise RuntimeError(e)
@@ -334,77 +558,93 @@ def prune_repo(
 
     # run forget and prune
     log(f"[{name}] Running prune (keeping {retention} snapshots)...")
-    db_update_task(
-        task.name,
-        TaskUpdate(last_run=datetime.now(), last_exit_code=-1, status="pruning"),
-    )
-    restic.repository = f"sftp://{db_get_user()}@{task.hostname}:{SFTP_PORT}/{task.name}"
-    restic.password_file = "/var/lib/peerstash/restic_password"
+    state = TaskState(task, "prune", waited)
     try:
-        restic.forget(
-            keep_last=policy.recent,
-            keep_hourly=policy.hourly,
-            keep_daily=policy.daily,
-            keep_weekly=policy.weekly,
-            keep_monthly=policy.monthly,
-            keep_yearly=policy.yearly,
-            prune=repack,
-        )
-    except Exception as e:
-        release_lock(_lock)
-        db_update_task(task.name, TaskUpdate(last_exit_code=5, status="idle"))
-        logger.error(f"Attempted prune task for '{name}' but failed: {e}")
-        raise RuntimeError(f"Failed to prune for task '{task.name}' ({e})")
+        state.start()
+        runner = ResticRunner.for_task(task)
+        state.phase("forget")
+        try:
+            runner.forget(
+                keep_last=policy.recent,
+                keep_hourly=policy.hourly,
+                keep_daily=policy.daily,
+                keep_weekly=policy.weekly,
+                keep_monthly=policy.monthly,
+                keep_yearly=policy.yearly,
+                prune=repack,
+            )
+        except Exception as e:
+            state.finish(5)
+            logger.error(f"Attempted prune task for '{name}' but failed: {e}")
+            raise RuntimeError(f"Failed to prune for task '{task.name}' ({e})")
+        finally:
+            # pruning frees space on the peer
+            invalidate_disk_usage(task.hostname)
+
+        # forgotten snapshots must not be listed anymore
+        state.phase("sync_snapshots")
+        try:
+            _sync_snapshots(name, runner)
+        except Exception as e:
+            logger.warning(f"[{name}] Could not refresh cached snapshots: {e}")
 
-    if repack:
-        release_lock(_lock)
-        logger.info(f"[{name}] Prune successful.")
-        db_update_task(task.name, TaskUpdate(last_exit_code=0, status="idle"))
-        return
+        if repack:
+            logger.info(f"[{name}] Prune successful.")
+            state.finish(0)
+            return
 
-    logger.warning(f"[{name}] Pruning repo with max-repack-size of 0")
-    try:
-        # resticpy does not have support for the prune command, call it directly
-        db_update_task(task.name, TaskUpdate(status="pruning_strict"))
-        subprocess.run(
-            ["/usr/bin/restic", "prune", "--max-repack-size", "0"], check=True
-        )
-    except CalledProcessError as e:
-        release_lock(_lock)
-        db_update_task(task.name, TaskUpdate(last_exit_code=5, status="idle"))
-        logger.warning(f"Attempted prune task for '{name}' but failed: {e}")
-        raise RuntimeError(f"Failed to prune for task '{task.name}' ({e})")
+        logger.warning(f"[{name}] Pruning repo with max-repack-size of 0")
+        try:
+            state.phase("repack")
+            runner.prune(max_repack_size="0")
+        except CalledProcessError as e:
+            state.finish(5)
+            logger.warning(f"Attempted prune task for '{name}' but failed: {e}")
+            raise RuntimeError(f"Failed to prune for task '{task.name}' ({e})")
+        finally:
+            invalidate_disk_usage(task.hostname)
 
-    release_lock(_lock)
-    logger.info(f"[{name}] Prune successful.")
-    db_update_task(task.name, TaskUpdate(last_exit_code=0, status="idle"))
+        logger.info(f"[{name}] Prune successful.")
+        state.finish(0)
+    finally:
+        state.abort(5)
+        release_lock(_lock)
 
 
 def _sftp_recursive_remove(hostname: str, path: str):
-    def _rm(path: str):
-        files = sftp.listdir(path)
+    """
+    Removes a folder from a peer. The removal stays recorded in the database
+    until it finishes, so an interrupted removal is resumed by the daemon.
+    """
+    db_add_removal(hostname, path)
 
-        for f in files:
-            filepath = os.path.join(path, f)
-            try:
-                sftp.remove(filepath)
-            except IOError:
-                _rm(filepath)
+    def _progress(removed: int, total: int):
+        log(f"Removed {removed}/{total} files from '{path}' on {hostname}")
 
-        sftp.rmdir(path)
+    try:
+        remove_tree(hostname, path, progress=_progress)
+    finally:
+        invalidate_disk_usage(hostname)
 
-    user = db_get_user()
-    if not user:
-        raise ValueError("Unknown USER")
+    db_delete_removal(hostname, path)
 
-    ssh = paramiko.SSHClient()
-    ssh.load_host_keys(f"/home/{user}/.ssh/known_hosts")
-    ssh.connect(
-        hostname, port=2022, username=user, key_filename=f"/home/{user}/.ssh/id_ed25519"
-    )
-    sftp = ssh.open_sftp()
 
-    _rm(path)
+def resume_removals() -> None:
+    """
+    Finishes removing folders from peers that were interrupted.
+    """
+    for removal in db_list_removals():
+        # the folder of a task that was created again must not be touched
+        task = db_get_task(removal.path)
+        if task and task.hostname == removal.hostname and task.status != "new":
+            db_delete_removal(removal.hostname, removal.path)
+            continue
+
+        logger.info(f"Resuming removal of '{removal.path}' from {removal.hostname}...")
+        try:
+            _sftp_recursive_remove(removal.hostname, removal.path)
+        except Exception as e:
+            logger.error(f"Failed to remove '{removal.path}' from {removal.hostname}: {e}")
 
 
 def remove_schedule(name: str) -> None:
@@ -419,7 +659,7 @@ def remove_schedule(name: str) -> None:
     
     logger.info(f"[{name}] Removing task...")
 
-    # remove from crontab
+    # remove from scheduler
     try:
         send_to_daemon(
             "remove_task",
@@ -429,6 +669,48 @@ def remove_schedule(name: str) -> None:
         logger.error(f"Attempted to cancel task '{name}' failed: {e}")
         raise RuntimeError(f"Failed to remove task '{name}' ({e})")
 
+    _purge_task(task)
+
+
+def remove_schedules(names: list[str]) -> None:
+    """
+    Removes several backup tasks from the scheduler in a single daemon request.
+    """
+    tasks = []
+    for name in names:
+        task = db_get_task(name)
+        if not task:
+            logger.warning(f"Attempted to cancel task '{name}' but not found in database.")
+            raise ValueError(f"Task '{name}' not found")
+        tasks.append(task)
+    if not tasks:
+        return
+
+    logger.info(f"Removing {len(tasks)} tasks...")
+
+    # remove from scheduler
+    try:
+        results = send_batch_to_daemon(
+            [("remove_task", {"task_name": task.name}) for task in tasks]
+        )
+    except RuntimeError as e:
+        logger.error(f"Attempted to cancel tasks failed: {e}")
+        raise RuntimeError(f"Failed to remove tasks ({e})")
+    for task, result in zip(tasks, results):
+        if result.get("status") == "error":
+            logger.error(f"Attempted to cancel task '{task.name}' failed: {result.get('message')}")
+            raise RuntimeError(f"Failed to remove task '{task.name}' ({result.get('message')})")
+
+    for task in tasks:
+        _purge_task(task)
+
+
+def _purge_task(task: TaskRead) -> None:
+    """
+    Deletes an unscheduled task from the database and its folder from the SFTP server.
+    """
+    name = task.name
+
     # remove from db
     if not db_delete_task(name):
         logger.error(f"Attempted to cancel task '{name}' but failed to remove from database.")
@@ -467,57 +749,98 @@ def restore_snapshot(
         else snapshot
     )
     folder = f"{name}_{t}"
-    final_folder = f"/mnt/peerstash_restore/{folder}"
-
-    # delete temp folder
-    temp_folder = "/tmp/peerstash/restore"
-    if os.path.exists(temp_folder):
-        shutil.rmtree(temp_folder)
 
-    # restore to the temp folder, copy to the final folder
-    restic.repository = f"sftp://{db_get_user()}@{task.hostname}:{SFTP_PORT}/{task.name}"
-    restic.password_file = "/var/lib/peerstash/restic_password"
+    # restore to a staging folder on the same filesystem so the final move is a rename
+    staging_folder = tempfile.mkdtemp(prefix=".restore-", dir=RESTORE_ROOT)
+    runner = ResticRunner.for_task(task)
     try:
-        logger.info(f"[{name}] Restoring snapshot {snapshot} to {temp_folder}...")
-        restic.restore(
+        logger.info(f"[{name}] Restoring snapshot {snapshot} to {staging_folder}...")
+        runner.restore(
             snapshot_id=snapshot,
             include=include,
             exclude=exclude,
-            target_dir=temp_folder,
+            target_dir=staging_folder,
         )
         # move the actual backed up items to the folder
-        logger.info(f"[{name}] Moving restored files to {final_folder}...")
-        if os.path.exists(final_folder):
-            final_folder = (
-                f"{final_folder}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}"
-            )
-        shutil.move(f"{temp_folder}/mnt/peerstash_root", final_folder)
+        folder = _reserve_restore_folder(folder)
+        logger.info(f"[{name}] Moving restored files to {RESTORE_ROOT}/{folder}...")
+        os.rename(
+            f"{staging_folder}/mnt/peerstash_root", f"{RESTORE_ROOT}/{folder}"
+        )
     except Exception as e:
         logger.error(f"Attempted to restore snapshot '{snapshot}' for task '{name}' but failed: {e}")
         raise Exception(
             f"Failed to restore snapshot '{snapshot}' for task '{name}' ({e})"
         )
     finally:
-        if os.path.exists(temp_folder):
-            shutil.rmtree(temp_folder)
+        shutil.rmtree(staging_folder, ignore_errors=True)
 
     logger.info(f"[{name}] Restored snapshot {snapshot} in {folder}")
     return folder
 
 
-def get_snapshots(name: str, snapshot: Optional[str] = None) -> list[dict[Any, Any]]:
+def _reserve_restore_folder(folder: str) -> str:
+    """
+    Creates an empty restore folder with a name no other restore is using.
+    Renaming the restored files onto it replaces it atomically.
+    """
+    candidates = [
+        folder,
+        f"{folder}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}",
+    ]
+    for candidate in candidates:
+        try:
+            os.mkdir(f"{RESTORE_ROOT}/{candidate}")
+            return candidate
+        except FileExistsError:
+            continue
+
+    # two restores of the same snapshot in the same second
+    suffix = 1
+    while True:
+        candidate = f"{candidates[-1]}_{suffix}"
+        try:
+            os.mkdir(f"{RESTORE_ROOT}/{candidate}")
+            return candidate
+        except FileExistsError:
+            suffix += 1
+
+
+def get_snapshots(
+    name: str, snapshot: Optional[str] = None, refresh: bool = False
+) -> list[dict[Any, Any]]:
+    """
+    Lists the snapshots of a task from the local cache. The cache is loaded
+    from the repo if it is empty or `refresh` is set.
+    """
     # pull info from DB
     task = db_get_task(name)
     if not task:
         raise ValueError(f"Task '{name}' not found")
 
-    # get snapshots
-    restic.repository = f"sftp://{db_get_user()}@{task.hostname}:{SFTP_PORT}/{task.name}"
-    restic.password_file = "/var/lib/peerstash/restic_password"
-    try:
-        return restic.snapshots(snapshot_id=snapshot)
-    except Exception as e:
-        raise Exception(f"Failed to get snapshots for task '{name}' ({e})")
+    cached = db_list_snapshots(name)
+    if refresh or not cached:
+        try:
+            _sync_snapshots(name, ResticRunner.for_task(task))
+        except Exception as e:
+            raise Exception(f"Failed to get snapshots for task '{name}' ({e})")
+        cached = db_list_snapshots(name)
+
+    snapshots = [
+        {
+            "id": s.id,
+            "short_id": s.short_id,
+            "time": s.time,
+            "paths": s.paths.split("|") if s.paths else [],
+        }
+        for s in cached
+    ]
+
+    if snapshot == "latest":
+        return snapshots[-1:]
+    if snapshot:
+        return [s for s in snapshots if s["id"].startswith(snapshot)]
+    return snapshots
 
 
 def mount_task(name: str) -> None:
@@ -536,27 +859,16 @@ def mount_task(name: str) -> None:
     logger.info(f"[{name}] Mounting repo...")
 
     # create folder name based on task name
-    mount_point = f"/tmp/peerstash_mnt/{name}"
+    mount_point = os.path.join(MOUNT_ROOT, name)
     if not os.path.exists(mount_point):
         os.mkdir(mount_point)
 
     # mount the repo
-    restic_repo = f"sftp://{db_get_user()}@{task.hostname}:{SFTP_PORT}/{task.name}"
-    restic_password_file = "/var/lib/peerstash/restic_password"
+    runner = ResticRunner.for_task(task)
     try:
         # resticpy does not have support for the mount command, call it directly (in the background)
         subprocess.Popen(
-            [
-                "/usr/bin/restic",
-                "mount",
-                "--allow-other",
-                "--no-lock",
-                "-r",
-                restic_repo,
-                "--password-file",
-                restic_password_file,
-                mount_point,
-            ],
+            runner.command("mount", "--allow-other", "--no-lock", mount_point),
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
             stdin=subprocess.DEVNULL,
@@ -574,7 +886,7 @@ def unmount_task(name: str) -> None:
     Unmounts the repo for a task.
     """
     logger.info(f"[{name}] Unmounting repo...")
-    mount_point = f"/tmp/peerstash_mnt/{name}"
+    mount_point = os.path.join(MOUNT_ROOT, name)
 
     # lazy unmount, errors do not need to be caught
     subprocess.run(["fusermount", "-uz", mount_point], capture_output=True)
@@ -14,20 +14,75 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import dataclasses
+import json
 import sqlite3
-from contextlib import closing
-from typing import Any, Optional
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator, Optional
 
 import os
 from peerstash.core.db_schemas import *
 
 DEFAULT_DB_PATH = "/var/lib/peerstash/peerstash.db"
 DB_PATH = os.getenv("PEERSTASH_DB_PATH", DEFAULT_DB_PATH)
+# how long a query waits for another process to release its write lock (seconds)
+BUSY_TIMEOUT = float(os.getenv("PEERSTASH_DB_BUSY_TIMEOUT", "30"))
+# compiled statements kept per connection, enough for every query in this module
+STATEMENT_CACHE_SIZE = 256
+
+# columns in the order of the dataclass fields, so rows map positionally
+HOST_COLUMNS = ", ".join(f.name for f in dataclasses.fields(HostRead))
+TASK_COLUMNS = ", ".join(f.name for f in dataclasses.fields(TaskRead))
+
+# sqlite connections may not be shared between threads, so each thread keeps its own
+_local = threading.local()
+
+# store datetimes as ISO 8601 (the format of the deprecated default adapter) and
+# parse DATETIME columns back, so rows need no validation to get datetimes
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter(
+    "DATETIME", lambda value: datetime.fromisoformat(value.decode())
+)
+
+
+def _open_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    # readers never block the writer (and the other way around) in WAL mode
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@contextmanager
+def _connection() -> Iterator[sqlite3.Connection]:
+    """Yields the connection of the current thread, opening it on first use."""
+    conn: Optional[sqlite3.Connection] = getattr(_local, "conn", None)
+    # reconnect after a fork or when the DB moved (tests)
+    if conn is None or _local.key != (os.getpid(), DB_PATH):
+        conn = _open_connection()
+        _local.conn, _local.key = conn, (os.getpid(), DB_PATH)
+    yield conn
+
+
+def db_close() -> None:
+    """Closes the connection of the current thread."""
+    conn: Optional[sqlite3.Connection] = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
 
 
 def db_add_host(hostname: str, public_key: str) -> None:
     """Adds the peerstash host to the DB."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
             cursor.execute(
@@ -38,7 +93,7 @@ def db_add_host(hostname: str, public_key: str) -> None:
 
 def db_host_exists(hostname: str) -> bool:
     """Checks the DB to see if we know this peer."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
             cursor.execute("SELECT 1 FROM hosts WHERE hostname=?", (hostname,))
@@ -47,21 +102,21 @@ def db_host_exists(hostname: str) -> bool:
 
 def db_get_host(hostname: str) -> Optional[HostRead]:
     """Gets host entry from DB."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM hosts WHERE hostname=?", (hostname,))
+            cursor.execute(
+                f"SELECT {HOST_COLUMNS} FROM hosts WHERE hostname=?", (hostname,)
+            )
             res = cursor.fetchone()
             if not res:
                 return None
-            return HostRead(
-                **{key: res[i] for i, key in enumerate(HostRead.model_fields.keys())}
-            )
+            return HostRead(*res)
 
 
 def db_update_host(hostname: str, public_key: str) -> None:
     """Updates the peerstash host on the DB."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
             cursor.execute(
@@ -72,26 +127,24 @@ def db_update_host(hostname: str, public_key: str) -> None:
 
 def db_delete_host(hostname: str) -> None:
     """Deletes the peerstash host from the DB."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
             cursor.execute(
                 "DELETE FROM hosts WHERE hostname = ?",
                 (hostname,),
             )
+            cursor.execute("DELETE FROM peer_usage WHERE hostname = ?", (hostname,))
 
 
 def db_list_hosts() -> list[HostRead]:
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM hosts")
+            cursor.execute(f"SELECT {HOST_COLUMNS} FROM hosts")
             results = cursor.fetchall()
 
-    return [
-        HostRead(**{key: res[i] for i, key in enumerate(HostRead.model_fields.keys())})
-        for res in results
-    ]
+    return [HostRead(*res) for res in results]
 
 
 def db_add_task(
@@ -102,22 +155,23 @@ def db_add_task(
     schedule: str,
     retention: str,
     prune_schedule: str,
+    catch_up: str = "once",
 ):
     """Adds the backup task to the DB."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
             cursor.execute(
                 """INSERT INTO tasks 
-                   (name, include, exclude, hostname, schedule, retention, prune_schedule) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (name, include, exclude, hostname, schedule, retention, prune_schedule),
+                   (name, include, exclude, hostname, schedule, retention, prune_schedule, catch_up) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (name, include, exclude, hostname, schedule, retention, prune_schedule, catch_up),
             )
 
 
 def db_task_exists(name: str) -> bool:
     """Checks the DB to see if there's already a task with this name."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
             cursor.execute("SELECT 1 FROM tasks WHERE name=?", (name,))
@@ -126,16 +180,14 @@ def db_task_exists(name: str) -> bool:
 
 def db_get_task(name: str) -> Optional[TaskRead]:
     """Checks the DB to see if there's already a task with this name."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tasks WHERE name=?", (name,))
+            cursor.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE name=?", (name,))
             res = cursor.fetchone()
             if not res:
                 return None
-            return TaskRead(
-                **{key: res[i] for i, key in enumerate(TaskRead.model_fields.keys())}
-            )
+            return TaskRead(*res)
 
 
 def db_update_task(name: str, data: TaskUpdate) -> Optional[TaskRead]:
@@ -146,60 +198,338 @@ def db_update_task(name: str, data: TaskUpdate) -> Optional[TaskRead]:
     if not model_dump:
         return db_get_task(name)
 
-    fields = []
+    updates = []
     values = list(model_dump.values())
     values.append(name)
     for key in model_dump.keys():
-        fields.append(f"{key} = ?")
+        updates.append(f"{key} = ?")
 
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
             cursor.execute(
-                f"UPDATE tasks SET {', '.join(fields)} WHERE name = ? RETURNING *;",
+                f"UPDATE tasks SET {', '.join(updates)} WHERE name = ? RETURNING {TASK_COLUMNS};",
                 values,
             )
             res = cursor.fetchone()
             if not res:
                 return None
-            return TaskRead(
-                **{key: res[i] for i, key in enumerate(TaskRead.model_fields.keys())}
-            )
+            return TaskRead(*res)
 
 
 def db_delete_task(name: str) -> bool:
     """Removes the task from the DB."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
+            cursor.execute("DELETE FROM verifications WHERE task_name = ?", (name,))
+            cursor.execute("DELETE FROM snapshots WHERE task_name = ?", (name,))
+            cursor.execute("DELETE FROM progress WHERE task_name = ?", (name,))
+            cursor.execute("DELETE FROM task_runs WHERE task_name = ?", (name,))
             cursor.execute("DELETE FROM tasks WHERE name = ? RETURNING name", (name,))
             res = cursor.fetchone()
             return res is not None
 
 
 def db_list_tasks() -> list[TaskRead]:
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {TASK_COLUMNS} FROM tasks")
+            results = cursor.fetchall()
+
+    return [TaskRead(*res) for res in results]
+
+
+def db_get_tasks_for_host(hostname: str) -> list[str]:
+    with _connection() as conn:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM tasks WHERE hostname = ?", (hostname,))
+            return [row[0] for row in cursor.fetchall()]
+
+
+def db_get_verification(name: str) -> Optional[VerificationRead]:
+    """Gets the repo verification state of a task."""
+    with _connection() as conn:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(VerificationRead.model_fields.keys())} FROM verifications WHERE task_name=?",
+                (name,),
+            )
+            res = cursor.fetchone()
+            if not res:
+                return None
+            return VerificationRead(
+                **{
+                    key: res[i]
+                    for i, key in enumerate(VerificationRead.model_fields.keys())
+                }
+            )
+
+
+def db_set_verification(name: str, data: VerificationUpdate) -> None:
+    """Creates or updates the repo verification state of a task."""
+    model_dump: dict[str, Any] = data.model_dump(exclude_none=True)
+    if not model_dump:
+        return
+
+    fields = ", ".join(model_dump.keys())
+    placeholders = ", ".join("?" for _ in model_dump)
+    updates = ", ".join(f"{key}=excluded.{key}" for key in model_dump.keys())
+
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                f"""
+                INSERT INTO verifications (task_name, {fields})
+                VALUES (?, {placeholders})
+                ON CONFLICT(task_name) DO UPDATE SET {updates}
+            """,
+                (name, *model_dump.values()),
+            )
+
+
+def db_set_progress(name: str, data: ProgressUpdate) -> None:
+    """Stores the latest progress of a running backup."""
+    model_dump: dict[str, Any] = data.model_dump()
+    fields = ", ".join(model_dump.keys())
+    placeholders = ", ".join("?" for _ in model_dump)
+    updates = ", ".join(f"{key}=excluded.{key}" for key in model_dump.keys())
+
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                f"""
+                INSERT INTO progress (task_name, {fields}, updated)
+                VALUES (?, {placeholders}, ?)
+                ON CONFLICT(task_name) DO UPDATE SET {updates}, updated=excluded.updated
+            """,
+                (name, *model_dump.values(), datetime.now()),
+            )
+
+
+def db_list_progress() -> list[ProgressRead]:
+    """Lists the latest progress of every task."""
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tasks")
+            cursor.execute(
+                f"SELECT {', '.join(ProgressRead.model_fields.keys())} FROM progress"
+            )
             results = cursor.fetchall()
 
     return [
-        TaskRead(**{key: res[i] for i, key in enumerate(TaskRead.model_fields.keys())})
+        ProgressRead(
+            **{key: res[i] for i, key in enumerate(ProgressRead.model_fields.keys())}
+        )
         for res in results
     ]
 
 
-def db_get_tasks_for_host(hostname: str) -> list[str]:
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+def _insert_task_run(conn: sqlite3.Connection, data: TaskRunCreate) -> None:
+    model_dump: dict[str, Any] = data.model_dump()
+    model_dump["phases"] = json.dumps(model_dump["phases"])
+    model_dump["spans"] = json.dumps(model_dump["spans"])
+    fields = ", ".join(model_dump.keys())
+    placeholders = ", ".join("?" for _ in model_dump)
+    conn.execute(
+        f"INSERT INTO task_runs ({fields}) VALUES ({placeholders})",
+        tuple(model_dump.values()),
+    )
+
+
+def db_add_task_run(data: TaskRunCreate) -> None:
+    """Records a finished backup or prune in the run history."""
+    with _connection() as conn:
+        with conn:
+            _insert_task_run(conn, data)
+
+
+def db_finish_task(name: str, data: TaskUpdate, run: TaskRunCreate) -> None:
+    """Updates the task at the end of a job and records the run, in one commit."""
+    updates = data.model_dump(exclude_none=True)
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                f"UPDATE tasks SET {', '.join(f'{key} = ?' for key in updates)} WHERE name = ?",
+                (*updates.values(), name),
+            )
+            _insert_task_run(conn, run)
+
+
+def _task_run_from_row(keys: list[str], res: tuple) -> TaskRunRead:
+    row = {key: res[i] for i, key in enumerate(keys)}
+    row["phases"] = json.loads(row["phases"])
+    row["spans"] = json.loads(row["spans"])
+    return TaskRunRead(**row)
+
+
+def db_list_task_runs(
+    name: str, kind: Optional[str] = None, limit: int = 20
+) -> list[TaskRunRead]:
+    """Lists the latest runs of a task, oldest first."""
+    keys = list(TaskRunRead.model_fields.keys())
+    query = f"SELECT {', '.join(keys)} FROM task_runs WHERE task_name = ?"
+    params: list[Any] = [name]
+    if kind is not None:
+        query += " AND kind = ?"
+        params.append(kind)
+    query += " ORDER BY started DESC LIMIT ?"
+    params.append(limit)
+
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT name FROM tasks WHERE hostname = ?", (hostname,))
-            return cursor.fetchall()
+            cursor.execute(query, params)
+            results = cursor.fetchall()
+
+    return [_task_run_from_row(keys, res) for res in reversed(results)]
+
+
+def db_latest_task_runs(succeeded: bool = False) -> list[TaskRunRead]:
+    """Gets the latest run of each kind of every task, or the latest successful one."""
+    keys = list(TaskRunRead.model_fields.keys())
+    where = "WHERE exit_code = 0" if succeeded else ""
+    with _connection() as conn:
+        with conn:
+            cursor = conn.cursor()
+            # SQLite takes the other columns from the row holding the MAX()
+            cursor.execute(
+                f"SELECT {', '.join(keys)}, MAX(started) FROM task_runs {where} GROUP BY task_name, kind"
+            )
+            results = cursor.fetchall()
+
+    return [_task_run_from_row(keys, res) for res in results]
+
+
+def db_list_snapshots(name: Optional[str] = None) -> list[SnapshotRead]:
+    """Lists the cached snapshots of a task (or of every task), oldest first."""
+    with _connection() as conn:
+        with conn:
+            cursor = conn.cursor()
+            if name is None:
+                cursor.execute(
+                    "SELECT id, short_id, time, paths, task_name FROM snapshots ORDER BY task_name, time"
+                )
+            else:
+                cursor.execute(
+                    "SELECT id, short_id, time, paths, task_name FROM snapshots WHERE task_name=? ORDER BY time",
+                    (name,),
+                )
+            results = cursor.fetchall()
+
+    return [
+        SnapshotRead(
+            **{key: res[i] for i, key in enumerate(SnapshotRead.model_fields.keys())}
+        )
+        for res in results
+    ]
+
+
+def db_count_snapshots() -> dict[str, int]:
+    """Counts the cached snapshots of every task."""
+    with _connection() as conn:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT task_name, COUNT(*) FROM snapshots GROUP BY task_name")
+            return dict(cursor.fetchall())
+
+
+def db_add_snapshot(name: str, snapshot: SnapshotCreate) -> None:
+    """Caches a snapshot taken for a task."""
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (id, short_id, time, paths, task_name) VALUES (?, ?, ?, ?, ?)",
+                (snapshot.id, snapshot.short_id, snapshot.time, snapshot.paths, name),
+            )
+
+
+def db_set_snapshots(name: str, snapshots: list[SnapshotCreate]) -> None:
+    """Replaces the cached snapshots of a task."""
+    with _connection() as conn:
+        with conn:
+            conn.execute("DELETE FROM snapshots WHERE task_name=?", (name,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO snapshots (id, short_id, time, paths, task_name) VALUES (?, ?, ?, ?, ?)",
+                [(s.id, s.short_id, s.time, s.paths, name) for s in snapshots],
+            )
+
+
+def db_set_peer_usage(hostname: str, usage: tuple[int, int, int]) -> None:
+    """Stores the total, used and free bytes last reported by a peer."""
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO peer_usage (hostname, total, used, free, updated)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(hostname) DO UPDATE SET total=excluded.total,
+                    used=excluded.used, free=excluded.free, updated=excluded.updated
+            """,
+                (hostname, *usage, datetime.now()),
+            )
+
+
+def db_list_peer_usage() -> list[PeerUsageRead]:
+    """Lists the last known usage of every peer."""
+    with _connection() as conn:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(PeerUsageRead.model_fields.keys())} FROM peer_usage"
+            )
+            results = cursor.fetchall()
+
+    return [
+        PeerUsageRead(
+            **{key: res[i] for i, key in enumerate(PeerUsageRead.model_fields.keys())}
+        )
+        for res in results
+    ]
+
+
+def db_add_removal(hostname: str, path: str) -> None:
+    """Records a folder on a peer that is being removed."""
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO removals (hostname, path, started) VALUES (?, ?, ?)",
+                (hostname, path, datetime.now()),
+            )
+
+
+def db_list_removals() -> list[RemovalRead]:
+    """Lists the folders on peers whose removal has not finished."""
+    with _connection() as conn:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(RemovalRead.model_fields.keys())} FROM removals ORDER BY started"
+            )
+            results = cursor.fetchall()
+
+    return [
+        RemovalRead(
+            **{key: res[i] for i, key in enumerate(RemovalRead.model_fields.keys())}
+        )
+        for res in results
+    ]
+
+
+def db_delete_removal(hostname: str, path: str) -> None:
+    """Removes the record of a finished folder removal."""
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                "DELETE FROM removals WHERE hostname=? AND path=?", (hostname, path)
+            )
 
 
 def db_get_user() -> Optional[str]:
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
             cursor.execute("SELECT username FROM node_data WHERE id = 1")
@@ -209,7 +539,7 @@ def db_get_user() -> Optional[str]:
 
 
 def db_get_invite_code() -> Optional[str]:
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             cursor = conn.cursor()
             cursor.execute("SELECT invite_code FROM node_data WHERE id = 1")
@@ -219,7 +549,7 @@ def db_get_invite_code() -> Optional[str]:
 
 
 def db_set_invite_code(code: str) -> None:
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _connection() as conn:
         with conn:
             conn.execute(
                 """
@@ -0,0 +1,131 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sqlite3
+
+# Ordered schema migrations, migration N brings the DB to schema version N.
+# Never edit a released migration, append a new one instead.
+MIGRATIONS: list[str] = [
+    # 1: tables added after the initial schema
+    """
+    CREATE TABLE IF NOT EXISTS verifications (
+        task_name TEXT PRIMARY KEY,
+        cursor INTEGER DEFAULT 0,
+        slices INTEGER NOT NULL,
+        last_check DATETIME,
+        last_data_check DATETIME,
+        FOREIGN KEY (task_name) REFERENCES tasks(name)
+    );
+    CREATE TABLE IF NOT EXISTS progress (
+        task_name TEXT PRIMARY KEY,
+        percent_done REAL NOT NULL,
+        bytes_done INTEGER NOT NULL,
+        total_bytes INTEGER,
+        bytes_per_second REAL NOT NULL,
+        files_done INTEGER NOT NULL,
+        total_files INTEGER,
+        eta_seconds INTEGER,
+        updated DATETIME NOT NULL,
+        FOREIGN KEY (task_name) REFERENCES tasks(name)
+    );
+    CREATE TABLE IF NOT EXISTS snapshots (
+        id TEXT PRIMARY KEY,
+        short_id TEXT NOT NULL,
+        time TEXT NOT NULL,
+        paths TEXT NOT NULL,
+        task_name TEXT NOT NULL,
+        FOREIGN KEY (task_name) REFERENCES tasks(name)
+    );
+    CREATE TABLE IF NOT EXISTS removals (
+        hostname TEXT NOT NULL,
+        path TEXT NOT NULL,
+        started DATETIME NOT NULL,
+        PRIMARY KEY (hostname, path)
+    );
+    """,
+    # 2: indexes for the lookups by peer and the per-task snapshot listing
+    """
+    CREATE INDEX IF NOT EXISTS idx_tasks_hostname ON tasks(hostname);
+    CREATE INDEX IF NOT EXISTS idx_snapshots_task_time ON snapshots(task_name, time);
+    """,
+    # 3: when each job kind last ran (last_run covers both) and the catch-up policy
+    """
+    ALTER TABLE tasks ADD COLUMN last_backup DATETIME;
+    ALTER TABLE tasks ADD COLUMN last_prune DATETIME;
+    ALTER TABLE tasks ADD COLUMN catch_up TEXT DEFAULT 'once';
+    """,
+    # 4: history of every backup and prune, phases holds the seconds per phase as JSON
+    """
+    CREATE TABLE task_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_name TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        hostname TEXT NOT NULL,
+        started DATETIME NOT NULL,
+        duration REAL NOT NULL,
+        phases TEXT NOT NULL,
+        bytes_processed INTEGER,
+        bytes_added INTEGER,
+        files_new INTEGER,
+        files_changed INTEGER,
+        files_processed INTEGER,
+        exit_code INTEGER NOT NULL,
+        FOREIGN KEY (task_name) REFERENCES tasks(name)
+    );
+    CREATE INDEX idx_task_runs_task_started ON task_runs(task_name, started);
+    """,
+    # 5: wall and CPU time of the phases of each run and the commands in them, as JSON
+    """
+    ALTER TABLE task_runs ADD COLUMN spans TEXT NOT NULL DEFAULT '[]';
+    """,
+    # 6: last known quota of each peer, so metrics never have to ask the peer
+    """
+    CREATE TABLE peer_usage (
+        hostname TEXT PRIMARY KEY,
+        total INTEGER NOT NULL,
+        used INTEGER NOT NULL,
+        free INTEGER NOT NULL,
+        updated DATETIME NOT NULL
+    );
+    """,
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Returns the schema version of the DB, 0 if it was never migrated."""
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    res = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return res[0] or 0
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Applies the migrations the DB is missing, in order. Each migration runs in
+    its own transaction, so a failed one leaves the DB at the previous version.
+    Returns the new schema version.
+    """
+    version = get_schema_version(conn)
+    conn.commit()
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            conn.executescript(
+                f"BEGIN;\n{script}\nINSERT INTO schema_version (version) VALUES ({number});\nCOMMIT;"
+            )
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise RuntimeError(f"Schema migration {number} failed: {e}") from e
+        version = number
+    return version
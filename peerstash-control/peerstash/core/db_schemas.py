@@ -15,8 +15,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 
 from pydantic import BaseModel
 
@@ -32,7 +33,13 @@ class HostCreate(HostBase):
     public_key: str
 
 
-class HostRead(HostCreate):
+# rows read back from the DB are trusted, so they are plain slotted dataclasses
+# instead of models validated field by field (see benchmarks/bench_rows.py)
+@dataclass(slots=True)
+class HostRead:
+    hostname: str
+    port: int
+    public_key: str
     last_seen: Optional[datetime]
 
 
@@ -58,10 +65,21 @@ class TaskCreate(TaskBase):
     prune_schedule: str
 
 
-class TaskRead(TaskCreate):
+@dataclass(slots=True)
+class TaskRead:
+    name: str
+    include: str
+    exclude: Optional[str]
+    hostname: str
+    schedule: str
+    retention: str
+    prune_schedule: str
     last_run: Optional[datetime]
     last_exit_code: Optional[int]
     status: str
+    last_backup: Optional[datetime]
+    last_prune: Optional[datetime]
+    catch_up: str
 
 
 class TaskUpdate(BaseModel):
@@ -74,3 +92,107 @@ class TaskUpdate(BaseModel):
     last_run: Optional[datetime] = None
     last_exit_code: Optional[int] = None
     status: Optional[str] = None
+    last_backup: Optional[datetime] = None
+    last_prune: Optional[datetime] = None
+    catch_up: Optional[str] = None
+
+
+# --- Verification Schemas ---
+
+
+class VerificationRead(BaseModel):
+    task_name: str
+    cursor: int
+    slices: int
+    last_check: Optional[datetime]
+    last_data_check: Optional[datetime]
+
+
+class VerificationUpdate(BaseModel):
+    cursor: Optional[int] = None
+    slices: Optional[int] = None
+    last_check: Optional[datetime] = None
+    last_data_check: Optional[datetime] = None
+
+
+# --- Progress Schemas ---
+
+
+class ProgressRead(BaseModel):
+    task_name: str
+    percent_done: float
+    bytes_done: int
+    total_bytes: Optional[int]
+    bytes_per_second: float
+    files_done: int
+    total_files: Optional[int]
+    eta_seconds: Optional[int]
+    updated: datetime
+
+
+class ProgressUpdate(BaseModel):
+    percent_done: float = 0
+    bytes_done: int = 0
+    total_bytes: Optional[int] = None
+    bytes_per_second: float = 0
+    files_done: int = 0
+    total_files: Optional[int] = None
+    eta_seconds: Optional[int] = None
+
+
+# --- Task Run Schemas ---
+
+
+class TaskRunCreate(BaseModel):
+    task_name: str
+    kind: str
+    hostname: str
+    started: datetime
+    duration: float
+    phases: dict[str, float]
+    # the phases as timed spans, with the restic commands run in each
+    spans: list[dict[str, Any]] = []
+    bytes_processed: Optional[int] = None
+    bytes_added: Optional[int] = None
+    files_new: Optional[int] = None
+    files_changed: Optional[int] = None
+    files_processed: Optional[int] = None
+    exit_code: int
+
+
+class TaskRunRead(TaskRunCreate):
+    id: int
+
+
+# --- Snapshot Schemas ---
+
+
+class SnapshotCreate(BaseModel):
+    id: str
+    short_id: str
+    time: str
+    paths: str
+
+
+class SnapshotRead(SnapshotCreate):
+    task_name: str
+
+
+# --- Peer Usage Schemas ---
+
+
+class PeerUsageRead(BaseModel):
+    hostname: str
+    total: int
+    used: int
+    free: int
+    updated: datetime
+
+
+# --- Removal Schemas ---
+
+
+class RemovalRead(BaseModel):
+    hostname: str
+    path: str
+    started: datetime
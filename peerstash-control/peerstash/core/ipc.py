@@ -0,0 +1,169 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import socket
+import socketserver
+import struct
+from typing import Any, Callable, Optional
+
+SOCKET_PATH = "/var/run/peerstash.sock"
+# every message is a JSON object prefixed by its length (4 bytes, big-endian)
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# pid, uid and gid of the process connected to a Unix socket
+PEERCRED = struct.Struct("3i")
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends something that is not a valid frame."""
+
+
+class MalformedMessageError(ProtocolError):
+    """Raised when a whole frame was read but does not hold a JSON object."""
+
+
+def send_frame(sock: socket.socket, message: dict[str, Any]) -> None:
+    """Sends a message as a single frame."""
+    data = json.dumps(message).encode("utf-8")
+    if len(data) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Message of {len(data)} bytes is too large")
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def recv_frame(sock: socket.socket) -> Optional[dict[str, Any]]:
+    """
+    Reads the next frame. Returns None if the connection was closed between frames.
+    """
+    header = _recv_exactly(sock, HEADER.size, allow_eof=True)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {size} bytes is too large")
+    data = _recv_exactly(sock, size)
+    try:
+        message = json.loads(data)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise MalformedMessageError("Invalid JSON")
+    if not isinstance(message, dict):
+        raise MalformedMessageError("Message is not a JSON object")
+    return message
+
+
+def _recv_exactly(
+    sock: socket.socket, size: int, allow_eof: bool = False
+) -> Optional[bytes]:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), 65536))
+        if not chunk:
+            if allow_eof and not buffer:
+                return None
+            raise ProtocolError("Connection closed in the middle of a frame")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def peer_uid(sock: socket.socket) -> int:
+    """Gets the uid of the process on the other end of a Unix socket."""
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEERCRED.size)
+    _pid, uid, _gid = PEERCRED.unpack(creds)
+    return uid
+
+
+def stream_request(
+    action: str,
+    kwargs: dict[str, Any],
+    on_message: Callable[[dict[str, Any]], None],
+    path: str = SOCKET_PATH,
+) -> dict[str, Any]:
+    """
+    Sends one request and passes each message streamed back before the response
+    to `on_message`. Returns the response (the first message with a status).
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        send_frame(client, {"id": 1, "action": action, "kwargs": kwargs})
+        while True:
+            message = recv_frame(client)
+            if message is None:
+                raise ProtocolError("Connection closed before the response")
+            if "status" in message:
+                return message
+            on_message(message)
+
+
+class FramedRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Serves framed requests ({"id", "action", "kwargs"}) until the client
+    disconnects. Each response carries the id of its request. The "batch" action
+    runs a list of requests in one round trip and returns a result for each.
+    An action can stream messages without a status before its response with
+    emit(). Subclasses implement route_action.
+    """
+
+    # id of the request being served
+    request_id: Any = None
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except MalformedMessageError as e:
+                # the bad frame was read whole, so the next one is still readable
+                send_frame(self.request, {"id": None, "status": "error", "message": str(e)})
+                continue
+            except ProtocolError as e:
+                send_frame(self.request, {"id": None, "status": "error", "message": str(e)})
+                return
+            if request is None:
+                return
+            send_frame(self.request, self.respond(request))
+
+    def respond(self, request: dict[str, Any]) -> dict[str, Any]:
+        action = request.get("action", "")
+        kwargs = request.get("kwargs", {})
+        self.request_id = request.get("id")
+        if action == "batch":
+            response = self._batch(kwargs.get("requests", []))
+        else:
+            response = self._dispatch(action, kwargs)
+        return {"id": request.get("id"), **response}
+
+    def route_action(self, action: str, kwargs: dict[str, Any]) -> dict[str, Any]:
+        raise NotImplementedError
+
+    def emit(self, message: dict[str, Any]) -> None:
+        """Streams a message to the client ahead of the response."""
+        send_frame(self.request, {"id": self.request_id, **message})
+
+    def _dispatch(self, action: str, kwargs: dict[str, Any]) -> dict[str, Any]:
+        try:
+            return self.route_action(action, kwargs)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def _batch(self, requests: list[dict[str, Any]]) -> dict[str, Any]:
+        results = []
+        for request in requests:
+            if request.get("action") == "batch":
+                results.append({"status": "error", "message": "Batches cannot be nested"})
+                continue
+            results.append(
+                self._dispatch(request.get("action", ""), request.get("kwargs", {}))
+            )
+        return {"status": "success", "results": results}
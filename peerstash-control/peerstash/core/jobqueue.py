@@ -0,0 +1,200 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Literal, Optional
+
+from pydantic import BaseModel
+
+from peerstash.core.backup import prune_repo, run_backup
+from peerstash.core.db import db_get_task
+from peerstash.core.restic_runner import interrupt_restic
+from peerstash.core.utils import logger
+
+# number of finished jobs kept for the average wait time
+WAIT_HISTORY = 100
+# seconds between looks for restic commands to interrupt while stopping
+STOP_POLL_INTERVAL = 1.0
+
+JobKind = Literal["backup", "prune"]
+
+
+class Job(BaseModel):
+    task_name: str
+    kind: JobKind
+    hostname: str
+    queued_at: datetime
+    started_at: Optional[datetime] = None
+
+
+class JobQueue:
+    """
+    Runs jobs on a bounded pool of workers. Jobs of the same task never run at
+    the same time and at most `peer_concurrency` jobs upload to a peer at once.
+    Jobs that can't start yet wait in the queue instead of failing.
+    """
+
+    def __init__(self, workers: int, peer_concurrency: int):
+        self.peer_concurrency = peer_concurrency
+        self._pending: list[Job] = []
+        self._running: dict[str, Job] = {}
+        self._peer_jobs: dict[str, int] = {}
+        self._waits: deque[float] = deque(maxlen=WAIT_HISTORY)
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._workers = [
+            threading.Thread(
+                target=self._work, name=f"peerstash-job-{i}", daemon=True
+            )
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, name: str, kind: JobKind) -> bool:
+        """
+        Queues a job. Returns False if the same job was already waiting and
+        the two were merged.
+        """
+        task = db_get_task(name)
+        if not task:
+            logger.warning(f"Attempted to queue {kind} for '{name}' but not found in database.")
+            return False
+
+        with self._cond:
+            for job in self._pending:
+                if job.task_name == name and job.kind == kind:
+                    logger.info(f"[{name}] {kind} already queued, merging jobs.")
+                    return False
+
+            self._pending.append(
+                Job(
+                    task_name=name,
+                    kind=kind,
+                    hostname=task.hostname,
+                    queued_at=datetime.now(),
+                )
+            )
+            self._cond.notify_all()
+        return True
+
+    def status(self) -> dict[str, Any]:
+        """
+        Gets the queue depth and how long jobs have been waiting or running.
+        """
+        now = datetime.now()
+        with self._cond:
+            return {
+                "depth": len(self._pending),
+                "average_wait": (
+                    sum(self._waits) / len(self._waits) if self._waits else 0.0
+                ),
+                "pending": [
+                    {
+                        "task_name": job.task_name,
+                        "kind": job.kind,
+                        "peer": job.hostname,
+                        "waiting": (now - job.queued_at).total_seconds(),
+                    }
+                    for job in self._pending
+                ],
+                "running": [
+                    {
+                        "task_name": job.task_name,
+                        "kind": job.kind,
+                        "peer": job.hostname,
+                        "running": (now - (job.started_at or now)).total_seconds(),
+                    }
+                    for job in self._running.values()
+                ],
+            }
+
+    def stop(self, interrupt: bool = False) -> None:
+        """
+        Stops starting new jobs and waits for running jobs to finish. With
+        `interrupt`, their restic commands are interrupted, so the jobs fail
+        early but still release their locks and finish their status.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            if interrupt and self._running:
+                logger.warning(f"Interrupting {len(self._running)} running job(s)...")
+
+        interrupted: set[int] = set()
+        for worker in self._workers:
+            while worker.is_alive():
+                # a job may start another restic command after the first one failed
+                if interrupt:
+                    interrupted |= interrupt_restic(interrupted)
+                worker.join(timeout=STOP_POLL_INTERVAL)
+
+    def _next_job(self) -> Optional[Job]:
+        """
+        Takes the oldest job whose task and peer are free.
+        Must be called while holding the lock.
+        """
+        for i, job in enumerate(self._pending):
+            if job.task_name in self._running:
+                continue
+            if self._peer_jobs.get(job.hostname, 0) >= self.peer_concurrency:
+                continue
+
+            del self._pending[i]
+            job.started_at = datetime.now()
+            self._running[job.task_name] = job
+            self._peer_jobs[job.hostname] = self._peer_jobs.get(job.hostname, 0) + 1
+            self._waits.append((job.started_at - job.queued_at).total_seconds())
+            return job
+
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and not (job := self._next_job()):
+                    self._cond.wait()
+                if self._stopped:
+                    return
+
+            try:
+                self._run_job(job)
+            finally:
+                with self._cond:
+                    del self._running[job.task_name]
+                    self._peer_jobs[job.hostname] -= 1
+                    self._cond.notify_all()
+
+    def _run_job(self, job: Job) -> int:
+        """
+        Runs a job in this process, which keeps its DB connections and caches
+        warm, instead of starting a new CLI process for it.
+        """
+        name, kind = job.task_name, job.kind
+        logger.info(f"[{name}] Starting scheduled {kind}...")
+        try:
+            if kind == "backup":
+                run_backup(name)
+            else:
+                prune_repo(name)
+        except Exception as e:
+            logger.error(f"[{name}] Scheduled {kind} failed: {e}")
+            return 1
+
+        logger.info(f"[{name}] Scheduled {kind} finished.")
+        return 0
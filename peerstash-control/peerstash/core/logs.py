@@ -0,0 +1,152 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+from logging.handlers import (QueueHandler, QueueListener,
+                              RotatingFileHandler, WatchedFileHandler)
+from typing import Optional
+
+LOG_DIR = "/var/log/peerstash"
+LOG_FILE = os.path.join(LOG_DIR, "peerstash.log")
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# the daemon starts a new log file past this size, keeping this many old ones
+LOG_MAX_BYTES = int(os.getenv("PEERSTASH_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("PEERSTASH_LOG_BACKUPS", "5"))
+# "text", or "json" for one object per line
+LOG_OUTPUT = os.getenv("PEERSTASH_LOG_FORMAT", "text")
+# fields of the job a thread is running, added to its log records
+CONTEXT_FIELDS = ("task", "kind", "phase")
+
+# thread -> context fields of its log records
+_context = threading.local()
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+def get_log_context() -> dict[str, str]:
+    """Gets the context fields of the log records of this thread."""
+    return getattr(_context, "fields", {})
+
+
+def set_log_context(fields: dict[str, str]) -> None:
+    """Replaces the context fields of the log records of this thread."""
+    _context.fields = fields
+
+
+class ContextFilter(logging.Filter):
+    """Adds the context of the logging thread, before the record is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in get_log_context().items():
+            setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a JSON object on one line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created)
+            .astimezone()
+            .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS:
+            if (value := getattr(record, key, None)) is not None:
+                data[key] = value
+        return json.dumps(data)
+
+
+class _SharedRotatingFileHandler(RotatingFileHandler):
+    # the CLI runs as the admin user and writes to the files the daemon creates
+    def _open(self):
+        stream = super()._open()
+        try:
+            os.chmod(self.baseFilename, 0o666)
+        except OSError:
+            pass
+        return stream
+
+
+def setup_logging(rotate: bool = False, stream: bool = False) -> None:
+    """
+    Sends the log records of this process to LOG_FILE from a background thread,
+    so logging never waits on the disk. Only the daemon (`rotate`) rotates the
+    file, other processes reopen it once it was rotated. With `stream`, records
+    are also written to stderr.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    handlers: list[logging.Handler] = []
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        if rotate:
+            handlers.append(
+                _SharedRotatingFileHandler(
+                    LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS
+                )
+            )
+        else:
+            handlers.append(WatchedFileHandler(LOG_FILE))
+    except OSError as e:
+        print(f"Warning: cannot write to {LOG_FILE} ({e})", file=sys.stderr)
+    if stream:
+        handlers.append(logging.StreamHandler(sys.stderr))
+
+    formatter = (
+        JsonFormatter()
+        if LOG_OUTPUT == "json"
+        else logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    _queue_handler = QueueHandler(records)
+    _queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    # write what is still queued when the process exits
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Writes the queued records and stops the background thread."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
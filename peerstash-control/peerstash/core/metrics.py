@@ -0,0 +1,219 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import fcntl
+import socket
+import struct
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+from peerstash.core.db import (db_count_snapshots, db_latest_task_runs,
+                               db_list_peer_usage, db_list_tasks)
+from peerstash.core.jobqueue import JobQueue
+from peerstash.core.utils import logger
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# ioctl that gets the IPv4 address of a network interface
+SIOCGIFADDR = 0x8915
+
+Labels = dict[str, str]
+
+
+class _Family:
+    """A gauge and its samples."""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.samples: list[tuple[Labels, float]] = []
+
+    def add(self, labels: Labels, value: Optional[float | datetime]) -> None:
+        # unknown values are left out instead of reported as 0
+        if value is None:
+            return
+        if isinstance(value, datetime):
+            value = value.timestamp()
+        self.samples.append((labels, value))
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.samples:
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(
+                f"{self.name}{{{label_str}}} {value}" if labels else f"{self.name} {value}"
+            )
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _peer(hostname: str) -> str:
+    return hostname.removeprefix("peerstash-")
+
+
+def render_metrics(
+    queue_status: Optional[dict[str, Any]] = None, openmetrics: bool = False
+) -> str:
+    """
+    Renders the health of every task, the job queue and the quota of every peer
+    in the Prometheus text format (or OpenMetrics). Everything comes from the
+    database and memory, so a scrape never connects to a peer.
+    """
+    last_success = _Family(
+        "peerstash_task_last_success_timestamp_seconds",
+        "When the latest successful job of a task started.",
+    )
+    last_run = _Family(
+        "peerstash_task_last_run_timestamp_seconds",
+        "When the latest job of a task started.",
+    )
+    last_duration = _Family(
+        "peerstash_task_last_duration_seconds", "How long the latest job of a task took."
+    )
+    last_exit_code = _Family(
+        "peerstash_task_last_exit_code", "Exit code of the latest job of a task."
+    )
+    added = _Family(
+        "peerstash_task_last_added_bytes",
+        "Bytes the latest backup of a task added to its repo.",
+    )
+    processed = _Family(
+        "peerstash_task_last_processed_bytes",
+        "Bytes the latest backup of a task read.",
+    )
+    snapshots = _Family(
+        "peerstash_task_snapshots", "Number of snapshots in the repo of a task."
+    )
+    busy = _Family(
+        "peerstash_task_busy", "1 while a backup or prune of the task is running."
+    )
+    families = [
+        last_success,
+        last_run,
+        last_duration,
+        last_exit_code,
+        added,
+        processed,
+        snapshots,
+        busy,
+    ]
+
+    snapshot_counts = db_count_snapshots()
+    for task in db_list_tasks():
+        labels = {"task": task.name, "peer": _peer(task.hostname)}
+        snapshots.add(labels, snapshot_counts.get(task.name, 0))
+        busy.add(labels, int(task.status in ("running", "pruning")))
+
+    for run in db_latest_task_runs():
+        labels = {"task": run.task_name, "peer": _peer(run.hostname), "kind": run.kind}
+        last_run.add(labels, run.started)
+        last_duration.add(labels, run.duration)
+        last_exit_code.add(labels, run.exit_code)
+        if run.kind == "backup":
+            labels = {"task": run.task_name, "peer": _peer(run.hostname)}
+            added.add(labels, run.bytes_added)
+            processed.add(labels, run.bytes_processed)
+    for run in db_latest_task_runs(succeeded=True):
+        labels = {"task": run.task_name, "peer": _peer(run.hostname), "kind": run.kind}
+        last_success.add(labels, run.started)
+
+    if queue_status is not None:
+        depth = _Family("peerstash_queue_depth", "Jobs waiting in the queue.")
+        running = _Family("peerstash_queue_running_jobs", "Jobs running right now.")
+        wait = _Family(
+            "peerstash_queue_average_wait_seconds",
+            "Average time recent jobs waited in the queue.",
+        )
+        depth.add({}, queue_status["depth"])
+        running.add({}, len(queue_status["running"]))
+        wait.add({}, queue_status["average_wait"])
+        families += [depth, running, wait]
+
+    quota = _Family("peerstash_peer_quota_bytes", "Quota of this node on a peer.")
+    used = _Family("peerstash_peer_used_bytes", "Bytes this node stores on a peer.")
+    free = _Family("peerstash_peer_free_bytes", "Bytes left in the quota on a peer.")
+    updated = _Family(
+        "peerstash_peer_usage_timestamp_seconds",
+        "When the usage of a peer was last queried.",
+    )
+    for usage in db_list_peer_usage():
+        labels = {"peer": _peer(usage.hostname)}
+        quota.add(labels, usage.total)
+        used.add(labels, usage.used)
+        free.add(labels, usage.free)
+        updated.add(labels, usage.updated)
+    families += [quota, used, free, updated]
+
+    lines = [line for family in families for line in family.render()]
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def interface_address(interface: str) -> str:
+    """
+    Gets the IPv4 address of a network interface, such as eth0 of the Docker
+    bridge. Raises OSError if the interface has no IPv4 address.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        ifreq = fcntl.ioctl(
+            sock.fileno(), SIOCGIFADDR, struct.pack("256s", interface.encode()[:15])
+        )
+    return socket.inet_ntoa(ifreq[20:24])
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    server: "MetricsServer"
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        try:
+            body = render_metrics(self.server.queue.status(), openmetrics).encode()
+        except Exception as e:
+            logger.error(f"Failed to render metrics: {e}")
+            self.send_error(500)
+            return
+
+        self.send_response(200)
+        self.send_header(
+            "Content-Type",
+            OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE,
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # every scrape would end up in the log
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves /metrics for Prometheus."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], queue: JobQueue):
+        self.queue = queue
+        super().__init__(address, MetricsHandler)
@@ -0,0 +1,172 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import signal
+import subprocess
+from typing import Any, Optional
+
+from restic.internal import backup as internal_backup
+from restic.internal import forget as internal_forget
+from restic.internal import init as internal_init
+from restic.internal import restore as internal_restore
+from restic.internal import snapshots as internal_snapshots
+
+from peerstash.core.db import db_get_user
+from peerstash.core.db_schemas import TaskRead
+from peerstash.core.sftp import SFTP_PORT
+from peerstash.core.spans import Span
+
+RESTIC_BIN = "/usr/bin/restic"
+RESTIC_PASSWORD_FILE = "/var/lib/peerstash/restic_password"
+# numbers of a backup summary that are kept with the timing of the command
+SUMMARY_NUMBERS = (
+    "files_new",
+    "files_changed",
+    "total_files_processed",
+    "total_bytes_processed",
+    "data_added",
+    "total_duration",
+)
+
+
+def summary_numbers(summary: Any) -> dict[str, Any]:
+    """
+    Picks the SUMMARY_NUMBERS out of a restic backup summary.
+    """
+    if not isinstance(summary, dict):
+        return {}
+    return {key: summary[key] for key in SUMMARY_NUMBERS if key in summary}
+
+
+def _restic_children() -> list[int]:
+    """
+    Lists the restic processes started by this process, including the ones
+    resticpy starts, which are not reachable from here.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                argv0 = f.read().split(b"\0", 1)[0]
+        except OSError:
+            # the process already exited
+            continue
+        # the command name in parentheses may contain spaces, the fields after it can't
+        ppid = int(stat.rpartition(")")[2].split()[1])
+        if ppid == os.getpid() and os.fsdecode(argv0) == RESTIC_BIN:
+            pids.append(int(entry))
+    return pids
+
+
+def interrupt_restic(skip: set[int] = set()) -> set[int]:
+    """
+    Sends SIGINT to the restic processes started by this process, except the
+    ones in `skip`. SIGINT lets restic remove its lock before exiting.
+    Returns the interrupted pids.
+    """
+    interrupted = set()
+    for pid in _restic_children():
+        if pid in skip:
+            continue
+        try:
+            os.kill(pid, signal.SIGINT)
+        except ProcessLookupError:
+            continue
+        interrupted.add(pid)
+    return interrupted
+
+
+class ResticRunner:
+    """
+    Runs restic commands against a single repository. The repository and password
+    file are passed on every call instead of through the resticpy module globals,
+    so runners for different tasks can be used from several threads at once.
+    Must be run with root permissions to access password file.
+    """
+
+    def __init__(self, repository: str, password_file: str = RESTIC_PASSWORD_FILE):
+        self.repository = repository
+        self.password_file = password_file
+
+    @classmethod
+    def for_task(cls, task: TaskRead) -> "ResticRunner":
+        """
+        Creates a runner for the repo of a task on its peer.
+        """
+        return cls(f"sftp://{db_get_user()}@{task.hostname}:{SFTP_PORT}/{task.name}")
+
+    def command(self, *args: str) -> list[str]:
+        """
+        Builds a restic command line for this repository.
+        """
+        return [
+            RESTIC_BIN,
+            "--json",
+            "-r",
+            self.repository,
+            "--password-file",
+            self.password_file,
+            *args,
+        ]
+
+    def init(self) -> str:
+        with Span("restic init"):
+            return internal_init.run(self.command())
+
+    def backup(self, **kwargs: Any) -> dict[str, Any]:
+        with Span("restic backup", dry_run=kwargs.get("dry_run", False)) as span:
+            summary = internal_backup.run(self.command(), **kwargs)
+            span.set(**summary_numbers(summary))
+            return summary
+
+    def forget(self, **kwargs: Any) -> Any:
+        with Span("restic forget"):
+            return internal_forget.run(self.command(), **kwargs)
+
+    def restore(self, **kwargs: Any) -> Any:
+        with Span("restic restore"):
+            return internal_restore.run(self.command(), **kwargs)
+
+    def snapshots(self, **kwargs: Any) -> list[dict[Any, Any]]:
+        with Span("restic snapshots"):
+            return internal_snapshots.run(self.command(), **kwargs)
+
+    def check(self, read_data_subset: Optional[str] = None) -> None:
+        """
+        Checks the repository using the local cache, optionally reading a subset of
+        the pack files. Raises CalledProcessError if the check fails.
+        """
+        # resticpy does not have support for --with-cache, call it directly
+        cmd = self.command("check", "--with-cache")
+        if read_data_subset:
+            cmd.extend(["--read-data-subset", read_data_subset])
+        with Span("restic check", read_data_subset=read_data_subset):
+            subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+    def prune(self, max_repack_size: str) -> None:
+        """
+        Removes unreferenced data. Raises CalledProcessError if the prune fails.
+        """
+        # resticpy does not have support for the prune command, call it directly
+        with Span("restic prune", max_repack_size=max_repack_size):
+            subprocess.run(
+                self.command("prune", "--max-repack-size", max_repack_size), check=True
+            )
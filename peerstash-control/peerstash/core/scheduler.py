@@ -0,0 +1,313 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from peerstash.core.db import db_get_task, db_list_tasks
+from peerstash.core.jobqueue import JobKind, JobQueue
+from peerstash.core.stagger import PlannedJob, StaggerPlanner
+from peerstash.core.utils import (fires_at, logger, next_fire_time,
+                                  prev_fire_time)
+
+# wake up at least this often in case the system clock jumps
+MAX_SLEEP_SECONDS = 60
+# a job that should have started this long ago was missed (the daemon was down or asleep)
+MISSED_AFTER_SECONDS = 5 * 60
+# missed jobs are caught up this far apart instead of all at once
+CATCH_UP_STAGGER_SECONDS = 5 * 60
+
+# (run at, order, fire time, task name, job kind, task generation)
+# delayed starts and catch-up runs have no fire time and are not rescheduled
+Entry = tuple[datetime, int, Optional[datetime], str, JobKind, int]
+
+
+class Scheduler:
+    """
+    Keeps the next fire time of every backup and prune job in a heap and hands
+    due jobs to the job queue.
+    """
+
+    def __init__(self, queue: JobQueue, planner: Optional[StaggerPlanner] = None):
+        self._heap: list[Entry] = []
+        # entries from an old generation of a task are stale and skipped
+        self._generations: dict[str, int] = {}
+        # task name -> (backup schedule, prune schedule)
+        self._schedules: dict[str, tuple[str, str]] = {}
+        # task name -> catch-up policy
+        self._catch_up: dict[str, str] = {}
+        # task name -> peer hostname
+        self._hosts: dict[str, str] = {}
+        # spreads out jobs that fire at the same time
+        self._planner = planner or StaggerPlanner()
+        # task name -> number of its live heap entries
+        self._pending: dict[str, int] = {}
+        # number of heap entries left behind by rescheduled or removed tasks
+        self._stale = 0
+        self._order = itertools.count()
+        self._next_generation = itertools.count(1)
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._queue = queue
+
+    def load(self) -> None:
+        """
+        Schedules every task in the database, and catches up on the jobs that
+        were missed while the daemon was down.
+        """
+        tasks = db_list_tasks()
+        now = datetime.now()
+        missed: list[tuple[datetime, str, JobKind, int]] = []
+        with self._cond:
+            # every task must be known before any start offset is planned
+            generations = [
+                self._assign(
+                    task.name, task.schedule, task.prune_schedule, task.catch_up, task.hostname
+                )
+                for task in tasks
+            ]
+            for task, generation in zip(tasks, generations):
+                for kind, cron, last in (
+                    # tasks that have not run since last_backup was added only have last_run
+                    ("backup", task.schedule, task.last_backup or task.last_run),
+                    ("prune", task.prune_schedule, task.last_prune),
+                ):
+                    fire_time = next_fire_time(cron, now)
+                    self._push(self._entry(task.name, kind, fire_time, generation), bulk=True)
+                    # a task that never ran has nothing to catch up on
+                    if (
+                        task.catch_up == "once"
+                        and last is not None
+                        and last < prev_fire_time(cron, now)
+                    ):
+                        missed.append((last, task.name, kind, generation))
+            self._stagger(missed, now, bulk=True)
+            # one heapify instead of a push per job
+            self._compact()
+            self._cond.notify()
+        logger.info(f"Scheduler loaded {len(tasks)} tasks ({len(missed)} missed jobs to catch up).")
+
+    def set_task(
+        self, name: str, schedule: str, prune_schedule: str, catch_up: str = "once"
+    ) -> None:
+        """
+        Schedules (or reschedules) the backup and prune jobs of a task.
+        """
+        now = datetime.now()
+        task = db_get_task(name)
+        hostname = task.hostname if task else ""
+        with self._cond:
+            generation = self._assign(name, schedule, prune_schedule, catch_up, hostname)
+            self._push(self._entry(name, "backup", next_fire_time(schedule, now), generation))
+            self._push(self._entry(name, "prune", next_fire_time(prune_schedule, now), generation))
+            self._cond.notify()
+
+    def remove_task(self, name: str) -> None:
+        """
+        Removes the jobs of a task from the schedule.
+        """
+        with self._cond:
+            self._forget(name)
+            self._cond.notify()
+
+    def list_jobs(self) -> list[dict[str, str]]:
+        """
+        Lists the upcoming jobs, soonest first.
+        """
+        with self._cond:
+            jobs = [
+                (
+                    run_at
+                    if fire_time is None
+                    else fire_time + timedelta(seconds=self._offset(name, kind, fire_time)),
+                    name,
+                    kind,
+                )
+                for run_at, _, fire_time, name, kind, generation in self._heap
+                if self._generations.get(name) == generation
+            ]
+            return [
+                {"task_name": name, "kind": kind, "next_run": f"{run_at}"}
+                for run_at, name, kind in sorted(jobs)
+            ]
+
+    def run(self) -> None:
+        """
+        Dispatches due jobs until stopped. Meant to run in its own thread.
+        """
+        with self._cond:
+            while not self._stopped:
+                for name, kind in self._pop_due(datetime.now()):
+                    self._queue.submit(name, kind)
+                self._cond.wait(timeout=self._seconds_until_next())
+
+    def stop(self) -> None:
+        """
+        Stops dispatching jobs.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _assign(
+        self, name: str, schedule: str, prune_schedule: str, catch_up: str, hostname: str
+    ) -> int:
+        """
+        Replaces the schedule of a task and returns its new generation.
+        Must be called while holding the lock.
+        """
+        self._forget(name)
+        generation = next(self._next_generation)
+        self._generations[name] = generation
+        self._schedules[name] = (schedule, prune_schedule)
+        self._catch_up[name] = catch_up
+        self._hosts[name] = hostname
+        self._planner.refresh(name, "backup")
+        self._planner.refresh(name, "prune")
+        return generation
+
+    def _entry(
+        self,
+        name: str,
+        kind: JobKind,
+        fire_time: Optional[datetime],
+        generation: int,
+        run_at: Optional[datetime] = None,
+    ) -> Entry:
+        if run_at is None:
+            assert fire_time is not None
+            run_at = fire_time
+        return (run_at, next(self._order), fire_time, name, kind, generation)
+
+    def _push(self, entry: Entry, bulk: bool = False) -> None:
+        """
+        Adds a live entry to the heap. Bulk entries are appended, and the heap
+        must be compacted afterwards. Must be called while holding the lock.
+        """
+        name = entry[3]
+        self._pending[name] = self._pending.get(name, 0) + 1
+        if bulk:
+            self._heap.append(entry)
+        else:
+            heapq.heappush(self._heap, entry)
+
+    def _offset(self, name: str, kind: JobKind, fire_time: datetime) -> int:
+        """
+        Plans the start delay of a job among every job firing at the same time.
+        Must be called while holding the lock.
+        """
+        group: list[PlannedJob] = [
+            (other, other_kind, self._hosts[other])
+            for other, (schedule, prune_schedule) in self._schedules.items()
+            for other_kind, cron in (("backup", schedule), ("prune", prune_schedule))
+            if fires_at(cron, fire_time)
+        ]
+        return self._planner.offset((name, kind, self._hosts[name]), group)
+
+    def _stagger(
+        self,
+        missed: list[tuple[datetime, str, JobKind, int]],
+        now: datetime,
+        bulk: bool = False,
+    ) -> None:
+        """
+        Schedules one catch-up run per missed job, the longest overdue first,
+        spaced out so they do not all start at once. Must be called while
+        holding the lock.
+        """
+        for i, (_, name, kind, generation) in enumerate(sorted(missed)):
+            run_at = now + timedelta(seconds=i * CATCH_UP_STAGGER_SECONDS)
+            logger.info(f"[{name}] Catching up on a missed {kind} at {run_at}.")
+            self._push(self._entry(name, kind, None, generation, run_at), bulk)
+
+    def _forget(self, name: str) -> None:
+        """
+        Marks the heap entries of a task as stale, rebuilding the heap once
+        most of it is stale. Must be called while holding the lock.
+        """
+        if self._schedules.pop(name, None) is None:
+            return
+        self._generations.pop(name)
+        self._catch_up.pop(name)
+        self._hosts.pop(name)
+        self._planner.forget(name)
+        self._stale += self._pending.pop(name, 0)
+        if self._stale > len(self._heap) // 2:
+            self._compact()
+
+    def _compact(self) -> None:
+        """
+        Drops stale entries and restores the heap order in a single pass.
+        Must be called while holding the lock.
+        """
+        self._heap = [
+            entry for entry in self._heap if self._generations.get(entry[3]) == entry[5]
+        ]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def _pop_due(self, now: datetime) -> list[tuple[str, JobKind]]:
+        """
+        Removes the jobs that are due from the heap and schedules their next run.
+        Jobs that were missed (the daemon was asleep or the clock jumped) are
+        caught up according to the task's policy. Must be called while holding
+        the lock.
+        """
+        due: list[tuple[str, JobKind]] = []
+        missed: list[tuple[datetime, str, JobKind, int]] = []
+        while self._heap and self._heap[0][0] <= now:
+            run_at, _, fire_time, name, kind, generation = heapq.heappop(self._heap)
+            if self._generations.get(name) != generation:
+                self._stale -= 1
+                continue
+            self._pending[name] -= 1
+
+            if fire_time is None:
+                due.append((name, kind))
+                continue
+
+            schedule, prune_schedule = self._schedules[name]
+            cron = schedule if kind == "backup" else prune_schedule
+            if (now - run_at).total_seconds() <= MISSED_AFTER_SECONDS:
+                self._push(self._entry(name, kind, next_fire_time(cron, fire_time), generation))
+                # planned when the job fires, so it accounts for every task known by then
+                self._planner.refresh(name, kind)
+                offset = self._offset(name, kind, fire_time)
+                if offset > 0:
+                    start = fire_time + timedelta(seconds=offset)
+                    self._push(self._entry(name, kind, None, generation, start))
+                else:
+                    due.append((name, kind))
+                continue
+
+            # resume the schedule from now instead of replaying every missed run
+            self._push(self._entry(name, kind, next_fire_time(cron, now), generation))
+            if self._catch_up[name] == "once":
+                missed.append((fire_time, name, kind, generation))
+            else:
+                logger.info(f"[{name}] Skipping the {kind} missed at {fire_time}.")
+
+        self._stagger(missed, now)
+        return due
+
+    def _seconds_until_next(self) -> float:
+        if not self._heap:
+            return MAX_SLEEP_SECONDS
+        wait = (self._heap[0][0] - datetime.now()).total_seconds()
+        return min(max(wait, 0), MAX_SLEEP_SECONDS)
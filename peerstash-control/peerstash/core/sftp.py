@@ -0,0 +1,356 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import atexit
+import posixpath
+import re
+import stat
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, contextmanager
+from typing import Callable, Iterator, Optional
+
+import paramiko
+from paramiko.sftp import CMD_EXTENDED, CMD_EXTENDED_REPLY
+
+from peerstash.core.db import db_get_user, db_set_peer_usage
+from peerstash.core.utils import logger
+
+SFTP_PORT = 2022
+# seconds between SSH keepalive packets on pooled connections
+SSH_KEEPALIVE = 30
+# pooled connections unused for this many seconds are closed
+SSH_IDLE_TIMEOUT = 300
+# sftp subprocesses share one SSH connection per peer through this socket
+SSH_CONTROL_PATH = "/tmp/peerstash/ssh-%u-%C"
+# files removed from a peer at the same time
+REMOVE_WORKERS = 8
+# removal progress is reported after this many files
+REMOVE_PROGRESS_INTERVAL = 1000
+# disk usage of a peer is reused for this many seconds
+DISK_USAGE_TTL = 30
+
+# hostname -> (time of query, (total, used, free))
+_disk_usage_cache: dict[str, tuple[float, tuple[int, int, int]]] = {}
+_disk_usage_lock = threading.Lock()
+
+
+class _PeerConnection:
+    def __init__(self, ssh: paramiko.SSHClient):
+        self.ssh = ssh
+        self.idle: list[paramiko.SFTPClient] = []
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+class SFTPPool:
+    """
+    Keeps one SSH connection per peer open and hands out SFTP sessions on it, so
+    repeated SFTP work on a peer does not pay for a new handshake every time.
+    """
+
+    def __init__(
+        self, keepalive: int = SSH_KEEPALIVE, idle_timeout: int = SSH_IDLE_TIMEOUT
+    ):
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self._peers: dict[str, _PeerConnection] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self, hostname: str) -> Iterator[paramiko.SFTPClient]:
+        """
+        Borrows an SFTP session to a peer, connecting if there is no healthy
+        connection. The session is returned to the pool afterwards.
+        """
+        peer, sftp = self._acquire(hostname)
+        try:
+            yield sftp
+        finally:
+            self._release(hostname, peer, sftp)
+
+    def close(self, hostname: Optional[str] = None) -> None:
+        """
+        Closes the connection to a peer, or to every peer if no hostname is given.
+        """
+        with self._lock:
+            hostnames = [hostname] if hostname else list(self._peers)
+            for name in hostnames:
+                if peer := self._peers.pop(name, None):
+                    self._close_peer(peer)
+
+    def _acquire(
+        self, hostname: str
+    ) -> tuple[_PeerConnection, paramiko.SFTPClient]:
+        with self._lock:
+            self._close_idle()
+
+            peer = self._peers.get(hostname)
+            if peer and not self._healthy(peer):
+                self._close_peer(self._peers.pop(hostname))
+                peer = None
+            if not peer:
+                peer = _PeerConnection(self._connect(hostname))
+                self._peers[hostname] = peer
+
+            peer.in_use += 1
+            sftp = peer.idle.pop() if peer.idle else None
+
+        if sftp is None:
+            try:
+                sftp = peer.ssh.open_sftp()
+            except Exception:
+                with self._lock:
+                    peer.in_use -= 1
+                raise
+        return peer, sftp
+
+    def _release(
+        self, hostname: str, peer: _PeerConnection, sftp: paramiko.SFTPClient
+    ) -> None:
+        with self._lock:
+            peer.in_use -= 1
+            peer.last_used = time.monotonic()
+            if sftp.get_channel().closed or self._peers.get(hostname) is not peer:
+                sftp.close()
+            else:
+                peer.idle.append(sftp)
+
+    def _connect(self, hostname: str) -> paramiko.SSHClient:
+        user = db_get_user()
+        if not user:
+            raise ValueError("Unknown USER")
+
+        ssh = paramiko.SSHClient()
+        ssh.load_host_keys(f"/home/{user}/.ssh/known_hosts")
+        ssh.connect(
+            hostname,
+            port=SFTP_PORT,
+            username=user,
+            key_filename=f"/home/{user}/.ssh/id_ed25519",
+        )
+        transport = ssh.get_transport()
+        if transport:
+            transport.set_keepalive(self.keepalive)
+        return ssh
+
+    def _healthy(self, peer: _PeerConnection) -> bool:
+        transport = peer.ssh.get_transport()
+        if not transport or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except Exception:
+            return False
+        return True
+
+    def _close_idle(self) -> None:
+        """
+        Closes connections that have not been used for the idle timeout.
+        Must be called while holding the lock.
+        """
+        now = time.monotonic()
+        for hostname, peer in list(self._peers.items()):
+            if peer.in_use == 0 and now - peer.last_used > self.idle_timeout:
+                self._close_peer(self._peers.pop(hostname))
+
+    def _close_peer(self, peer: _PeerConnection) -> None:
+        for sftp in peer.idle:
+            sftp.close()
+        peer.idle.clear()
+        peer.ssh.close()
+
+
+_pool = SFTPPool()
+atexit.register(_pool.close)
+
+
+def sftp_session(hostname: str) -> AbstractContextManager[paramiko.SFTPClient]:
+    """
+    Borrows a pooled SFTP session to a peer. Use as a context manager.
+    """
+    return _pool.session(hostname)
+
+
+def remove_tree(
+    hostname: str,
+    path: str,
+    workers: int = REMOVE_WORKERS,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """
+    Removes a folder and everything in it from a peer. Files are removed by
+    `workers` concurrent SFTP sessions, and `progress` is called with the number
+    of removed and total files. Anything already gone is skipped, so an
+    interrupted removal can simply be run again. Returns the number of files removed.
+    """
+    # list the tree with attributes, parents always come before their children
+    dirs: list[str] = []
+    files: list[str] = []
+    with sftp_session(hostname) as sftp:
+        pending = [path]
+        while pending:
+            current = pending.pop()
+            try:
+                entries = sftp.listdir_attr(current)
+            except FileNotFoundError:
+                continue
+            dirs.append(current)
+            for entry in entries:
+                child = posixpath.join(current, entry.filename)
+                if entry.st_mode is not None and stat.S_ISDIR(entry.st_mode):
+                    pending.append(child)
+                else:
+                    files.append(child)
+
+    removed = 0
+    removed_lock = threading.Lock()
+
+    def _remove(chunk: list[str]) -> None:
+        nonlocal removed
+        with sftp_session(hostname) as sftp:
+            for filepath in chunk:
+                try:
+                    sftp.remove(filepath)
+                except FileNotFoundError:
+                    pass
+                with removed_lock:
+                    removed += 1
+                    if progress and removed % REMOVE_PROGRESS_INTERVAL == 0:
+                        progress(removed, len(files))
+
+    chunks = [files[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_remove, chunk) for chunk in chunks if chunk]
+        for future in futures:
+            future.result()
+
+    # remove the now empty folders, children first
+    with sftp_session(hostname) as sftp:
+        for folder in reversed(dirs):
+            try:
+                sftp.rmdir(folder)
+            except FileNotFoundError:
+                pass
+
+    if progress:
+        progress(removed, len(files))
+    return removed
+
+
+def get_disk_usage(user, hostname: str, port: int) -> tuple[int, int, int]:
+    """
+    Get the amount of total, used, and free bytes in a sftp server.
+    Results are cached per peer for DISK_USAGE_TTL seconds.
+    """
+    with _disk_usage_lock:
+        cached = _disk_usage_cache.get(hostname)
+    if cached and time.monotonic() - cached[0] < DISK_USAGE_TTL:
+        return cached[1]
+
+    try:
+        with sftp_session(hostname) as sftp:
+            usage = _statvfs(sftp)
+    except Exception as e:
+        logger.warning(f"statvfs failed on {hostname}, falling back to sftp df: {e}")
+        usage = _sftp_df(user, hostname, port)
+
+    with _disk_usage_lock:
+        _disk_usage_cache[hostname] = (time.monotonic(), usage)
+    # kept for the metrics endpoint, which never queries the peer
+    try:
+        db_set_peer_usage(hostname, usage)
+    except Exception as e:
+        logger.warning(f"Could not save disk usage of {hostname}: {e}")
+    return usage
+
+
+def invalidate_disk_usage(hostname: str) -> None:
+    """
+    Drops the cached disk usage of a peer after data was added or removed.
+    """
+    with _disk_usage_lock:
+        _disk_usage_cache.pop(hostname, None)
+
+
+def _statvfs(sftp: paramiko.SFTPClient, path: str = ".") -> tuple[int, int, int]:
+    """
+    Queries the total, used, and free bytes of a path with the
+    statvfs@openssh.com extension (which SFTPGo answers with the user's quota).
+    """
+    t, msg = sftp._request(CMD_EXTENDED, "statvfs@openssh.com", path)
+    if t != CMD_EXTENDED_REPLY or msg is None:
+        raise paramiko.SFTPError("Expected an extended reply to statvfs")
+
+    # f_bsize, f_frsize, f_blocks, f_bfree, f_bavail (followed by unused fields)
+    _ = msg.get_int64()
+    frsize = msg.get_int64()
+    blocks = msg.get_int64()
+    bfree = msg.get_int64()
+    bavail = msg.get_int64()
+    return (blocks * frsize, (blocks - bfree) * frsize, bavail * frsize)
+
+
+def _sftp_df(user, hostname: str, port: int) -> tuple[int, int, int]:
+    """
+    Get the amount of total, used, and free bytes by running `df` in the sftp
+    binary. Written to work with the output of SFTPGo and may not work
+    with other SFTP servers that return information in different formats.
+    """
+    try:
+        # connect to the server (SSH keys should already be set up in ~/.ssh/),
+        # reusing the shared SSH connection to the peer if one is open
+        process = subprocess.run(
+            [
+                "sftp",
+                "-P",
+                f"{port}",
+                "-o",
+                "ControlMaster=auto",
+                "-o",
+                f"ControlPath={SSH_CONTROL_PATH}",
+                "-o",
+                f"ControlPersist={SSH_IDLE_TIMEOUT}",
+                "-o",
+                f"ServerAliveInterval={SSH_KEEPALIVE}",
+                f"{user}@{hostname}",
+            ],
+            input="df\nbye\n",
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        output = process.stdout
+
+        # get output
+        if not output.strip():
+            raise Exception("Output returned nothing.")
+
+        # Parse output with Regex like the subprocess method
+        numbers = re.findall(r"[0-9]+", output)
+        if len(numbers) >= 3:
+            # get values in bytes (SFTPGo formats the values in KiB)
+            total = int(numbers[0]) * 1024
+            used = int(numbers[1]) * 1024
+            free = int(numbers[2]) * 1024
+        else:
+            raise Exception("Unable to parse output.")
+    except Exception as e:
+        raise RuntimeError(f"Could not get quota from SFTP server. ({e})")
+
+    return (total, used, free)
@@ -0,0 +1,117 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import threading
+import time
+from typing import Any, Optional
+
+# innermost open span of each thread
+_local = threading.local()
+
+
+def _child_cpu() -> float:
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def current_span() -> Optional["Span"]:
+    """Gets the innermost span open in this thread, if any."""
+    return getattr(_local, "span", None)
+
+
+class Span:
+    """
+    Times a piece of work: wall time, CPU time of the thread running it and CPU
+    time of the subprocesses (restic) that exited meanwhile. Spans started while
+    another one is open in the same thread are recorded as its children.
+
+    The subprocess CPU time is counted for the whole process, so it also holds
+    restic processes of jobs that ran in other threads at the same time.
+    """
+
+    __slots__ = (
+        "name",
+        "attrs",
+        "children",
+        "wall",
+        "cpu",
+        "child_cpu",
+        "_outer",
+        "_start",
+        "_cpu_start",
+        "_child_start",
+    )
+
+    def __init__(self, name: str, **attrs: Any):
+        self.name = name
+        self.attrs: dict[str, Any] = attrs
+        self.children: list[Span] = []
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.child_cpu = 0.0
+        self._outer: Optional[Span] = None
+
+    def start(self, attach: bool = True) -> "Span":
+        """
+        Starts timing and makes this the innermost span of the thread. With
+        `attach`, the span is added to the children of the span it is nested in.
+        """
+        self._outer = current_span()
+        if attach and self._outer is not None:
+            self._outer.children.append(self)
+        _local.span = self
+        self._start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self._child_start = _child_cpu()
+        return self
+
+    def end(self) -> None:
+        """Stops timing and reopens the span this one was nested in."""
+        self.wall = time.perf_counter() - self._start
+        self.cpu = time.thread_time() - self._cpu_start
+        self.child_cpu = _child_cpu() - self._child_start
+        _local.span = self._outer
+
+    def set(self, **attrs: Any) -> None:
+        """Adds attributes to the span, such as the numbers of a restic summary."""
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.end()
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {
+            "name": self.name,
+            "wall": round(self.wall, 3),
+            "cpu": round(self.cpu, 3),
+            "child_cpu": round(self.child_cpu, 3),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        return data
+
+    def describe(self) -> str:
+        """One line summary of the span for the log."""
+        line = f"{self.name} {self.wall:.3f}s (cpu {self.cpu:.3f}s, subprocess cpu {self.child_cpu:.3f}s)"
+        if self.attrs:
+            line += " " + " ".join(f"{k}={v}" for k, v in self.attrs.items())
+        return line
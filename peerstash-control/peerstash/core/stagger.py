@@ -0,0 +1,98 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import statistics
+
+from peerstash.core.db import db_list_task_runs
+from peerstash.core.jobqueue import JobKind
+from peerstash.core.utils import generate_sha1, logger
+
+# jobs that fire at the same time are spread over this many minutes
+STAGGER_WINDOW_MINUTES = 10
+# assumed duration (seconds) of a job that has no run history yet
+DEFAULT_DURATION = 60.0
+# number of recent runs used to estimate how long a job takes
+DURATION_HISTORY = 5
+
+# (task name, job kind, peer hostname)
+PlannedJob = tuple[str, JobKind, str]
+
+
+def _stable_hash(*parts: str) -> int:
+    """Hash that is the same in every process (unlike hash() of a str)."""
+    return int(generate_sha1(":".join(parts))[:8], 16)
+
+
+class StaggerPlanner:
+    """
+    Picks how long after its fire time each job starts. Jobs that fire at the
+    same time and upload to the same peer are laid end to end using their
+    recent durations, and each peer's block of jobs starts at its own point
+    in the window. The result only depends on the jobs and their history, so
+    a task starts at the same offset every time.
+    """
+
+    def __init__(self, window: int = STAGGER_WINDOW_MINUTES * 60):
+        self.window = window
+        self._durations: dict[tuple[str, JobKind], float] = {}
+
+    def refresh(self, name: str, kind: JobKind) -> None:
+        """
+        Re-estimates the duration of a job from its latest runs.
+        """
+        try:
+            runs = db_list_task_runs(name, kind, DURATION_HISTORY)
+        except Exception as e:
+            logger.warning(f"[{name}] Could not read run history for staggering: {e}")
+            return
+        durations = [run.duration for run in runs if run.exit_code == 0]
+        if durations:
+            self._durations[(name, kind)] = statistics.median(durations)
+        else:
+            self._durations.pop((name, kind), None)
+
+    def forget(self, name: str) -> None:
+        """
+        Drops the durations of a removed task.
+        """
+        for kind in ("backup", "prune"):
+            self._durations.pop((name, kind), None)
+
+    def duration(self, name: str, kind: JobKind) -> float:
+        return self._durations.get((name, kind), DEFAULT_DURATION)
+
+    def offset(self, job: PlannedJob, group: list[PlannedJob]) -> int:
+        """
+        Gets the delay in seconds of `job`. `group` holds every job that fires
+        at the same time, including `job`.
+        """
+        name, kind, hostname = job
+        peer_jobs = sorted(
+            (j for j in group if j[2] == hostname),
+            key=lambda j: _stable_hash(j[0], j[1]),
+        )
+
+        start = 0.0
+        for other_name, other_kind, _ in peer_jobs:
+            if (other_name, other_kind) == (name, kind):
+                break
+            start += self.duration(other_name, other_kind)
+
+        # place the peer's block somewhere in the slack left by its jobs
+        total = sum(self.duration(n, k) for n, k, _ in peer_jobs)
+        slack = int(max(self.window - total, 0))
+        phase = _stable_hash(hostname) % (slack + 1)
+        return int(min(phase + start, self.window))
@@ -0,0 +1,215 @@
+# Peerstash
+# Copyright (C) 2026 BPR02
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from datetime import datetime
+from typing import Any, Optional
+
+from peerstash.core.db import db_finish_task, db_update_task
+from peerstash.core.db_schemas import TaskRead, TaskRunCreate, TaskUpdate
+from peerstash.core.logs import get_log_context, set_log_context
+from peerstash.core.spans import Span
+from peerstash.core.utils import logger
+
+# durable statuses stored in the tasks table and the statuses each can move to
+TRANSITIONS: dict[str, set[str]] = {
+    "new": {"running"},
+    "idle": {"running", "pruning"},
+    # a backup without space prunes in the middle of its run, or removes the
+    # repo of a first backup (which has to be initialized again)
+    "running": {"idle", "new", "pruning"},
+    "pruning": {"idle"},
+}
+# phases of each kind of job and the phases that may follow them, kept in memory
+PHASES: dict[str, dict[Optional[str], set[str]]] = {
+    "backup": {
+        None: {"init", "space_check"},
+        "init": {"space_check"},
+        "space_check": {"upload"},
+        # the upload is retried once after pruning the repo
+        "upload": {"prune", "check"},
+        "prune": {"space_check"},
+        "check": set(),
+    },
+    "prune": {
+        None: {"forget"},
+        "forget": {"sync_snapshots"},
+        "sync_snapshots": {"repack"},
+        "repack": set(),
+    },
+}
+# status of a task while each kind of job runs
+JOB_STATUS = {"backup": "running", "prune": "pruning"}
+
+
+class InvalidTransitionError(RuntimeError):
+    """Raised when a task is moved to a status or phase it cannot reach."""
+
+
+class TaskState:
+    """
+    State machine of a backup or prune job. Only the start and the end of a job
+    are written to the database. The phases in between are kept in memory and
+    timed as spans, together with the restic commands run in them, and end up
+    in the log and the task's run history when the job finishes.
+
+    `waited` is a span that ended before the job started, such as the wait for
+    the task lock.
+    """
+
+    def __init__(self, task: TaskRead, kind: str, waited: Optional[Span] = None):
+        self.task = task
+        self.kind = kind
+        self.status = task.status
+        self.phase_name: Optional[str] = None
+        self.phases: dict[str, float] = {}
+        self.started = datetime.now()
+        # a job is timed on its own, even a prune run in the middle of a backup
+        self.span = Span(kind).start(attach=False)
+        if waited is not None:
+            self.span.children.append(waited)
+        self._phase: Optional[Span] = None
+        # between start() and finish()
+        self.active = False
+        self._closed = False
+        # log records of the thread carry the task and phase until the job ends
+        self._outer_context = get_log_context()
+        set_log_context({"task": task.name, "kind": kind})
+
+    def start(self) -> None:
+        """Marks the task as busy with this job."""
+        status = JOB_STATUS[self.kind]
+        if status in TRANSITIONS.get(self.status, set()):
+            pass
+        elif self.status not in TRANSITIONS or self.status in JOB_STATUS.values():
+            # statuses of older versions, or a job that died while busy (the task
+            # lock guarantees no other job of this task is running)
+            logger.warning(
+                f"[{self.task.name}] Recovering from status '{self.status}' of an interrupted run"
+            )
+        else:
+            self._check_status(status)
+        self.status = status
+        update = TaskUpdate(last_run=self.started, last_exit_code=-1, status=status)
+        if self.kind == "backup":
+            update.last_backup = self.started
+        else:
+            update.last_prune = self.started
+        db_update_task(self.task.name, update)
+        self.active = True
+
+    def phase(self, name: str) -> None:
+        """Ends the current phase and starts the next one."""
+        allowed = PHASES[self.kind].get(self.phase_name, set())
+        if name not in allowed:
+            raise InvalidTransitionError(
+                f"{self.kind} of '{self.task.name}' cannot go from phase '{self.phase_name}' to '{name}'"
+            )
+        self._end_phase()
+        self.phase_name = name
+        self._phase = Span(name).start()
+        set_log_context({**get_log_context(), "phase": name})
+
+    def resume(self) -> None:
+        """Marks the task as busy again after a nested job (a prune) finished."""
+        db_update_task(self.task.name, TaskUpdate(status=self.status))
+
+    def finish(
+        self,
+        exit_code: int,
+        summary: Optional[dict[str, Any]] = None,
+        status: str = "idle",
+    ) -> None:
+        """
+        Stores the outcome of the job and records it in the run history, together
+        with the statistics of the restic summary, if any.
+        """
+        self._check_status(status)
+        self.active = False
+        self._closed = True
+        self._end_phase()
+        self.span.end()
+        self.span.set(exit_code=exit_code)
+        self._log_span(self.span, 0)
+        self.status = status
+        update = TaskUpdate(last_exit_code=exit_code, status=status)
+        summary = summary or {}
+        run = TaskRunCreate(
+            task_name=self.task.name,
+            kind=self.kind,
+            hostname=self.task.hostname,
+            started=self.started,
+            duration=self.span.wall,
+            phases={k: round(v, 3) for k, v in self.phases.items()},
+            spans=[child.to_dict() for child in self.span.children],
+            bytes_processed=summary.get("total_bytes_processed"),
+            bytes_added=summary.get("data_added"),
+            files_new=summary.get("files_new"),
+            files_changed=summary.get("files_changed"),
+            files_processed=summary.get("total_files_processed"),
+            exit_code=exit_code,
+        )
+        try:
+            db_finish_task(self.task.name, update, run)
+        except Exception as e:
+            # the history is only informational, never lose the status over it
+            logger.warning(f"[{self.task.name}] Could not record {self.kind} run: {e}")
+            db_update_task(self.task.name, update)
+        finally:
+            set_log_context(self._outer_context)
+
+    def abort(self, exit_code: int) -> None:
+        """
+        Finishes a job that stopped on an unexpected error. Does nothing if the
+        job already finished, and only stops timing if it never started.
+        """
+        if self._closed:
+            return
+        if not self.active:
+            self._closed = True
+            self.span.end()
+            set_log_context(self._outer_context)
+            return
+        logger.error(
+            f"[{self.task.name}] {self.kind.capitalize()} stopped in phase '{self.phase_name}'"
+        )
+        try:
+            self.finish(exit_code)
+        except Exception as e:
+            logger.error(f"[{self.task.name}] Could not finish {self.kind}: {e}")
+
+    def _check_status(self, status: str) -> None:
+        if status not in TRANSITIONS.get(self.status, set()):
+            raise InvalidTransitionError(
+                f"Task '{self.task.name}' cannot go from '{self.status}' to '{status}'"
+            )
+
+    def _end_phase(self) -> None:
+        if self._phase is None:
+            return
+        self._phase.end()
+        # a phase can run more than once, e.g. the upload retried after a prune
+        self.phases[self._phase.name] = (
+            self.phases.get(self._phase.name, 0) + self._phase.wall
+        )
+        self._phase = None
+
+    def _log_span(self, span: Span, depth: int) -> None:
+        # the job and its phases are logged, the commands in them only in debug
+        level = logging.INFO if depth < 2 else logging.DEBUG
+        logger.log(level, f"[{self.task.name}] {'  ' * depth}{span.describe()}")
+        for child in span.children:
+            self._log_span(child, depth + 1)
@@ -15,85 +15,46 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import fcntl
+import functools
 import hashlib
-import json
+import itertools
 import logging
 import os
 import re
 import socket
 import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
 from enum import StrEnum
 from io import TextIOWrapper
 from pathlib import Path
-from typing import Literal, Optional
+from typing import Any, Literal, Optional
 
 from cron_validator import CronValidator
 from pydantic import BaseModel, model_validator
 
-SOCKET_PATH = "/var/run/peerstash.sock"
+from peerstash.core.ipc import SOCKET_PATH, recv_frame, send_frame
 
+# what the scheduler does with runs missed while the daemon was down or asleep:
+# run each missed job once, or wait for the next scheduled run
+CATCH_UP_POLICIES = ("once", "skip")
+# ids of the requests this process sends to the daemon
+_request_ids = itertools.count(1)
 
-# configure logging
-os.makedirs("/var/log/peerstash", exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.FileHandler("/var/log/peerstash/peerstash.log"),
-    ],
-)
+# task locks held in this process: (task name, thread id) -> (lock file, depth)
+_held_locks: dict[tuple[str, int], tuple[TextIOWrapper, int]] = {}
+_held_locks_guard = threading.Lock()
+
+# handlers are set up by each entry point (see peerstash.core.logs)
 logger = logging.getLogger(__name__)
 
 
 def log(msg: str, level: Literal["info", "warning", "error"] = "info"):
+    """Prints a message for the user and logs it."""
+    # printed right away, the log record is written in the background
     print(msg)
-    match level:
-        case "info":
-            logger.info(msg)
-            return
-        case "warning":
-            logger.warning(msg)
-            return
-        case "error":
-            logger.error(msg)
-            return
-
-
-def get_disk_usage(user, hostname: str, port: int) -> tuple[int, int, int]:
-    """
-    Get the amount of total, used, and free bytes in a sftp server.
-    Written to work with `df` sftp command used by SFTPGo and may not work
-    with other SFTP servers that return information in different formats.
-    """
-    try:
-        # connect to the server (SSH keys should already be set up in ~/.ssh/)
-        process = subprocess.run(
-            ["sftp", "-P", f"{port}", f"{user}@{hostname}"],
-            input="df\nbye\n",
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        output = process.stdout
-
-        # get output
-        if not output.strip():
-            raise Exception("Output returned nothing.")
-
-        # Parse output with Regex like the subprocess method
-        numbers = re.findall(r"[0-9]+", output)
-        if len(numbers) >= 3:
-            # get values in bytes (SFTPGo formats the values in KiB)
-            total = int(numbers[0]) * 1024
-            used = int(numbers[1]) * 1024
-            free = int(numbers[2]) * 1024
-        else:
-            raise Exception("Unable to parse output.")
-    except Exception as e:
-        raise RuntimeError(f"Could not get quota from SFTP server. ({e})")
-
-    return (total, used, free)
+    logger.log(logging.getLevelNamesMapping()[level.upper()], msg, stacklevel=2)
 
 
 def get_file_content(filepath: str) -> Optional[str]:
@@ -185,11 +146,19 @@ class Retention(BaseModel):
         return cls.model_validate(value)
 
 
-def acquire_task_lock(name: str) -> TextIOWrapper:
+def acquire_task_lock(name: str, timeout: float = 0) -> TextIOWrapper:
     """
-    Attempts to acquire an exclusive, non-blocking lock for a specific backup task.
-    Raises error if the lock is already held by another process.
+    Attempts to acquire an exclusive lock for a specific backup task, waiting up to
+    `timeout` seconds. The lock is re-entrant for the thread holding it.
+    Raises error if the lock is still held by another process.
     """
+    key = (name, threading.get_ident())
+    with _held_locks_guard:
+        if key in _held_locks:
+            lock_file, count = _held_locks[key]
+            _held_locks[key] = (lock_file, count + 1)
+            return lock_file
+
     # Create a unique lock file for this specific task
     lock_file_path = f"/tmp/peerstash/task_{name}.lock"
     if not os.path.exists(lock_file_path):
@@ -201,25 +170,41 @@ def acquire_task_lock(name: str) -> TextIOWrapper:
     # of the backup, so we return it to prevent Python from garbage collecting it.
     lock_file = open(lock_file_path, "w")
 
-    try:
-        # LOCK_EX: Exclusive lock (only one process can hold it)
-        # LOCK_NB: Non-blocking (fail immediately instead of waiting in line)
-        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
-
-        # Write the current Process ID (PID) into the lock file for debugging
-        lock_file.write(str(os.getpid()))
-        lock_file.flush()
-
-        return lock_file
-
-    except BlockingIOError:
-        # If we hit this block, another process has the lock.
-        raise RuntimeError(
-            f"Backup task '{name}' is already running in another process."
-        )
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            # LOCK_EX: Exclusive lock (only one process can hold it)
+            # LOCK_NB: Non-blocking (poll so the wait can time out)
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            # If we hit this block, another process has the lock.
+            if time.monotonic() >= deadline:
+                lock_file.close()
+                raise RuntimeError(
+                    f"Backup task '{name}' is already running in another process."
+                )
+            time.sleep(1)
+
+    # Write the current Process ID (PID) into the lock file for debugging
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+
+    with _held_locks_guard:
+        _held_locks[key] = (lock_file, 1)
+    return lock_file
 
 
 def release_lock(lock_file: TextIOWrapper) -> None:
+    with _held_locks_guard:
+        for key, (held, count) in _held_locks.items():
+            if held is lock_file:
+                if count > 1:
+                    _held_locks[key] = (held, count - 1)
+                    return
+                del _held_locks[key]
+                break
+
     fcntl.flock(lock_file, fcntl.LOCK_UN)
     lock_file.close()
 
@@ -244,7 +229,7 @@ def verify_sudo_password(password: str):
 def gen_restic_pass(username: str, admin_pass: str) -> None:
     """
     Deterministically generates the restic password and securely stores it
-    in a read-only file for resticpy and crontab to use.
+    in a read-only file for resticpy and scheduled jobs to use.
     """
     logger.info("Generating restic password...")
     # hash the password with username as salt (i.e. deterministic)
@@ -282,45 +267,13 @@ def sizeof_fmt(num: float, suffix="B") -> str:
     return f"{num:.1f}Yi{suffix}"
 
 
-def update_crontab(task_name: str, new_jobs: Optional[list] = None) -> tuple[bool, str]:
+def duration_fmt(seconds: float) -> str:
     """
-    Updates crontab by filtering out old jobs and appending new ones.
-    If new_jobs is None, it will just remove the task from the crontab.
-
-    Returns a tuple with the success status and status message (e.g. reason for failure).
+    Formats a number of seconds as [h:]mm:ss
     """
-    if new_jobs is None:
-        logger.info(f"Removing task for '{task_name}' from crontab...")
-    else:
-        logger.info(f"Adding tasks for '{task_name}' to crontab...")
-    try:
-        # get current crontab
-        result = subprocess.run(["crontab", "-l"], capture_output=True, text=True)
-        current_crontab = result.stdout if result.returncode == 0 else ""
-
-        # remove existing jobs for this task
-        pattern = re.compile(
-            rf"peerstash .* {re.escape(task_name)} [0-9]*$"
-        )
-        lines = [
-            line for line in current_crontab.splitlines() if not pattern.search(line)
-        ]
-
-        # add new jobs
-        if new_jobs:
-            lines.extend(new_jobs)
-
-        # write back to crontab
-        new_cron_content = "\n".join(lines) + "\n"
-        subprocess.run(["crontab", "-"], input=new_cron_content, text=True, check=True)
-        if new_jobs is None:
-            logger.info(f"Removed tasks for '{task_name}' from crontab.")
-        else:
-            logger.info(f"Added tasks for '{task_name}' to crontab.")
-        return (True, "Success")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Attempted to update crontab, but failed: {str(e)}")
-        return (False, f"Crontab update failed: {str(e)}")
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"
 
 
 def validate_task_name(name: str) -> Optional[str]:
@@ -338,6 +291,15 @@ def validate_task_name(name: str) -> Optional[str]:
     return None
 
 
+@functools.lru_cache(maxsize=256)
+def _parse_schedule(schedule: str) -> tuple:
+    """Parses a cron schedule once; the scheduler matches the same few schedules constantly."""
+    fields = CronValidator.parse(schedule)
+    if fields is None:
+        raise ValueError(f"cron schedule '{schedule}' is invalid.")
+    return tuple(fields)
+
+
 def validate_schedule(schedule: str) -> bool:
     """
     Check if a cron schedule is valid
@@ -348,6 +310,64 @@ def validate_schedule(schedule: str) -> bool:
         return False
 
 
+def validate_catch_up(policy: str) -> bool:
+    """
+    Check if a catch-up policy is valid
+    """
+    return policy in CATCH_UP_POLICIES
+
+
+def fires_at(schedule: str, dt: datetime) -> bool:
+    """
+    Check if a cron schedule fires at the minute of `dt`
+    """
+    return all(field.match(dt) for field in _parse_schedule(schedule))
+
+
+def next_fire_time(schedule: str, after: datetime) -> datetime:
+    """
+    Gets the first time after `after` (exclusive) that matches a cron schedule.
+    Skips whole days and hours that cannot match instead of testing every minute.
+    """
+    minute, hour, day, month, weekday = _parse_schedule(schedule)
+
+    dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    # every valid schedule fires within a few years (e.g. only on Feb 29th)
+    limit = dt + timedelta(days=366 * 8)
+    while dt < limit:
+        if not (month.match(dt) and day.match(dt) and weekday.match(dt)):
+            dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+        elif not hour.match(dt):
+            dt = (dt + timedelta(hours=1)).replace(minute=0)
+        elif not minute.match(dt):
+            dt += timedelta(minutes=1)
+        else:
+            return dt
+
+    raise ValueError(f"cron schedule '{schedule}' never runs.")
+
+
+def prev_fire_time(schedule: str, before: datetime) -> datetime:
+    """
+    Gets the last time at or before `before` (inclusive) that matches a cron schedule.
+    """
+    minute, hour, day, month, weekday = _parse_schedule(schedule)
+
+    dt = before.replace(second=0, microsecond=0)
+    limit = dt - timedelta(days=366 * 8)
+    while dt > limit:
+        if not (month.match(dt) and day.match(dt) and weekday.match(dt)):
+            dt = dt.replace(hour=0, minute=0) - timedelta(minutes=1)
+        elif not hour.match(dt):
+            dt = dt.replace(minute=0) - timedelta(minutes=1)
+        elif not minute.match(dt):
+            dt -= timedelta(minutes=1)
+        else:
+            return dt
+
+    raise ValueError(f"cron schedule '{schedule}' never runs.")
+
+
 def validate_retention(retention: str) -> Optional[str]:
     """
     Check if a retention policy is valid (E.g. '1y2m3w4d5h6r')
@@ -376,24 +396,43 @@ def validate_paths(paths: list[str]) -> Optional[str]:
     return None
 
 
-def send_to_daemon(action: str, kwargs: dict[str, str] = {}) -> dict[str, str]:
-    """Handles IPC communication with the root daemon."""
-    payload = json.dumps({"action": action, "kwargs": kwargs})
-
+def _daemon_request(action: str, kwargs: dict[str, Any]) -> dict[str, Any]:
+    """Sends one request to the root daemon and returns its response."""
+    request_id = next(_request_ids)
     try:
         with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
             client.connect(SOCKET_PATH)
-            client.sendall(payload.encode("utf-8"))
-
-            response_data = client.recv(4096).decode("utf-8")
-            response: dict[str, str] = json.loads(response_data)
-
-            if response.get("status") == "error":
-                raise RuntimeError(f"Daemon Error: {response.get('message')}")
-
-            return response
-
+            send_frame(client, {"id": request_id, "action": action, "kwargs": kwargs})
+            response = recv_frame(client)
     except FileNotFoundError:
         raise RuntimeError("Error: Daemon socket not found. Is peerstashd running?")
     except Exception as e:
         raise RuntimeError(f"Communication error: {e}")
+
+    if response is None:
+        raise RuntimeError("Communication error: daemon closed the connection")
+    if response.get("id") not in (request_id, None):
+        raise RuntimeError("Communication error: response does not match the request")
+    return response
+
+
+def send_to_daemon(action: str, kwargs: dict[str, Any] = {}) -> dict[str, Any]:
+    """Handles IPC communication with the root daemon."""
+    response = _daemon_request(action, kwargs)
+    if response.get("status") == "error":
+        raise RuntimeError(f"Daemon Error: {response.get('message')}")
+    return response
+
+
+def send_batch_to_daemon(
+    requests: list[tuple[str, dict[str, Any]]],
+) -> list[dict[str, Any]]:
+    """
+    Sends several requests to the root daemon in one round trip. Returns the
+    response of each request, in order, without raising for failed ones.
+    """
+    response = send_to_daemon(
+        "batch",
+        {"requests": [{"action": action, "kwargs": kwargs} for action, kwargs in requests]},
+    )
+    return response["results"]
@@ -14,95 +14,135 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import json
 import logging
 import os
+import pwd
 import shutil
+import signal
 import socketserver
+import sys
+import threading
 from typing import Any
 
+from peerstash.cli import DAEMON_COMMANDS
+from peerstash.cli.thin import capture_output, route_output, run_cli
+from peerstash.core.backup import resume_removals
 from peerstash.core.db import db_get_user
-from peerstash.core.utils import (update_crontab, validate_schedule,
+from peerstash.core.ipc import SOCKET_PATH, FramedRequestHandler, peer_uid
+from peerstash.core.jobqueue import JobQueue
+from peerstash.core.logs import setup_logging
+from peerstash.core.metrics import MetricsServer, interface_address
+from peerstash.core.scheduler import Scheduler
+from peerstash.core.utils import (validate_catch_up, validate_schedule,
                                   validate_task_name)
 
-SOCKET_PATH = "/var/run/peerstash.sock"
-PEERSTASH_BIN = "/usr/local/bin/peerstash"
-
-# configure logging
-os.makedirs("/var/log/peerstash", exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.FileHandler("/var/log/peerstash/peerstash.log"),
-        logging.StreamHandler(),
-    ],
-)
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+PEER_CONCURRENCY = int(os.getenv("PEER_CONCURRENCY", "1"))
+# Prometheus metrics are served on this address, a port of 0 turns them off.
+# By default, they are served on the Docker bridge of the container, which the
+# host publishes, but not on Tailscale.
+METRICS_ADDRESS = os.getenv("METRICS_ADDRESS", "")
+METRICS_INTERFACE = os.getenv("METRICS_INTERFACE", "eth0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9737"))
+
 logger = logging.getLogger(__name__)
 
 
-class PeerstashDaemonHandler(socketserver.BaseRequestHandler):
-    def handle(self):
-        try:
-            data = self.request.recv(4096).decode("utf-8").strip()
-            if not data:
-                return
+def is_admin(uid: int) -> bool:
+    """Checks that a uid is root or the PeerStash user."""
+    if uid == 0:
+        return True
+    user = db_get_user()
+    if not user:
+        return False
+    try:
+        return uid == pwd.getpwnam(user).pw_uid
+    except KeyError:
+        return False
 
-            payload: dict[str, Any] = json.loads(data)
-            action = payload.get("action", "")
-            kwargs = payload.get("kwargs", {})
 
-            response = self.route_action(action, kwargs)
-            self.request.sendall(json.dumps(response).encode("utf-8"))
+class PeerstashDaemonServer(socketserver.ThreadingUnixStreamServer):
+    # each client is served in its own thread, so a slow request does not block the others
+    daemon_threads = True
 
-        except json.JSONDecodeError:
-            self.request.sendall(
-                json.dumps({"status": "error", "message": "Invalid JSON"}).encode(
-                    "utf-8"
-                )
-            )
-        except Exception as e:
-            self.request.sendall(
-                json.dumps({"status": "error", "message": str(e)}).encode("utf-8")
-            )
+    def __init__(self, server_address: str, scheduler: Scheduler, queue: JobQueue):
+        self.scheduler = scheduler
+        self.queue = queue
+        super().__init__(server_address, PeerstashDaemonHandler)
+
+
+class PeerstashDaemonHandler(FramedRequestHandler):
+    server: PeerstashDaemonServer
 
-    def route_action(self, action: str, kwargs: dict[str, str] = {}) -> dict[str, str]:
+    def route_action(self, action: str, kwargs: dict[str, Any] = {}) -> dict[str, Any]:
         if action == "create_task":
             return self.create_task(**kwargs)
         elif action == "remove_task":
             return self.remove_task(**kwargs)
+        elif action == "list_jobs":
+            return self.list_jobs()
+        elif action == "queue_status":
+            return self.queue_status()
         elif action == "sync_hosts":
             return self.sync_hosts()
+        elif action == "run_command":
+            return self.run_command(**kwargs)
         else:
             return {"status": "error", "message": "Unknown action"}
 
     def create_task(
-        self, task_name: str, schedule: str, prune_schedule: str
+        self, task_name: str, schedule: str, prune_schedule: str, catch_up: str = "once"
     ) -> dict[str, str]:
         if name_error := validate_task_name(task_name):
             return {"status": "error", "message": f"Invalid task name ({name_error})."}
         if not validate_schedule(schedule) or not validate_schedule(prune_schedule):
             return {"status": "error", "message": "Invalid schedule format."}
+        if not validate_catch_up(catch_up):
+            return {"status": "error", "message": "Invalid catch-up policy."}
 
-        backup_job = (
-            f"{schedule} {PEERSTASH_BIN} backup {task_name} 10"
-        )
-        prune_job = (
-            f"{prune_schedule} {PEERSTASH_BIN} prune {task_name} 10"
-        )
-
-        logger.info(f"Creating recurring tasks for '{task_name}': backup={schedule} prune={prune_schedule}")
-        success, msg = update_crontab(task_name, [backup_job, prune_job])
-        return {"status": "success" if success else "error", "message": msg}
+        logger.info(f"Creating recurring tasks for '{task_name}': backup={schedule} prune={prune_schedule} catch_up={catch_up}")
+        self.server.scheduler.set_task(task_name, schedule, prune_schedule, catch_up)
+        return {"status": "success", "message": "Success"}
 
     def remove_task(self, task_name: str) -> dict[str, str]:
         if name_error := validate_task_name(task_name):
             return {"status": "error", "message": f"Invalid task name ({name_error})."}
 
         logger.info(f"Removing recurring tasks for '{task_name}'")
-        success, msg = update_crontab(task_name)
-        return {"status": "success" if success else "error", "message": msg}
+        self.server.scheduler.remove_task(task_name)
+        return {"status": "success", "message": "Success"}
+
+    def list_jobs(self) -> dict[str, Any]:
+        return {"status": "success", "jobs": self.server.scheduler.list_jobs()}
+
+    def queue_status(self) -> dict[str, Any]:
+        return {"status": "success", **self.server.queue.status()}
+
+    def run_command(self, argv: list[str]) -> dict[str, Any]:
+        # the socket is open to every user, but commands run as root
+        uid = peer_uid(self.request)
+        if not is_admin(uid):
+            logger.warning(f"Refused to run 'peerstash {' '.join(argv)}' for uid {uid}")
+            return {"status": "error", "message": "Only root or the PeerStash user can run commands."}
+        if not argv or argv[0] not in DAEMON_COMMANDS:
+            return {"status": "error", "message": "Command cannot be run by the daemon."}
+
+        connected = True
+
+        def send_output(stream: str, text: str) -> None:
+            # a client that went away does not stop the job
+            nonlocal connected
+            if not connected:
+                return
+            try:
+                self.emit({"stream": stream, "output": text})
+            except OSError:
+                connected = False
+
+        logger.info(f"Running 'peerstash {' '.join(argv)}' for a client")
+        with capture_output(send_output):
+            exit_code = run_cli(argv)
+        return {"status": "success", "exit_code": exit_code}
 
     def sync_hosts(self) -> dict[str, str]:
         user = db_get_user()
@@ -128,16 +168,56 @@ class PeerstashDaemonHandler(socketserver.BaseRequestHandler):
 
 def main():
     """Entry point for the daemon."""
+    setup_logging(rotate=True, stream=True)
+    # exit normally on `supervisorctl stop`, so running jobs are stopped and
+    # queued log records are written
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
     # clean up stale socket file
     if os.path.exists(SOCKET_PATH):
         os.remove(SOCKET_PATH)
 
-    # create new socket
-    with socketserver.UnixStreamServer(SOCKET_PATH, PeerstashDaemonHandler) as server:
-        # open socket to users
-        os.chmod(SOCKET_PATH, 0o666)
-        logger.info(f"Peerstash Daemon listening on {SOCKET_PATH}")
-        server.serve_forever()
+    # commands run for thin clients print to their client
+    route_output()
+
+    # schedule the tasks in the database
+    queue = JobQueue(MAX_CONCURRENT_JOBS, PEER_CONCURRENCY)
+    scheduler = Scheduler(queue)
+    try:
+        scheduler.load()
+    except Exception as e:
+        logger.error(f"Failed to load scheduled tasks: {e}")
+    threading.Thread(target=scheduler.run, name="peerstash-scheduler", daemon=True).start()
+
+    # serve metrics for Prometheus
+    if METRICS_PORT:
+        address = METRICS_ADDRESS or METRICS_INTERFACE
+        try:
+            if not METRICS_ADDRESS:
+                address = interface_address(METRICS_INTERFACE)
+            metrics = MetricsServer((address, METRICS_PORT), queue)
+        except OSError as e:
+            logger.error(f"Could not serve metrics on {address}:{METRICS_PORT}: {e}")
+        else:
+            threading.Thread(target=metrics.serve_forever, name="peerstash-metrics", daemon=True).start()
+            logger.info(f"Serving metrics on http://{address}:{METRICS_PORT}/metrics")
+
+    # finish removing repos that were interrupted
+    threading.Thread(target=resume_removals, name="peerstash-removals", daemon=True).start()
+
+    try:
+        # create new socket
+        with PeerstashDaemonServer(SOCKET_PATH, scheduler, queue) as server:
+            # open socket to users
+            os.chmod(SOCKET_PATH, 0o666)
+            logger.info(f"Peerstash Daemon listening on {SOCKET_PATH}")
+            server.serve_forever()
+    finally:
+        # running jobs release their locks and finish their status before exiting
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        logger.info("Stopping Peerstash Daemon...")
+        scheduler.stop()
+        queue.stop(interrupt=True)
 
 
 if __name__ == "__main__":
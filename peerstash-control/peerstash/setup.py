@@ -23,14 +23,14 @@ from typing import Any
 
 import requests
 
-from peerstash.core.backup import unmount_task
-from peerstash.core.utils import update_crontab
+from peerstash.core.backup import MOUNT_ROOT, unmount_task
+from peerstash.core.db_migrations import migrate
+from peerstash.core.logs import setup_logging
 from peerstash.cli import __version__
 
 USERNAME = os.getenv("USERNAME", "")
 PASSWORD = os.getenv("PASSWORD", "")
 DEFAULT_QUOTA_GB = os.getenv("DEFAULT_QUOTA_GB", "10")
-PEERSTASH_BIN = "/usr/local/bin/peerstash"
 DB_PATH = "/var/lib/peerstash/peerstash.db"
 SFTPGO_URL = "http://localhost:8080/api/v2"
 
@@ -39,32 +39,11 @@ def init_db_and_restore():
     """Initializes the database or restores tasks/hosts if it exists."""
     db_exists = os.path.exists(DB_PATH)
     conn = sqlite3.connect(DB_PATH)
+    # WAL is stored in the DB file, so every later connection uses it too
+    conn.execute("PRAGMA journal_mode=WAL")
     cursor = conn.cursor()
 
-    if db_exists:
-        print("SQLite database found. Restoring tasks and known_hosts...")
-
-        # Restore known_hosts
-        known_hosts_path = f"/home/{USERNAME}/.ssh/known_hosts"
-        cursor.execute("SELECT hostname, port, public_key FROM hosts")
-        with open(known_hosts_path, "a") as f:
-            for hostname, port, public_key in cursor.fetchall():
-                f.write(f"\n[{hostname}]:{port} {public_key}\n")
-
-        # Restore crontab tasks
-        cursor.execute("SELECT name, schedule, prune_schedule FROM tasks")
-        for name, schedule, prune_schedule in cursor.fetchall():
-            backup_job = (
-                f"{schedule} {PEERSTASH_BIN} backup {name} 10"
-            )
-            prune_job = (
-                f"{prune_schedule} {PEERSTASH_BIN} prune {name} 10"
-            )
-            update_crontab(name, [backup_job, prune_job])
-            # force unmount stale repos
-            unmount_task(name)
-
-    else:
+    if not db_exists:
         print("No database found. Creating a new empty database...")
         cursor.executescript(
             f"""
@@ -104,10 +83,49 @@ def init_db_and_restore():
         )
         os.chmod(DB_PATH, 0o700)
 
+    # bring the schema up to date first, so a failed restore can't hold it back
+    version = migrate(conn)
     conn.commit()
+    print(f"Database schema at version {version}.")
+
+    if db_exists:
+        print("SQLite database found. Restoring known_hosts...")
+        _restore_known_hosts(cursor)
+        # peerstashd schedules the tasks on start
+        _unmount_stale_repos()
+
     conn.close()
 
 
+def _restore_known_hosts(cursor: sqlite3.Cursor) -> None:
+    """Adds the keys of known peers to known_hosts, skipping entries that survived a restart."""
+    known_hosts_path = f"/home/{USERNAME}/.ssh/known_hosts"
+    known = set()
+    if os.path.exists(known_hosts_path):
+        with open(known_hosts_path) as f:
+            known = {line.strip() for line in f}
+    cursor.execute("SELECT hostname, port, public_key FROM hosts")
+    entries = [f"[{hostname}]:{port} {public_key}" for hostname, port, public_key in cursor.fetchall()]
+    with open(known_hosts_path, "a") as f:
+        for entry in entries:
+            if entry not in known:
+                f.write(f"\n{entry}\n")
+
+
+def _unmount_stale_repos() -> None:
+    """Force unmounts the repos left mounted by the previous container."""
+    if not os.path.isdir(MOUNT_ROOT):
+        return
+    for name in os.listdir(MOUNT_ROOT):
+        # setup.sh keeps marker files such as .nomedia next to the mount points
+        if name.startswith(".") or not os.path.isdir(os.path.join(MOUNT_ROOT, name)):
+            continue
+        try:
+            unmount_task(name)
+        except Exception as e:
+            print(f"Warning: could not unmount stale repo '{name}' ({e})")
+
+
 def wait_for_sftpgo(port=8080, timeout=60):
     """Blocks until the SFTPGo port is actively accepting connections."""
     start_time = time.time()
@@ -161,6 +179,7 @@ def setup_sftpgo():
 
 
 def main():
+    setup_logging()
     if USERNAME == "":
         print("USERNAME not set in environment")
         sys.exit(1)
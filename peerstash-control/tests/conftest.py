@@ -1,4 +1,3 @@
-import logging
 import os
 from pathlib import Path
 
@@ -7,6 +6,8 @@ from pytest import MonkeyPatch
 from pytest_mock import MockerFixture
 from typer.testing import CliRunner
 
+from peerstash.core.sftp import SFTPPool
+
 
 @pytest.fixture
 def runner() -> CliRunner:
@@ -21,19 +22,6 @@ pytest_plugins = [
     "tests.mocks.db_mock",
 ]
 
-# prevent logging from running in unit tests
-class MockFileHandler(logging.NullHandler):
-    def __init__(self, filename, mode='a', encoding=None, delay=False, errors=None):
-        # Ignore the file path entirely and initialize the empty NullHandler
-        super().__init__()
-logging.FileHandler = MockFileHandler  # type: ignore
-_original_makedirs = os.makedirs
-def _mock_makedirs(name, mode=0o777, exist_ok=False):
-    if str(name).startswith("/var/log/peerstash"):
-        return
-    _original_makedirs(name, mode, exist_ok)
-os.makedirs = _mock_makedirs
-
 
 @pytest.fixture(autouse=True)
 def mock_setup(mocker: MockerFixture) -> None:
@@ -42,19 +30,26 @@ def mock_setup(mocker: MockerFixture) -> None:
         "backup",
         "cancel",
         "evict",
+        "history",
         "id",
         "list",
         "mount",
         "peers",
         "prune",
+        "queue",
         "register",
         "restore",
         "schedule",
         "setup",
         "snapshots",
+        "status",
         "unmount",
     ]
 
+    # start every test with an empty SFTP connection pool and quota cache
+    mocker.patch("peerstash.core.sftp._pool", SFTPPool())
+    mocker.patch("peerstash.core.sftp._disk_usage_cache", {})
+
     # Patch check_setup wherever it was imported
     for cmd in cli_commands:
         mocker.patch(
@@ -79,6 +74,12 @@ def mock_daemon_and_locks(mocker: MockerFixture):
         ],
     )
 
+    multi_patch(
+        "send_batch_to_daemon",
+        ["peerstash.core.utils", "peerstash.core.backup"],
+        side_effect=lambda requests: [{"status": "success"} for _ in requests],
+    )
+
     # don't run lock calls
     multi_patch(
         "acquire_task_lock",
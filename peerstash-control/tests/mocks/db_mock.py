@@ -3,6 +3,10 @@ from datetime import datetime
 import pytest
 from pytest_mock import MockerFixture
 
+from peerstash.core.db_schemas import (ProgressRead, RemovalRead,
+                                       SnapshotRead, TaskRunRead,
+                                       VerificationRead)
+
 
 class MockTask:
     """A simple class to represent a Task DB record."""
@@ -28,6 +32,9 @@ class MockTask:
         self.status = status
         self.last_run = datetime.now()
         self.last_exit_code = 0
+        self.last_backup = None
+        self.last_prune = None
+        self.catch_up = "once"
 
 
 @pytest.fixture
@@ -38,6 +45,11 @@ def mock_db(mocker: MockerFixture):
     """
     db_state = {
         "tasks": {},
+        "verifications": {},
+        "progress": {},
+        "task_runs": [],
+        "removals": {},
+        "snapshots": {},
         "users": {"mockuser": True},
         "hosts": {"peerstash-node1": True},
     }
@@ -54,7 +66,12 @@ def mock_db(mocker: MockerFixture):
     # DB Helper Mocks
     multi_patch(
         "db_get_user",
-        ["peerstash.core.db", "peerstash.core.backup", "peerstash.core.identity"],
+        [
+            "peerstash.core.db",
+            "peerstash.core.backup",
+            "peerstash.core.identity",
+            "peerstash.core.restic_runner",
+        ],
         return_value="mockuser",
     )
 
@@ -92,11 +109,12 @@ def mock_db(mocker: MockerFixture):
         return name in db_state["tasks"]
 
     def mock_add_task(
-        name, include, exclude, hostname, schedule, retention, prune_schedule
+        name, include, exclude, hostname, schedule, retention, prune_schedule, catch_up="once"
     ):
         db_state["tasks"][name] = MockTask(
             name, include, exclude, hostname, schedule, retention, prune_schedule
         )
+        db_state["tasks"][name].catch_up = catch_up
 
     def mock_update_task(name, task_update):
         if name in db_state["tasks"]:
@@ -108,12 +126,14 @@ def mock_db(mocker: MockerFixture):
     def mock_delete_task(name):
         if name in db_state["tasks"]:
             del db_state["tasks"][name]
+            db_state["snapshots"].pop(name, None)
+            db_state["progress"].pop(name, None)
             return True
         return False
 
     multi_patch(
         "db_get_task",
-        ["peerstash.core.db", "peerstash.core.backup"],
+        ["peerstash.core.db", "peerstash.core.backup", "peerstash.cli.cmd_history"],
         side_effect=mock_get_task,
     )
 
@@ -131,7 +151,7 @@ def mock_db(mocker: MockerFixture):
 
     multi_patch(
         "db_update_task",
-        ["peerstash.core.db", "peerstash.core.backup"],
+        ["peerstash.core.db", "peerstash.core.backup", "peerstash.core.task_state"],
         side_effect=mock_update_task,
     )
 
@@ -141,4 +161,139 @@ def mock_db(mocker: MockerFixture):
         side_effect=mock_delete_task,
     )
 
+    # Verification Mocks
+    def mock_set_verification(name, verification_update):
+        current = db_state["verifications"].get(name)
+        data = current.model_dump() if current else {"task_name": name, "cursor": 0}
+        data.update(verification_update.model_dump(exclude_none=True))
+        db_state["verifications"][name] = VerificationRead(**data)
+
+    multi_patch(
+        "db_get_verification",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=lambda name: db_state["verifications"].get(name),
+    )
+
+    multi_patch(
+        "db_set_verification",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=mock_set_verification,
+    )
+
+    # Progress Mocks
+    def mock_set_progress(name, progress_update):
+        db_state["progress"][name] = ProgressRead(
+            task_name=name, updated=datetime.now(), **progress_update.model_dump()
+        )
+
+    multi_patch(
+        "db_set_progress",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=mock_set_progress,
+    )
+
+    multi_patch(
+        "db_list_progress",
+        ["peerstash.core.db", "peerstash.cli.cmd_status"],
+        side_effect=lambda: list(db_state["progress"].values()),
+    )
+
+    # Task Run Mocks
+    def mock_add_task_run(run):
+        db_state["task_runs"].append(
+            TaskRunRead(id=len(db_state["task_runs"]) + 1, **run.model_dump())
+        )
+
+    def mock_list_task_runs(name, kind=None, limit=20):
+        runs = [
+            r
+            for r in db_state["task_runs"]
+            if r.task_name == name and (kind is None or r.kind == kind)
+        ]
+        return runs[-limit:]
+
+    multi_patch(
+        "db_add_task_run",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=mock_add_task_run,
+    )
+
+    def mock_finish_task(name, task_update, run):
+        mock_update_task(name, task_update)
+        mock_add_task_run(run)
+
+    multi_patch(
+        "db_finish_task",
+        ["peerstash.core.db", "peerstash.core.task_state"],
+        side_effect=mock_finish_task,
+    )
+
+    multi_patch(
+        "db_list_task_runs",
+        ["peerstash.core.db", "peerstash.cli.cmd_history"],
+        side_effect=mock_list_task_runs,
+    )
+
+    # Removal Mocks
+    def mock_add_removal(hostname, path):
+        db_state["removals"].setdefault(
+            (hostname, path),
+            RemovalRead(hostname=hostname, path=path, started=datetime.now()),
+        )
+
+    multi_patch(
+        "db_add_removal",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=mock_add_removal,
+    )
+
+    multi_patch(
+        "db_list_removals",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=lambda: list(db_state["removals"].values()),
+    )
+
+    multi_patch(
+        "db_delete_removal",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=lambda hostname, path: db_state["removals"].pop((hostname, path), None),
+    )
+
+    # Snapshot Mocks
+    def mock_list_snapshots(name=None):
+        names = [name] if name else sorted(db_state["snapshots"])
+        return [
+            snap
+            for n in names
+            for snap in sorted(db_state["snapshots"].get(n, {}).values(), key=lambda s: s.time)
+        ]
+
+    def mock_add_snapshot(name, snapshot):
+        db_state["snapshots"].setdefault(name, {})[snapshot.id] = SnapshotRead(
+            task_name=name, **snapshot.model_dump()
+        )
+
+    def mock_set_snapshots(name, snapshots):
+        db_state["snapshots"][name] = {}
+        for snapshot in snapshots:
+            mock_add_snapshot(name, snapshot)
+
+    multi_patch(
+        "db_list_snapshots",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=mock_list_snapshots,
+    )
+
+    multi_patch(
+        "db_add_snapshot",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=mock_add_snapshot,
+    )
+
+    multi_patch(
+        "db_set_snapshots",
+        ["peerstash.core.db", "peerstash.core.backup"],
+        side_effect=mock_set_snapshots,
+    )
+
     return db_state
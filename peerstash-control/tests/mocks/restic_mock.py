@@ -1,3 +1,4 @@
+import json
 import os
 
 import pytest
@@ -11,19 +12,94 @@ def generate_restic_error(msg: str, exit_code: int = 1):
     )
 
 
+class MockResticProcess:
+    """A fake `restic backup --json` process that streams canned output."""
+
+    def __init__(self, lines: list[str], returncode: int = 0):
+        self.stdout = iter(lines)
+        # like Popen, the exit code is only known once the process was waited for
+        self.returncode = None
+        self.exit_code = returncode
+        self.signals: list[int] = []
+        self.killed = False
+
+    def send_signal(self, sig: int):
+        self.signals.append(sig)
+        self.exit_code = 130
+
+    def wait(self, timeout=None):
+        if self.returncode is None:
+            self.returncode = self.exit_code
+        return self.returncode
+
+    def kill(self):
+        self.killed = True
+        self.exit_code = -9
+
+
+def mock_backup_stream(data_added: int = 1048576, fail: bool = False):
+    """Builds the JSON lines restic prints for a backup with --verbose=2."""
+    if fail:
+        lines = [
+            json.dumps(
+                {
+                    "message_type": "error",
+                    "error": {"message": "Permission denied"},
+                    "during": "archival",
+                    "item": "/forbidden_path",
+                }
+            ),
+            "Fatal: unable to save snapshot: Permission denied",
+        ]
+        return MockResticProcess([f"{line}\n" for line in lines], 1)
+
+    lines = [
+        {
+            "message_type": "status",
+            "seconds_elapsed": 4,
+            "seconds_remaining": 4,
+            "percent_done": 0.5,
+            "total_files": 10,
+            "files_done": 5,
+            "total_bytes": data_added * 2,
+            "bytes_done": data_added,
+        },
+        {
+            "message_type": "verbose_status",
+            "action": "new",
+            "item": "/mnt/peerstash_root/test/file.txt",
+            "data_size": data_added,
+            "data_size_in_repo": data_added,
+            "metadata_size": 0,
+            "metadata_size_in_repo": 0,
+        },
+        {
+            "message_type": "summary",
+            "files_new": 5,
+            "files_changed": 2,
+            "data_added": data_added,
+            "total_files_processed": 10,
+            "total_bytes_processed": data_added * 2,
+            "total_duration": 8,
+            "snapshot_id": "snap123",
+        },
+    ]
+    return MockResticProcess([f"{json.dumps(line)}\n" for line in lines])
+
+
 @pytest.fixture
 def mock_restic(mocker: MockerFixture):
-    """Mocks the resticpy commands used by the backup system."""
+    """Mocks the resticpy commands used by the restic runner."""
 
-    # restic.init
-    def mock_init(*args, **kwargs):
+    # restic init
+    def mock_init(base_cmd, *args, **kwargs):
         if "corrupted" in os.getenv("RESTIC_REPOSITORY", ""):
             raise generate_restic_error("Fatal: repository corrupted", 1)
 
-    mocker.patch("restic.init", side_effect=mock_init)
+    mocker.patch("restic.internal.init.run", side_effect=mock_init)
 
-    # restic.backup
-    def mock_backup(paths=None, exclude_patterns=None, dry_run=False, **kwargs):
+    # restic backup
+    def mock_backup(base_cmd, paths=None, exclude_patterns=None, dry_run=False, **kwargs):
         # Only trigger the failure on the REAL backup, not the dry run
         if os.getenv("MOCK_BACKUP_FAIL") == "1" and not dry_run:
             raise generate_restic_error("Fatal: Permission denied", 1)
@@ -36,37 +112,41 @@ def mock_restic(mocker: MockerFixture):
             "snapshot_id": "snap123",
         }
 
-    mocker.patch("restic.backup", side_effect=mock_backup)
+    mocker.patch("restic.internal.backup.run", side_effect=mock_backup)
 
-    # restic.check
-    def mock_check(*args, **kwargs):
-        if "corrupted" in os.getenv("RESTIC_REPOSITORY", ""):
-            return False
-        return True
+    # restic backup (streamed through Popen)
+    def mock_popen(args, **kwargs):
+        if args[:1] == ["/usr/bin/restic"] and "backup" in args:
+            return mock_backup_stream(fail=os.getenv("MOCK_BACKUP_FAIL") == "1")
+        return mocker.MagicMock()
 
-    mocker.patch("restic.check", side_effect=mock_check)
+    mocker.patch("subprocess.Popen", side_effect=mock_popen)
 
-    # restic.forget
-    def mock_forget(**kwargs):
+    # restic forget
+    def mock_forget(base_cmd, **kwargs):
         # Simulate a failure during the prune step
         if kwargs.get("prune") and kwargs.get("keep_last") == 0:
             raise generate_restic_error("Fatal: failed to prune repository", 1)
         return None  # forget/prune passes silently on success
 
-    mocker.patch("restic.forget", side_effect=mock_forget)
+    mocker.patch("restic.internal.forget.run", side_effect=mock_forget)
 
-    # restic.restore
-    def mock_restore(*args, **kwargs):
+    # restic restore
+    def mock_restore(base_cmd, *args, **kwargs):
         if os.getenv("MOCK_RESTORE_FAIL") == "1":
             raise generate_restic_error("Fatal: target directory does not exist", 1)
 
-    mocker.patch("restic.restore", side_effect=mock_restore)
-
-    # restic.snapshots
-    def mock_snapshots(*args, **kwargs):
-        return [{"id": "snap123", "time": "2026-03-01T12:00:00Z"}]
+    mocker.patch("restic.internal.restore.run", side_effect=mock_restore)
 
-    mocker.patch("restic.snapshots", side_effect=mock_snapshots)
+    # restic snapshots
+    def mock_snapshots(base_cmd, *args, **kwargs):
+        return [
+            {
+                "id": "snap123",
+                "short_id": "snap123",
+                "time": "2026-03-01T12:00:00Z",
+                "paths": ["/mnt/peerstash_root/test"],
+            }
+        ]
 
-    # restic.unlock
-    mocker.patch("restic.unlock")
+    mocker.patch("restic.internal.snapshots.run", side_effect=mock_snapshots)
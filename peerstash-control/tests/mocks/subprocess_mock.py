@@ -21,7 +21,7 @@ def subprocess_router(args, **kwargs):
     """Routes the intercepted subprocess.run calls to the correct mock response."""
 
     # restic prune
-    if args[:2] == ["/usr/bin/restic", "prune"]:
+    if args[:1] == ["/usr/bin/restic"] and "prune" in args:
         # Magic input: trigger failure if a specific env var is set in the test
         import os
 
@@ -29,6 +29,14 @@ def subprocess_router(args, **kwargs):
             raise generate_subprocess_error(args, 1, "Fatal: repository corrupted")
         return subprocess.CompletedProcess(args, 0, stdout=b"prune successful")
 
+    # restic check
+    if args[:1] == ["/usr/bin/restic"] and "check" in args:
+        import os
+
+        if "corrupted" in os.getenv("RESTIC_REPOSITORY", ""):
+            raise generate_subprocess_error(args, 1, "Fatal: repository contains errors")
+        return subprocess.CompletedProcess(args, 0, stdout=b"no errors were found")
+
     # fusermount
     if args[:1] == ["fusermount"]:
         return subprocess.CompletedProcess(args, 0, stdout=b"")
@@ -78,7 +86,7 @@ def subprocess_router(args, **kwargs):
 
     # sftp (checking disk space)
     if args[:1] == ["sftp"]:
-        connection_string = args[3]  # e.g., "user@hostname"
+        connection_string = args[-1]  # e.g., "user@hostname"
 
         # Simulate connection failure to a bad host
         if "bad_host" in connection_string:
@@ -116,22 +124,6 @@ def subprocess_router(args, **kwargs):
             raise generate_subprocess_error(args, 1, "sudo: incorrect password")
         return subprocess.CompletedProcess(args, 0, stdout=b"")
 
-    # crontab -l (list cron jobs)
-    if args[:2] == ["crontab", "-l"]:
-        # Return the specific cron list as a string (text=True)
-        # dummy crontab for task abcd
-        cron_content = (
-            '0 3 * * * /usr/local/bin/peerstash backup abcd 10\n'
-            '0 4 * * 0 /usr/local/bin/peerstash prune abcd 10\n'
-        )
-        return subprocess.CompletedProcess(args, 0, stdout=cron_content)
-
-    # crontab - (write cron jobs)
-    if args[:2] == ["crontab", "-"]:
-        # The new cron content is passed via the 'input' kwarg
-        # Automatically passes in standard conditions
-        return subprocess.CompletedProcess(args, 0, stdout="")
-
     # Fallback for unhandled subprocess calls
     raise ValueError(f"Unhandled subprocess command in mock: {args}")
 
@@ -140,6 +132,11 @@ def subprocess_router(args, **kwargs):
 def mock_subprocess(mocker: MockerFixture):
     """Globally patches subprocess.run with our router."""
     mocker.patch("subprocess.run", side_effect=subprocess_router)
+    # peers without statvfs support fall back to the routed `sftp df`
+    mocker.patch(
+        "peerstash.core.sftp.sftp_session",
+        side_effect=OSError("statvfs@openssh.com not supported"),
+    )
 
 @pytest.fixture
 def mock_popen(mocker: MockerFixture) -> MockType:
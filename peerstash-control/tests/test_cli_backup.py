@@ -12,16 +12,7 @@ def test_backup_success(mock_setup, runner: CliRunner, mocker: MockerFixture):
 
     assert result.exit_code == 0
     assert "completed" in result.stdout
-    mock_run.assert_called_once_with("my_task", offset=0)
-
-
-def test_backup_with_offset(runner: CliRunner, mocker: MockerFixture):
-    mock_run = mocker.patch("peerstash.cli.cmd_backup.run_backup")
-
-    result = runner.invoke(app, ["my_task", "15"])
-
-    assert result.exit_code == 0
-    mock_run.assert_called_once_with("my_task", offset=15)
+    mock_run.assert_called_once_with("my_task")
 
 
 def test_backup_value_error(runner: CliRunner, mocker: MockerFixture):
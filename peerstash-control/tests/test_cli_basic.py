@@ -1,9 +1,60 @@
+import re
+import subprocess
+import sys
+
 from typer.testing import CliRunner
 
-from peerstash.cli import app
+from peerstash.cli import COMMANDS, app
+
+# budget for `import peerstash.cli` in a fresh interpreter (cumulative -X importtime, ms)
+IMPORT_BUDGET_MS = 150
+
+
+def cold_import(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
 
 
 def test_app_help(runner: CliRunner):
     result = runner.invoke(app, ["--help"])
     assert result.exit_code == 0
     assert "PeerStash" in result.stdout
+    for name in COMMANDS:
+        assert name in result.stdout
+
+
+def test_app_version(runner: CliRunner):
+    result = runner.invoke(app, ["--version"])
+    assert result.exit_code == 0
+    assert "PeerStash" in result.stdout
+
+
+def test_app_unknown_command(runner: CliRunner):
+    result = runner.invoke(app, ["bogus"])
+    assert result.exit_code != 0
+
+
+def test_subcommands_load_lazily():
+    result = cold_import(
+        "import sys, peerstash.cli; print(' '.join(sorted(sys.modules)))"
+    )
+    loaded = set(result.stdout.split())
+
+    for heavy in ("restic", "paramiko", "requests", "commentjson", "pydantic"):
+        assert heavy not in loaded
+    assert not any(module.startswith("peerstash.core") for module in loaded)
+    assert not any(module.startswith("peerstash.cli.cmd_") for module in loaded)
+
+
+def test_import_time_budget():
+    result = cold_import("import peerstash.cli")
+
+    # last line: "import time: self | cumulative | peerstash.cli"
+    line = result.stderr.strip().splitlines()[-1]
+    match = re.search(r"\|\s*(\d+)\s*\|\s*peerstash\.cli$", line)
+    assert match, line
+    assert int(match.group(1)) / 1000 < IMPORT_BUDGET_MS
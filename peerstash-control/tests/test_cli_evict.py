@@ -14,7 +14,7 @@ def mock_evict_deps(mocker: MockerFixture):
     mock_get_tasks = mocker.patch(
         "peerstash.cli.cmd_evict.db_get_tasks_for_host", return_value=["task1", "task2"]
     )
-    mock_remove = mocker.patch("peerstash.cli.cmd_evict.remove_schedule")
+    mock_remove = mocker.patch("peerstash.cli.cmd_evict.remove_schedules")
     return mock_exists, mock_delete, mock_get_tasks, mock_remove
 
 
@@ -28,8 +28,8 @@ def test_evict_force_flag_success(
     assert result.exit_code == 0
     assert "Removed 'bob' from peers list" in result.stdout
     mock_delete.assert_called_once_with("bob")
-    # Assert remove_schedule was called for both task1 and task2
-    assert mock_remove.call_count == 2
+    # Assert both tasks were removed in one call
+    mock_remove.assert_called_once_with(["task1", "task2"])
 
 
 def test_evict_interactive_confirm(
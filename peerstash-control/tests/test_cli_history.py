@@ -0,0 +1,78 @@
+import json
+from datetime import datetime
+
+from typer.testing import CliRunner
+
+from peerstash.cli.cmd_history import app
+from peerstash.core.backup import schedule_backup
+from peerstash.core.db_schemas import TaskRunRead
+
+
+def add_run(mock_db, day, kind="backup", duration=600.0, exit_code=0):
+    mock_db["task_runs"].append(
+        TaskRunRead(
+            id=day,
+            task_name="docs",
+            kind=kind,
+            hostname="peerstash-node1",
+            started=datetime(2026, 1, day, 3, 0),
+            duration=duration,
+            phases={"space_check": 1.0, "upload": duration - 101, "check": 100.0},
+            bytes_processed=(duration - 101) * 1024**2 if kind == "backup" else None,
+            bytes_added=1024**2 if kind == "backup" else None,
+            exit_code=exit_code,
+        )
+    )
+
+
+def test_history_shows_runs_and_trend(runner: CliRunner, mock_db, mock_daemon_and_locks):
+    schedule_backup(paths=["/docs"], peer="node1", name="docs")
+    add_run(mock_db, 1, duration=600.0)
+    add_run(mock_db, 2, kind="prune", duration=30.0)
+    add_run(mock_db, 3, duration=1200.0)
+    add_run(mock_db, 4, duration=900.0, exit_code=3)
+
+    result = runner.invoke(app, ["docs"])
+
+    assert result.exit_code == 0
+    assert "2026-01-01 03:00 backup | node1 10:00 (0) 499.0MiB processed, 1.0MiB added, 1.0MiB/s" in result.stdout
+    assert "space_check=0:01 upload=8:19 check=1:40" in result.stdout
+    assert "2026-01-04 03:00 backup | node1 15:00 (3)" in result.stdout
+    # the failed run is left out of the trend
+    assert "Backup duration: 20:00 recently, 10:00 before (+100%)" in result.stdout
+    assert "Prune duration" not in result.stdout
+
+
+def test_history_kind_filter(runner: CliRunner, mock_db, mock_daemon_and_locks):
+    schedule_backup(paths=["/docs"], peer="node1", name="docs")
+    add_run(mock_db, 1)
+    add_run(mock_db, 2, kind="prune", duration=30.0)
+
+    result = runner.invoke(app, ["docs", "--kind", "prune", "--json"])
+
+    assert result.exit_code == 0
+    runs = json.loads(result.stdout)
+    assert [r["kind"] for r in runs] == ["prune"]
+
+
+def test_history_no_runs(runner: CliRunner, mock_db, mock_daemon_and_locks):
+    schedule_backup(paths=["/docs"], peer="node1", name="docs")
+
+    result = runner.invoke(app, ["docs"])
+
+    assert result.exit_code == 0
+    assert "has not run yet" in result.stdout
+
+
+def test_history_unknown_task(runner: CliRunner, mock_db):
+    result = runner.invoke(app, ["missing"])
+
+    assert result.exit_code == 1
+    assert "does not exist" in result.stderr
+
+
+def test_history_invalid_kind(runner: CliRunner, mock_db):
+    result = runner.invoke(app, ["docs", "--kind", "check"])
+
+    assert result.exit_code == 1
+    assert "Invalid kind" in result.stderr
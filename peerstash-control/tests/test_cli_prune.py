@@ -12,16 +12,7 @@ def test_prune_success(runner: CliRunner, mocker: MockerFixture):
 
     assert result.exit_code == 0
     assert "Repository for task 'my_task' has been pruned." in result.stdout
-    mock_prune.assert_called_once_with("my_task", offset=0)
-
-
-def test_prune_with_offset(runner: CliRunner, mocker: MockerFixture):
-    mock_prune = mocker.patch("peerstash.cli.cmd_prune.prune_repo")
-
-    result = runner.invoke(app, ["my_task", "45"])
-
-    assert result.exit_code == 0
-    mock_prune.assert_called_once_with("my_task", offset=45)
+    mock_prune.assert_called_once_with("my_task")
 
 
 def test_prune_value_error(runner: CliRunner, mocker: MockerFixture):
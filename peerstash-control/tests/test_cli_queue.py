@@ -0,0 +1,40 @@
+from pytest_mock import MockerFixture
+from typer.testing import CliRunner
+
+from peerstash.cli.cmd_queue import app
+
+
+def test_queue_shows_jobs(runner: CliRunner, mocker: MockerFixture):
+    mocker.patch(
+        "peerstash.cli.cmd_queue.send_to_daemon",
+        return_value={
+            "status": "success",
+            "depth": 1,
+            "average_wait": 12.4,
+            "running": [
+                {"task_name": "docs", "kind": "backup", "peer": "peerstash-alice", "running": 30.0}
+            ],
+            "pending": [
+                {"task_name": "photos", "kind": "backup", "peer": "peerstash-alice", "waiting": 5.0}
+            ],
+        },
+    )
+
+    result = runner.invoke(app)
+
+    assert result.exit_code == 0
+    assert "1 job(s) waiting (average wait 12s)" in result.stdout
+    assert "docs backup | alice running for 30s" in result.stdout
+    assert "photos backup | alice waiting for 5s" in result.stdout
+
+
+def test_queue_daemon_error(runner: CliRunner, mocker: MockerFixture):
+    mocker.patch(
+        "peerstash.cli.cmd_queue.send_to_daemon",
+        side_effect=RuntimeError("Daemon socket not found"),
+    )
+
+    result = runner.invoke(app)
+
+    assert result.exit_code == 1
+    assert "Daemon socket not found" in result.stderr
@@ -29,7 +29,7 @@ def test_schedule_new_task_success(
 
     # Verify the core function got the default CLI arguments
     mock_schedule.assert_called_once_with(
-        (["."]), "peer1", "4w3d", "0 3 * * *", "0 4 * * 0", None, "test_bkp"
+        (["."]), "peer1", "4w3d", "0 3 * * *", "0 4 * * 0", None, "test_bkp", "once"
     )
 
 
@@ -47,7 +47,7 @@ def test_schedule_new_task_multiple_include(
 
     # Verify the core function got the default CLI arguments
     mock_schedule.assert_called_once_with(
-        (["hello.txt","goodbye.txt"]), "peer1", "4w3d", "0 3 * * *", "0 4 * * 0", None, "test_bkp"
+        (["hello.txt","goodbye.txt"]), "peer1", "4w3d", "0 3 * * *", "0 4 * * 0", None, "test_bkp", "once"
     )
 
 
@@ -65,10 +65,22 @@ def test_schedule_new_task_multiple_exclude(
 
     # Verify the core function got the default CLI arguments
     mock_schedule.assert_called_once_with(
-        (["."]), "peer1", "4w3d", "0 3 * * *", "0 4 * * 0", ["*.txt"], "test_bkp"
+        (["."]), "peer1", "4w3d", "0 3 * * *", "0 4 * * 0", ["*.txt"], "test_bkp", "once"
     )
 
 
+def test_schedule_catch_up_policy(
+    runner: CliRunner, mock_schedule_deps: tuple[MockType, MockType]
+):
+    mock_schedule, mock_get_task = mock_schedule_deps
+    mock_get_task.return_value = None
+
+    result = runner.invoke(app, ["peer1", "--name", "test_bkp", "--catch-up", "skip"])
+
+    assert result.exit_code == 0
+    assert mock_schedule.call_args.args[-1] == "skip"
+
+
 def test_schedule_existing_task_with_update_flag(
     runner: CliRunner, mock_schedule_deps: tuple[MockType, MockType]
 ):
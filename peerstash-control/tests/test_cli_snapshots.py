@@ -91,3 +91,35 @@ def test_snapshots_restic_error(
 
     assert result.exit_code == 1
     assert "Error: Restic repo corrupted" in result.stderr
+
+
+def test_snapshots_refresh(
+    runner: CliRunner, mock_snap_deps: tuple[MockType, MockType, MagicMock]
+):
+    _, mock_get_snapshots, _ = mock_snap_deps
+
+    result = runner.invoke(app, ["web_backup", "--refresh"])
+
+    assert result.exit_code == 0
+    mock_get_snapshots.assert_called_once_with("web_backup", None, True)
+
+
+def test_snapshots_all_tasks(
+    runner: CliRunner,
+    mock_snap_deps: tuple[MockType, MockType, MagicMock],
+    mocker: MockerFixture,
+):
+    _, mock_get_snapshots, mock_task = mock_snap_deps
+    new_task = mocker.MagicMock()
+    new_task.name = "fresh"
+    new_task.status = "new"
+    mocker.patch(
+        "peerstash.cli.cmd_snapshots.db_list_tasks", return_value=[mock_task, new_task]
+    )
+
+    result = runner.invoke(app, ["--json"])
+
+    assert result.exit_code == 0
+    # tasks that were never backed up are skipped
+    mock_get_snapshots.assert_called_once_with("web_backup", None, False)
+    assert "'task': 'web_backup'" in result.stdout
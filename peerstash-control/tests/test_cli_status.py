@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import pytest
+from pytest_mock import MockerFixture
+from typer.testing import CliRunner
+
+from peerstash.cli.cmd_status import app
+from peerstash.core.db_schemas import ProgressRead
+from tests.mocks.db_mock import MockTask
+
+
+def make_progress(name, updated):
+    return ProgressRead(
+        task_name=name,
+        percent_done=0.25,
+        bytes_done=512 * 1024**2,
+        total_bytes=2 * 1024**3,
+        bytes_per_second=10 * 1024**2,
+        files_done=250,
+        total_files=1000,
+        eta_seconds=3725,
+        updated=updated,
+    )
+
+
+@pytest.fixture
+def tasks(mocker: MockerFixture):
+    docs = MockTask("docs", "/mnt/peerstash_root/docs", "", "peerstash-alice", "0 3 * * *", "7d", status="running")
+    photos = MockTask("photos", "/mnt/peerstash_root/photos", "", "peerstash-alice", "0 3 * * *", "7d", status="idle")
+    mocker.patch("peerstash.cli.cmd_status.db_list_tasks", return_value=[docs, photos])
+    mocker.patch(
+        "peerstash.cli.cmd_status.db_get_task",
+        side_effect=lambda name: {"docs": docs, "photos": photos}.get(name),
+    )
+    return docs, photos
+
+
+def test_status_shows_progress(runner: CliRunner, mocker: MockerFixture, tasks):
+    mocker.patch(
+        "peerstash.cli.cmd_status.db_list_progress",
+        return_value=[make_progress("docs", datetime.now())],
+    )
+
+    result = runner.invoke(app)
+
+    assert result.exit_code == 0
+    assert "docs [running] 25.0% 512.0MiB/2.0GiB 10.0MiB/s 250/1000 files ETA 1:02:05" in result.stdout
+    assert "photos [idle]" in result.stdout
+
+
+def test_status_single_task(runner: CliRunner, mocker: MockerFixture, tasks):
+    mocker.patch("peerstash.cli.cmd_status.db_list_progress", return_value=[])
+
+    result = runner.invoke(app, ["photos"])
+
+    assert result.exit_code == 0
+    assert "photos [idle]" in result.stdout
+    assert "docs" not in result.stdout
+
+
+def test_status_unknown_task(runner: CliRunner, mocker: MockerFixture, tasks):
+    mocker.patch("peerstash.cli.cmd_status.db_list_progress", return_value=[])
+
+    result = runner.invoke(app, ["missing"])
+
+    assert result.exit_code == 1
+    assert "not found" in result.stderr
+
+
+def test_status_follow_prints_changes(runner: CliRunner, mocker: MockerFixture, tasks):
+    first, second = datetime(2026, 1, 1, 12, 0, 0), datetime(2026, 1, 1, 12, 0, 2)
+    mocker.patch(
+        "peerstash.cli.cmd_status.db_list_progress",
+        side_effect=[
+            [make_progress("docs", first)],
+            [make_progress("docs", first)],
+            [make_progress("docs", second)],
+        ],
+    )
+    mocker.patch(
+        "peerstash.cli.cmd_status.time.sleep",
+        side_effect=[None, None, KeyboardInterrupt],
+    )
+
+    result = runner.invoke(app, ["docs", "--follow"])
+
+    assert result.exit_code == 0
+    # the unchanged second poll is not printed again
+    assert result.stdout.count("docs [running]") == 2
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+from pytest_mock import MockerFixture
+from typer.testing import CliRunner
+
+from peerstash.cli import LazyGroup, app
+from peerstash.cli.thin import (ThreadOutput, capture_output, run_cli,
+                                run_in_daemon)
+
+
+@pytest.fixture
+def thin_client(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(LazyGroup, "thin_client", True)
+
+
+def test_thin_client_forwards_raw_arguments(
+    runner: CliRunner, thin_client, mocker: MockerFixture
+):
+    mock_run = mocker.patch("peerstash.cli.thin.run_in_daemon", return_value=3)
+
+    result = runner.invoke(app, ["snapshots", "web", "--json", "--help"])
+
+    assert result.exit_code == 3
+    mock_run.assert_called_once_with(["snapshots", "web", "--json", "--help"])
+
+
+def test_thin_client_runs_other_commands_locally(
+    runner: CliRunner, thin_client, mocker: MockerFixture
+):
+    mock_run = mocker.patch("peerstash.cli.thin.run_in_daemon")
+
+    result = runner.invoke(app, ["list", "--help"])
+
+    assert result.exit_code == 0
+    assert "Lists scheduled backup tasks" in result.stdout
+    mock_run.assert_not_called()
+
+
+def test_run_in_daemon_streams_output(
+    mocker: MockerFixture, capsys: pytest.CaptureFixture
+):
+    def fake_request(action, kwargs, on_message):
+        assert action == "run_command" and kwargs == {"argv": ["backup", "web"]}
+        on_message({"id": 1, "stream": "stdout", "output": "Backing up...\n"})
+        on_message({"id": 1, "stream": "stderr", "output": "warning\n"})
+        return {"id": 1, "status": "success", "exit_code": 0}
+
+    mocker.patch("peerstash.cli.thin.stream_request", side_effect=fake_request)
+
+    assert run_in_daemon(["backup", "web"]) == 0
+    captured = capsys.readouterr()
+    assert captured.out == "Backing up...\n"
+    assert captured.err == "warning\n"
+
+
+def test_run_in_daemon_errors(mocker: MockerFixture, capsys: pytest.CaptureFixture):
+    mock_request = mocker.patch(
+        "peerstash.cli.thin.stream_request", side_effect=FileNotFoundError("no socket")
+    )
+    assert run_in_daemon(["backup", "web"]) == 1
+    assert "peerstashd is not reachable" in capsys.readouterr().err
+
+    mock_request.side_effect = None
+    mock_request.return_value = {"id": 1, "status": "error", "message": "nope"}
+    assert run_in_daemon(["backup", "web"]) == 1
+    assert "Daemon Error: nope" in capsys.readouterr().err
+
+
+def test_thread_output_routes_only_capturing_threads(mocker: MockerFixture):
+    fallback = mocker.MagicMock(encoding="utf-8")
+    stream = ThreadOutput(fallback, "stdout")
+    captured = []
+
+    with capture_output(lambda name, text: captured.append((name, text))):
+        stream.write("mine")
+        stream.write(b"bytes")
+        other = threading.Thread(target=stream.write, args=("theirs",))
+        other.start()
+        other.join()
+    stream.write("after")
+
+    assert captured == [("stdout", "mine"), ("stdout", "bytes")]
+    assert [c.args[0] for c in fallback.write.call_args_list] == ["theirs", "after"]
+
+
+def test_run_cli_returns_exit_codes(mocker: MockerFixture, thin_client):
+    mock_run = mocker.patch("peerstash.cli.thin.run_in_daemon")
+    mocker.patch("peerstash.cli.cmd_backup.check_setup")
+    mocker.patch("peerstash.cli.cmd_backup.run_backup", side_effect=ValueError("nope"))
+
+    # runs the real command, never the thin client
+    assert run_cli(["backup", "web"]) == 1
+    assert run_cli(["backup"]) == 2
+    assert run_cli(["snapshots", "--help"]) == 0
+    mock_run.assert_not_called()
@@ -5,11 +5,11 @@ import pytest
 from pytest import MonkeyPatch
 from pytest_mock import MockerFixture, MockType
 
-from peerstash.core.backup import (_init_repo, _sftp_recursive_remove,
-                                   _verify_backup_size, get_snapshots,
-                                   mount_task, prune_repo, remove_schedule,
-                                   restore_snapshot, run_backup,
-                                   schedule_backup, unmount_task)
+from peerstash.core.backup import (QuotaExceededError, _init_repo,
+                                   _sftp_recursive_remove, _stream_backup,
+                                   get_snapshots, mount_task, prune_repo,
+                                   remove_schedule, restore_snapshot,
+                                   run_backup, schedule_backup, unmount_task)
 
 
 def test_schedule_backup_valid_new_task(mock_db, mock_daemon_and_locks):
@@ -27,14 +27,12 @@ def test_schedule_backup_invalid_cron(mock_db, mock_daemon_and_locks):
         )
 
 
-def test_run_backup_dry_run(
-    mock_db, mock_daemon_and_locks, mock_restic, mock_subprocess
-):
-    schedule_backup(paths=["/test"], peer="node1", name="test_bkp")
-    res = run_backup("test_bkp", dry_run=True, offset=0)
+def test_schedule_backup_catch_up_policy(mock_db, mock_daemon_and_locks):
+    schedule_backup(paths=["/test"], peer="node1", name="t", catch_up="skip")
+    assert mock_db["tasks"]["t"].catch_up == "skip"
 
-    assert res is not None
-    assert res["data_added"] == 1048576
+    with pytest.raises(ValueError, match="Catch-up policy 'always' invalid"):
+        schedule_backup(paths=["/test"], peer="node1", name="t", catch_up="always")
 
 
 def test_run_backup_init_storage_full(
@@ -52,9 +50,10 @@ def test_run_backup_init_storage_full(
     with pytest.raises(
         RuntimeError, match="Not enough storage to create initial backup"
     ):
-        run_backup("test_bkp", offset=0)
+        run_backup("test_bkp")
 
-    assert mock_db["tasks"]["test_bkp"].status == "idle"
+    # the repo was removed, so the next run initializes it again
+    assert mock_db["tasks"]["test_bkp"].status == "new"
     assert mock_db["tasks"]["test_bkp"].last_exit_code == 2
 
 
@@ -64,10 +63,19 @@ def test_run_backup_success(
     schedule_backup(paths=["/test"], peer="node1", name="test_bkp")
     mock_db["tasks"]["test_bkp"].status = "idle"
 
-    res = run_backup("test_bkp", offset=0)
+    res = run_backup("test_bkp")
 
     assert res is not None
     assert res["snapshot_id"] == "snap123"
+    assert mock_db["tasks"]["test_bkp"].last_backup is not None
+
+    run = mock_db["task_runs"][-1]
+    assert run.kind == "backup"
+    assert run.exit_code == 0
+    assert run.hostname == "peerstash-node1"
+    assert run.bytes_added == 1048576
+    assert run.files_processed == 10
+    assert list(run.phases) == ["space_check", "upload", "check"]
 
 
 def test_prune_repo_success(
@@ -77,10 +85,15 @@ def test_prune_repo_success(
     mock_db["tasks"]["test_bkp"].status = "idle"
 
     try:
-        prune_repo("test_bkp", offset=0, repack=True)
+        prune_repo("test_bkp", repack=True)
     except Exception as e:
         pytest.fail(f"prune_repo failed unexpectedly: {e}")
 
+    run = mock_db["task_runs"][-1]
+    assert run.kind == "prune"
+    assert run.exit_code == 0
+    assert list(run.phases) == ["forget", "sync_snapshots"]
+
 
 def test_remove_schedule_existing_new(mock_db, mock_daemon_and_locks, mock_subprocess):
     schedule_backup(paths=["/test"], peer="node1", name="test_bkp")
@@ -112,6 +125,8 @@ def test_restore_snapshot_failure(
     schedule_backup(paths=["/test"], peer="node1", name="test_bkp")
     mock_db["tasks"]["test_bkp"].status = "idle"
 
+    monkeypatch.setattr("peerstash.core.backup.RESTORE_ROOT", "/restore")
+
     # Trigger the restic restore failure mock via environment variable
     monkeypatch.setenv("MOCK_RESTORE_FAIL", "1")
 
@@ -170,8 +185,9 @@ def test_run_backup_restic_failure(
     monkeypatch.setenv("MOCK_BACKUP_FAIL", "1")
 
     with pytest.raises(RuntimeError, match="Backup failed!"):
-        run_backup("fail_bkp", offset=0)
+        run_backup("fail_bkp")
     assert mock_db["tasks"]["fail_bkp"].last_exit_code == 3
+    assert mock_db["task_runs"][-1].exit_code == 3
 
 
 def test_run_backup_corrupted_repo(
@@ -188,7 +204,7 @@ def test_run_backup_corrupted_repo(
     monkeypatch.setenv("RESTIC_REPOSITORY", "corrupted")
 
     with pytest.raises(RuntimeError, match="(?i)Repository.*is corrupted"):
-        run_backup("corrupt_bkp", offset=0)
+        run_backup("corrupt_bkp")
     assert mock_db["tasks"]["corrupt_bkp"].last_exit_code == 4
 
 
@@ -208,6 +224,45 @@ def test_get_snapshots_success(mock_db, mock_daemon_and_locks, mock_restic):
     assert snaps[0]["id"] == "snap123"
 
 
+def test_get_snapshots_from_cache(
+    mock_db, mock_daemon_and_locks, mock_restic, mock_subprocess, mocker: MockerFixture
+):
+    schedule_backup(paths=["/test"], peer="node1", name="test_bkp")
+    mock_db["tasks"]["test_bkp"].status = "idle"
+
+    # the backup summary is cached without asking the peer
+    run_backup("test_bkp")
+    mock_remote = mocker.patch("restic.internal.snapshots.run")
+    snaps = get_snapshots("test_bkp")
+    mock_remote.assert_not_called()
+    assert [s["id"] for s in snaps] == ["snap123"]
+    assert snaps[0]["paths"] == ["/mnt/peerstash_root/test"]
+
+    # --refresh reloads the snapshots from the repo
+    mock_remote.return_value = [
+        {"id": "aaaa1111", "short_id": "aaaa1111", "time": "2026-03-01T12:00:00Z", "paths": ["/p"]},
+        {"id": "bbbb2222", "short_id": "bbbb2222", "time": "2026-03-02T12:00:00Z", "paths": ["/p"]},
+    ]
+    snaps = get_snapshots("test_bkp", refresh=True)
+    mock_remote.assert_called_once()
+    assert [s["id"] for s in snaps] == ["aaaa1111", "bbbb2222"]
+
+    assert [s["id"] for s in get_snapshots("test_bkp", "latest")] == ["bbbb2222"]
+    assert [s["id"] for s in get_snapshots("test_bkp", "aaaa")] == ["aaaa1111"]
+
+
+def test_prune_refreshes_snapshot_cache(
+    mock_db, mock_daemon_and_locks, mock_restic, mock_subprocess
+):
+    schedule_backup(paths=["/test"], peer="node1", name="test_bkp")
+    mock_db["tasks"]["test_bkp"].status = "idle"
+    mock_db["snapshots"]["test_bkp"] = {}
+
+    prune_repo("test_bkp")
+
+    assert list(mock_db["snapshots"]["test_bkp"]) == ["snap123"]
+
+
 def test_mount_and_unmount_task(
     mock_db, mock_daemon_and_locks, mock_subprocess, mock_popen: MockType
 ):
@@ -225,19 +280,27 @@ def test_mount_and_unmount_task(
         pytest.fail(f"unmount_task failed: {e}")
 
 
+import os
+import signal
 import subprocess
 from datetime import datetime
 
 import pytest
+import restic.errors
 
 # Import the module itself so we can access the patched DB functions
 import peerstash.core.backup as backup_mod
-from peerstash.core.backup import (_init_repo, _sftp_recursive_remove,
-                                   _verify_backup_size, get_snapshots,
-                                   mount_task, prune_repo, remove_schedule,
-                                   restore_snapshot, run_backup,
+from peerstash.core.backup import (QuotaExceededError, _init_repo,
+                                   _sftp_recursive_remove, _stream_backup,
+                                   get_snapshots, mount_task, prune_repo,
+                                   remove_schedule, restore_snapshot,
+                                   resume_removals, run_backup,
                                    schedule_backup, unmount_task)
-from peerstash.core.db_schemas import TaskUpdate
+from peerstash.core.db_schemas import TaskUpdate, VerificationUpdate
+from peerstash.core.restic_runner import ResticRunner
+from tests.mocks.restic_mock import mock_backup_stream
+
+REPO = ResticRunner("sftp://repo")
 
 
 # --- 1. Missing Task Validations ---
@@ -245,7 +308,6 @@ def test_missing_task_errors(mock_db, mocker):
     # Prevent the unmount safeguard from trying to execute real 'fusermount'
     mocker.patch("subprocess.run")
     funcs = [
-        _verify_backup_size,
         _init_repo,
         run_backup,
         prune_repo,
@@ -308,11 +370,11 @@ def test_api_exceptions(mock_db, mocker, mock_restic, mock_daemon_and_locks):
     backup_mod.db_update_task("t", TaskUpdate(status="idle"))  # Non-init state
 
     # API failures
-    mocker.patch("restic.forget", side_effect=Exception("Forget Err"))
+    mocker.patch("restic.internal.forget.run", side_effect=Exception("Forget Err"))
     with pytest.raises(RuntimeError, match="Failed to prune"):
         prune_repo("t")
 
-    mocker.patch("restic.snapshots", side_effect=Exception("API Err"))
+    mocker.patch("restic.internal.snapshots.run", side_effect=Exception("API Err"))
     with pytest.raises(Exception, match="Failed to get snapshots"):
         get_snapshots("t")
 
@@ -323,13 +385,91 @@ def test_api_exceptions(mock_db, mocker, mock_restic, mock_daemon_and_locks):
 
 
 # --- 4. Emergency Pruning & Space Check Logic ---
-def test_verify_size_dry_run_fails(mock_db, mocker):
-    backup_mod.db_add_task("t", "/p", None, "h", "s", "r", "p")
-    backup_mod.db_update_task("t", TaskUpdate(status="idle"))  # Non-init state
-    mocker.patch("peerstash.core.backup.get_disk_usage", return_value=(0, 0, 100))
-    mocker.patch("peerstash.core.backup.run_backup", return_value=None)
-    with pytest.raises(RuntimeError, match="Failed to get added bytes"):
-        _verify_backup_size("t")
+def test_stream_backup_returns_summary(mocker):
+    mock_popen = mocker.patch("subprocess.Popen", return_value=mock_backup_stream())
+
+    res = _stream_backup("t", REPO, ["/p"], ["*.tmp"], 1024**4)
+
+    assert res["snapshot_id"] == "snap123"
+    cmd = mock_popen.call_args[0][0]
+    assert cmd[:4] == ["/usr/bin/restic", "--json", "-r", "sftp://repo"]
+    assert ["--exclude", "*.tmp"] == cmd[-2:]
+
+
+def test_stream_backup_saves_progress(mock_db, mocker):
+    mocker.patch("subprocess.Popen", return_value=mock_backup_stream())
+    mocker.patch("peerstash.core.backup.time.monotonic", side_effect=[1000, 1003])
+    mock_save = mocker.spy(backup_mod, "_save_progress")
+
+    _stream_backup("t", REPO, ["/p"], None, 1024**4)
+
+    progress = [call.args[1] for call in mock_save.call_args_list]
+    assert progress[1].percent_done == 0.5
+    assert progress[1].bytes_per_second == 1048576 / 4
+    assert progress[1].total_files == 10
+    assert progress[1].eta_seconds == 4
+    # the summary leaves the task at 100%
+    assert mock_db["progress"]["t"].percent_done == 1
+    assert mock_db["progress"]["t"].files_done == 10
+
+
+def test_stream_backup_throttles_progress(mock_db, mocker):
+    mocker.patch("subprocess.Popen", return_value=mock_backup_stream())
+    mocker.patch("peerstash.core.backup.time.monotonic", side_effect=[1000, 1001])
+    mock_save = mocker.spy(backup_mod, "_save_progress")
+
+    _stream_backup("t", REPO, ["/p"], None, 1024**4)
+
+    # start and summary only, the status came too soon after the start
+    assert mock_save.call_count == 2
+
+
+def test_stream_backup_progress_failure_is_ignored(mocker):
+    mocker.patch("subprocess.Popen", return_value=mock_backup_stream())
+    mocker.patch(
+        "peerstash.core.backup.db_set_progress", side_effect=Exception("db locked")
+    )
+
+    res = _stream_backup("t", REPO, ["/p"], None, 1024**4)
+
+    assert res["snapshot_id"] == "snap123"
+
+
+def test_stream_backup_aborts_before_quota(mocker):
+    process = mock_backup_stream(data_added=100 * 1024 * 1024)
+    mocker.patch("subprocess.Popen", return_value=process)
+
+    with pytest.raises(QuotaExceededError) as e:
+        _stream_backup("t", REPO, ["/p"], None, 120 * 1024 * 1024)
+
+    assert e.value.added_bytes == 100 * 1024 * 1024
+    assert process.signals == [signal.SIGINT]
+    assert not process.killed
+
+
+def test_stream_backup_restic_failure(mocker):
+    mocker.patch("subprocess.Popen", return_value=mock_backup_stream(fail=True))
+
+    with pytest.raises(restic.errors.ResticFailedError, match="Permission denied"):
+        _stream_backup("t", REPO, ["/p"], None, 1024**4)
+
+
+def test_stream_backup_kills_restic_on_error(mocker):
+    process = mock_backup_stream()
+
+    def output():
+        # JSON that is not an object is kept as an error line
+        yield "[1]\n"
+        raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+    process.stdout = output()
+    mocker.patch("subprocess.Popen", return_value=process)
+
+    with pytest.raises(UnicodeDecodeError):
+        _stream_backup("t", REPO, ["/p"], None, 1024**4)
+
+    assert process.killed
+    assert process.returncode == -9
 
 
 def test_run_backup_insufficient_space_triggers_prune(
@@ -338,14 +478,53 @@ def test_run_backup_insufficient_space_triggers_prune(
     backup_mod.db_add_task("t", "/p", None, "h", "s", "r", "p")
     backup_mod.db_update_task("t", TaskUpdate(status="started"))  # Non-init state
 
-    # Force free space < backup size
-    mocker.patch("peerstash.core.backup._verify_backup_size", return_value=(10, 100))
+    # Force the backup to run out of space both times
+    mocker.patch("peerstash.core.backup.get_disk_usage", return_value=(0, 0, 10))
+    mock_stream = mocker.patch(
+        "peerstash.core.backup._stream_backup",
+        side_effect=QuotaExceededError(10, 100),
+    )
     mock_prune = mocker.patch("peerstash.core.backup.prune_repo")
 
     with pytest.raises(RuntimeError, match="Not enough storage to complete task"):
         run_backup("t")
 
     mock_prune.assert_called_once_with("t", "1r", repack=False)
+    assert mock_stream.call_count == 2
+    assert backup_mod.db_get_task("t").last_exit_code == 2  # type: ignore
+
+
+def test_run_backup_succeeds_after_prune(
+    mock_db, mocker, mock_daemon_and_locks, mock_restic, mock_subprocess
+):
+    backup_mod.db_add_task("t", "/p", None, "h", "s", "r", "p")
+    backup_mod.db_update_task("t", TaskUpdate(status="idle"))
+
+    mocker.patch("peerstash.core.backup.get_disk_usage", return_value=(0, 0, 10))
+    mocker.patch(
+        "peerstash.core.backup._stream_backup",
+        side_effect=[QuotaExceededError(10, 100), {"snapshot_id": "snap456"}],
+    )
+    mocker.patch("peerstash.core.backup.prune_repo")
+
+    res = run_backup("t")
+
+    assert res == {"snapshot_id": "snap456"}
+    assert backup_mod.db_get_task("t").last_exit_code == 0  # type: ignore
+
+
+def test_backup_and_prune_invalidate_disk_usage(
+    mock_db, mocker, mock_daemon_and_locks, mock_restic, mock_subprocess
+):
+    backup_mod.db_add_task("t", "/p", None, "h", "s", "1d", "p")
+    backup_mod.db_update_task("t", TaskUpdate(status="idle"))
+    mock_invalidate = mocker.patch("peerstash.core.backup.invalidate_disk_usage")
+
+    run_backup("t")
+    mock_invalidate.assert_called_once_with("h")
+
+    prune_repo("t")
+    assert mock_invalidate.call_count == 2
 
 
 def test_run_backup_init_failure_fallback(mock_db, mocker, mock_daemon_and_locks):
@@ -374,45 +553,85 @@ def test_prune_strict_subprocess(mock_db, mocker, mock_daemon_and_locks, mock_re
 
 
 # --- 5. Paramiko SFTP Recursive Remove ---
-def test_sftp_recursive_remove(mocker):
-    mocker.patch("peerstash.core.backup.db_get_user", return_value="admin")
-    mock_ssh = mocker.patch("paramiko.SSHClient")
-    mock_sftp = mock_ssh.return_value.open_sftp.return_value
+def test_sftp_recursive_remove(mock_db, mocker):
+    mock_remove = mocker.patch("peerstash.core.backup.remove_tree")
 
-    # Simulate a file and a directory, then empty inside the nested directory
-    mock_sftp.listdir.side_effect = [["file.txt", "dir"], []]
+    _sftp_recursive_remove("host", "t")
 
-    # remove() succeeds on the file, but throws IOError on the dir, triggering recursion
-    mock_sftp.remove.side_effect = [None, IOError(), None]
+    mock_remove.assert_called_once()
+    assert mock_remove.call_args[0] == ("host", "t")
+    assert mock_db["removals"] == {}
 
-    _sftp_recursive_remove("host", "/path")
 
-    assert mock_sftp.rmdir.call_count == 2
-    assert mock_sftp.remove.call_count == 2
+def test_sftp_recursive_remove_interrupted(mock_db, mocker):
+    mocker.patch("peerstash.core.backup.remove_tree", side_effect=EOFError())
 
+    with pytest.raises(EOFError):
+        _sftp_recursive_remove("host", "t")
 
-def test_sftp_recursive_remove_no_user(mocker):
-    mocker.patch("peerstash.core.backup.db_get_user", return_value=None)
-    with pytest.raises(ValueError, match="Unknown USER"):
-        _sftp_recursive_remove("host", "/path")
+    # the removal stays recorded so it can be resumed
+    assert ("host", "t") in mock_db["removals"]
+
+
+def test_resume_removals(mock_db, mocker):
+    mock_remove = mocker.patch("peerstash.core.backup.remove_tree")
+    # a cancelled task, and a task that was scheduled again and backed up since
+    backup_mod.db_add_removal("host", "gone")
+    backup_mod.db_add_removal("h", "t")
+    backup_mod.db_add_task("t", "/p", None, "h", "s", "1d", "p")
+    backup_mod.db_update_task("t", TaskUpdate(status="idle"))
+
+    resume_removals()
+
+    mock_remove.assert_called_once()
+    assert mock_remove.call_args[0] == ("host", "gone")
+    assert mock_db["removals"] == {}
 
 
 # --- 6. File System Collisions & DB Errors ---
-def test_restore_and_unmount_collisions(mock_db, mocker, mock_restic):
+def test_restore_and_unmount_collisions(mock_db, mocker, mock_restic, tmp_path):
     backup_mod.db_add_task("t", "/p", None, "h", "s", "r", "p")
-    backup_mod.db_update_task("t", TaskUpdate(last_run=datetime.now()))
+    backup_mod.db_update_task("t", TaskUpdate(last_run=datetime(2026, 3, 1, 12)))
+    mocker.patch("peerstash.core.backup.RESTORE_ROOT", str(tmp_path))
+
+    def fake_restore(base_cmd, target_dir, **kwargs):
+        os.makedirs(f"{target_dir}/mnt/peerstash_root/docs")
+        with open(f"{target_dir}/mnt/peerstash_root/docs/a.txt", "w") as f:
+            f.write("a")
+
+    mocker.patch("restic.internal.restore.run", side_effect=fake_restore)
+    mock_rename = mocker.spy(os, "rename")
+
+    first = restore_snapshot("t")
+    second = restore_snapshot("t")
 
-    mocker.patch("os.path.exists", return_value=True)  # Force existing folders logic
+    assert first == "t_2026-03-01_12-00-00"
+    assert second.startswith(f"{first}_")
+    for folder in (first, second):
+        assert (tmp_path / folder / "docs" / "a.txt").read_text() == "a"
+    # files are renamed into place, and no staging folders are left behind
+    assert mock_rename.call_count == 2
+    assert sorted(os.listdir(tmp_path)) == sorted([first, second])
+
+    mocker.patch("os.path.exists", return_value=True)
     mock_rmtree = mocker.patch("shutil.rmtree")
-    mocker.patch("shutil.move")
     mocker.patch("subprocess.run")  # Mock fusermount
-
-    folder = restore_snapshot("t")
-    assert folder is not None
+    unmount_task("t")
     assert mock_rmtree.call_count > 0
 
-    unmount_task("t")
-    assert mock_rmtree.call_count > 1
+
+def test_reserve_restore_folder(mocker, tmp_path):
+    mocker.patch("peerstash.core.backup.RESTORE_ROOT", str(tmp_path))
+    mocker.patch("peerstash.core.backup.datetime").now.return_value = datetime(2026, 3, 1)
+
+    names = [backup_mod._reserve_restore_folder("t_snap") for _ in range(4)]
+
+    assert names == [
+        "t_snap",
+        "t_snap_2026-03-01_00-00-00",
+        "t_snap_2026-03-01_00-00-00_1",
+        "t_snap_2026-03-01_00-00-00_2",
+    ]
 
 
 def test_remove_schedule_db_failures(mock_db, mocker, mock_daemon_and_locks):
@@ -428,3 +647,122 @@ def test_remove_schedule_db_failures(mock_db, mocker, mock_daemon_and_locks):
     mocker.patch("peerstash.core.backup.db_delete_task", return_value=False)
     with pytest.raises(RuntimeError, match="Failed to remove task .* database"):
         remove_schedule("t")
+
+
+
+def test_remove_schedules_batches_daemon_calls(mock_db, mocker, mock_daemon_and_locks):
+    backup_mod.db_add_task("a", "/p", None, "h", "s", "r", "p")
+    backup_mod.db_add_task("b", "/p", None, "h", "s", "r", "p")
+    mock_batch = mocker.patch(
+        "peerstash.core.backup.send_batch_to_daemon",
+        return_value=[{"status": "success"}, {"status": "success"}],
+    )
+
+    backup_mod.remove_schedules(["a", "b"])
+
+    mock_batch.assert_called_once_with(
+        [("remove_task", {"task_name": "a"}), ("remove_task", {"task_name": "b"})]
+    )
+    assert "a" not in mock_db["tasks"] and "b" not in mock_db["tasks"]
+
+
+def test_remove_schedules_failures(mock_db, mocker, mock_daemon_and_locks):
+    backup_mod.db_add_task("a", "/p", None, "h", "s", "r", "p")
+    mock_batch = mocker.patch("peerstash.core.backup.send_batch_to_daemon")
+
+    with pytest.raises(ValueError, match="not found"):
+        backup_mod.remove_schedules(["a", "missing"])
+    mock_batch.assert_not_called()
+
+    # an error result for any task leaves every task in the database
+    mock_batch.return_value = [{"status": "error", "message": "no job"}]
+    with pytest.raises(RuntimeError, match="Failed to remove task 'a' \\(no job\\)"):
+        backup_mod.remove_schedules(["a"])
+    assert "a" in mock_db["tasks"]
+
+    backup_mod.remove_schedules([])
+    assert mock_batch.call_count == 1
+
+# --- 7. Rotating Repo Verification ---
+def test_verify_repo_rotates_data_subsets(mock_db, mocker):
+    mock_run = mocker.patch("subprocess.run")
+    mocker.patch("peerstash.core.backup.VERIFY_SLICES", 3)
+
+    # first check reads slice 1 and advances the cursor
+    assert backup_mod._verify_repo("t", REPO) is True
+    assert "1/3" in mock_run.call_args[0][0]
+    assert mock_db["verifications"]["t"].cursor == 1
+
+    # next check is not due yet, only the structure is checked
+    assert backup_mod._verify_repo("t", REPO) is True
+    assert "--read-data-subset" not in mock_run.call_args[0][0]
+    assert "--with-cache" in mock_run.call_args[0][0]
+    assert mock_db["verifications"]["t"].cursor == 1
+
+    # once the interval has passed, the next slice is read
+    backup_mod.db_set_verification(
+        "t", VerificationUpdate(last_data_check=datetime(2000, 1, 1))
+    )
+    backup_mod._verify_repo("t", REPO)
+    assert "2/3" in mock_run.call_args[0][0]
+    assert mock_db["verifications"]["t"].cursor == 2
+
+
+def test_verify_repo_failure_keeps_cursor(mock_db, mocker):
+    mocker.patch(
+        "subprocess.run",
+        side_effect=subprocess.CalledProcessError(1, "restic", stderr=b"error"),
+    )
+
+    assert backup_mod._verify_repo("t", REPO) is False
+    assert "t" not in mock_db["verifications"]
+
+
+def test_run_backup_error_releases_lock_and_finishes(
+    mock_db, mocker, mock_daemon_and_locks, mock_restic, mock_subprocess
+):
+    backup_mod.db_add_task("t", "/p", None, "h", "s", "r", "p")
+    backup_mod.db_update_task("t", TaskUpdate(status="idle"))
+    mocker.patch(
+        "peerstash.core.backup.get_disk_usage", side_effect=OSError("peer offline")
+    )
+
+    with pytest.raises(OSError, match="peer offline"):
+        run_backup("t")
+
+    backup_mod.release_lock.assert_called_once_with("mock_lock")  # type: ignore
+    task = backup_mod.db_get_task("t")
+    assert task.status == "idle"  # type: ignore
+    assert task.last_exit_code == 3  # type: ignore
+
+    # the next job starts normally
+    mocker.patch("peerstash.core.backup.get_disk_usage", return_value=(0, 0, 10**12))
+    run_backup("t")
+    assert backup_mod.db_get_task("t").last_exit_code == 0  # type: ignore
+
+
+def test_prune_repo_error_releases_lock_and_finishes(
+    mock_db, mocker, mock_daemon_and_locks, mock_restic, mock_subprocess
+):
+    backup_mod.db_add_task("t", "/p", None, "h", "s", "1d", "p")
+    backup_mod.db_update_task("t", TaskUpdate(status="idle"))
+    mocker.patch.object(ResticRunner, "prune", side_effect=OSError("peer offline"))
+
+    with pytest.raises(OSError, match="peer offline"):
+        prune_repo("t", repack=False)
+
+    backup_mod.release_lock.assert_called_once_with("mock_lock")  # type: ignore
+    task = backup_mod.db_get_task("t")
+    assert task.status == "idle"  # type: ignore
+    assert task.last_exit_code == 5  # type: ignore
+
+
+@pytest.mark.parametrize("value", ["0", "-3", "many"])
+def test_positive_env_falls_back_to_default(value, monkeypatch: MonkeyPatch):
+    monkeypatch.setenv("VERIFY_SLICES", value)
+    assert backup_mod._positive_env("VERIFY_SLICES", 14) == 14
+
+
+def test_positive_env(monkeypatch: MonkeyPatch):
+    monkeypatch.setenv("VERIFY_SLICES", "7")
+    assert backup_mod._positive_env("VERIFY_SLICES", 14) == 7
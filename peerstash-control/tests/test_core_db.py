@@ -0,0 +1,258 @@
+import threading
+from datetime import datetime
+
+import pytest
+from pytest import MonkeyPatch
+
+import peerstash.core.db as db_mod
+from peerstash.core.db import (_connection, db_add_snapshot, db_add_task,
+                               db_add_task_run, db_close, db_count_snapshots,
+                               db_delete_host, db_finish_task, db_get_task,
+                               db_get_user, db_latest_task_runs,
+                               db_list_peer_usage, db_list_task_runs,
+                               db_list_tasks, db_set_peer_usage,
+                               db_update_task)
+from peerstash.core import db_migrations
+from peerstash.core.db_migrations import (MIGRATIONS, get_schema_version,
+                                          migrate)
+from peerstash.core.db_schemas import SnapshotCreate, TaskRunCreate, TaskUpdate
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch: MonkeyPatch):
+    path = str(tmp_path / "peerstash.db")
+    monkeypatch.setattr(db_mod, "DB_PATH", path)
+    with _connection() as conn:
+        conn.executescript(
+            """
+            CREATE TABLE tasks (
+                name TEXT PRIMARY KEY,
+                include TEXT NOT NULL,
+                exclude TEXT,
+                hostname TEXT NOT NULL,
+                schedule TEXT NOT NULL,
+                retention TEXT NOT NULL,
+                prune_schedule TEXT NOT NULL,
+                last_run DATETIME,
+                last_exit_code INTEGER,
+                status TEXT DEFAULT 'new'
+            );
+            CREATE TABLE hosts (
+                hostname TEXT PRIMARY KEY,
+                port INTEGER,
+                public_key TEXT,
+                last_seen DATETIME
+            );
+            CREATE TABLE node_data (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                username TEXT,
+                invite_code TEXT
+            );
+            INSERT INTO node_data (id, username) VALUES (1, 'mockuser');
+            """
+        )
+        migrate(conn)
+    yield path
+    db_close()
+
+
+def test_connection_is_reused(sqlite_db):
+    with _connection() as first:
+        pass
+    db_get_user()
+    with _connection() as second:
+        pass
+
+    assert first is second
+
+
+def test_connection_uses_wal_and_busy_timeout(sqlite_db):
+    with _connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == int(
+            db_mod.BUSY_TIMEOUT * 1000
+        )
+
+
+def test_connection_per_thread(sqlite_db):
+    with _connection() as main_conn:
+        pass
+    connections = []
+
+    def worker():
+        with _connection() as conn:
+            connections.append(conn)
+        db_close()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert connections[0] is not main_conn
+
+
+def test_connection_follows_db_path(sqlite_db, tmp_path, monkeypatch: MonkeyPatch):
+    with _connection() as first:
+        pass
+    monkeypatch.setattr(db_mod, "DB_PATH", str(tmp_path / "other.db"))
+    with _connection() as second:
+        pass
+
+    assert first is not second
+
+
+def test_concurrent_writers(sqlite_db):
+    db_add_task("t", "/p", "", "peerstash-node1", "0 3 * * *", "7d", "0 4 * * 0")
+    errors = []
+
+    def worker(code):
+        try:
+            for _ in range(20):
+                db_update_task("t", TaskUpdate(last_exit_code=code))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db_close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert db_get_task("t").last_exit_code in range(8)
+
+
+def test_migrate_is_idempotent(sqlite_db):
+    with _connection() as conn:
+        assert get_schema_version(conn) == len(MIGRATIONS)
+        assert migrate(conn) == len(MIGRATIONS)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+
+    assert columns[-3:] == ["last_backup", "last_prune", "catch_up"]
+
+
+def test_migrate_failure_keeps_previous_version(sqlite_db, monkeypatch: MonkeyPatch):
+    monkeypatch.setattr(
+        db_migrations,
+        "MIGRATIONS",
+        [*MIGRATIONS, "ALTER TABLE tasks ADD COLUMN broken INTEGER; SELECT * FROM missing;"],
+    )
+
+    with _connection() as conn:
+        with pytest.raises(RuntimeError, match="Schema migration"):
+            migrate(conn)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+        assert get_schema_version(conn) == len(MIGRATIONS)
+
+    assert "broken" not in columns
+
+
+def test_tasks_for_host_uses_index(sqlite_db):
+    with _connection() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT name FROM tasks WHERE hostname=?", ("h",)
+        ).fetchall()
+
+    assert "idx_tasks_hostname" in str(plan)
+
+
+def test_task_runs_latest_oldest_first(sqlite_db):
+    for day, kind in [(1, "backup"), (2, "prune"), (3, "backup"), (4, "backup")]:
+        db_add_task_run(
+            TaskRunCreate(
+                task_name="t",
+                kind=kind,
+                hostname="peerstash-node1",
+                started=datetime(2026, 1, day, 3),
+                duration=60.0,
+                phases={"upload": 50.0, "check": 10.0},
+                spans=[{"name": "upload", "wall": 50.0, "cpu": 1.0, "child_cpu": 20.0}],
+                exit_code=0,
+            )
+        )
+
+    runs = db_list_task_runs("t", kind="backup", limit=2)
+
+    assert [r.started.day for r in runs] == [3, 4]
+    assert runs[0].phases == {"upload": 50.0, "check": 10.0}
+    assert runs[0].spans[0]["child_cpu"] == 20.0
+    assert db_list_task_runs("other") == []
+
+
+def test_task_rows_map_by_column(sqlite_db):
+    db_add_task("t", "/p", None, "peerstash-node1", "0 3 * * *", "7d", "0 4 * * 0")
+    now = datetime.now()
+
+    updated = db_update_task("t", TaskUpdate(last_run=now, status="idle"))
+    tasks = db_list_tasks()
+
+    assert updated == tasks[0] == db_get_task("t")
+    assert tasks[0].last_run == now
+    assert tasks[0].last_backup is None
+    assert tasks[0].catch_up == "once"
+
+
+def test_finish_task_updates_and_records_run(sqlite_db):
+    db_add_task("t", "/p", None, "peerstash-node1", "0 3 * * *", "7d", "0 4 * * 0")
+
+    db_finish_task(
+        "t",
+        TaskUpdate(last_exit_code=0, status="idle"),
+        TaskRunCreate(
+            task_name="t",
+            kind="backup",
+            hostname="peerstash-node1",
+            started=datetime(2026, 1, 1, 3),
+            duration=60.0,
+            phases={"upload": 60.0},
+            exit_code=0,
+        ),
+    )
+
+    assert db_get_task("t").status == "idle"
+    assert db_list_task_runs("t")[0].exit_code == 0
+
+
+def test_latest_task_runs_per_kind(sqlite_db):
+    for day, kind, exit_code in [
+        (1, "backup", 0),
+        (2, "prune", 0),
+        (3, "backup", 0),
+        (4, "backup", 3),
+    ]:
+        db_add_task_run(
+            TaskRunCreate(
+                task_name="t",
+                kind=kind,
+                hostname="peerstash-node1",
+                started=datetime(2026, 1, day, 3),
+                duration=float(day),
+                phases={},
+                exit_code=exit_code,
+            )
+        )
+
+    latest = {r.kind: r for r in db_latest_task_runs()}
+    succeeded = {r.kind: r for r in db_latest_task_runs(succeeded=True)}
+
+    assert latest["backup"].started.day == 4
+    assert latest["backup"].exit_code == 3
+    assert latest["backup"].duration == 4.0
+    assert latest["prune"].started.day == 2
+    assert succeeded["backup"].started.day == 3
+
+
+def test_snapshot_counts_and_peer_usage(sqlite_db):
+    for i in range(3):
+        db_add_snapshot("t", SnapshotCreate(id=f"s{i}", short_id=f"s{i}", time="t", paths="/p"))
+    db_set_peer_usage("peerstash-node1", (100, 60, 40))
+    db_set_peer_usage("peerstash-node1", (100, 70, 30))
+
+    assert db_count_snapshots() == {"t": 3}
+    [usage] = db_list_peer_usage()
+    assert (usage.hostname, usage.used, usage.free) == ("peerstash-node1", 70, 30)
+
+    db_delete_host("peerstash-node1")
+    assert db_list_peer_usage() == []
@@ -0,0 +1,162 @@
+import os
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from peerstash.core.ipc import (HEADER, MAX_FRAME_SIZE, FramedRequestHandler,
+                                MalformedMessageError, ProtocolError,
+                                peer_uid, recv_frame, send_frame,
+                                stream_request)
+
+
+class EchoHandler(FramedRequestHandler):
+    def route_action(self, action, kwargs):
+        if action == "echo":
+            return {"status": "success", "value": kwargs["value"]}
+        if action == "slow":
+            time.sleep(kwargs["seconds"])
+            return {"status": "success"}
+        if action == "fail":
+            raise ValueError("boom")
+        if action == "count":
+            for i in range(kwargs["to"]):
+                self.emit({"value": i})
+            return {"status": "success"}
+        return {"status": "error", "message": "Unknown action"}
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "test.sock")
+    server = socketserver.ThreadingUnixStreamServer(path, EchoHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def connect(path):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(path)
+    return client
+
+
+def test_frame_roundtrip_large_payload():
+    left, right = socket.socketpair()
+    message = {"action": "echo", "kwargs": {"value": "x" * 100_000}}
+
+    # send from another thread, the payload is larger than the socket buffer
+    sender = threading.Thread(target=send_frame, args=(left, message))
+    sender.start()
+    received = recv_frame(right)
+    sender.join()
+
+    assert received == message
+    left.close()
+    assert recv_frame(right) is None
+    right.close()
+
+
+def test_frame_too_large():
+    left, right = socket.socketpair()
+    left.sendall(HEADER.pack(MAX_FRAME_SIZE + 1))
+
+    with pytest.raises(ProtocolError, match="too large"):
+        recv_frame(right)
+
+
+def test_frame_truncated():
+    left, right = socket.socketpair()
+    left.sendall(HEADER.pack(10) + b"{}")
+    left.close()
+
+    with pytest.raises(ProtocolError, match="middle of a frame"):
+        recv_frame(right)
+
+
+def test_frame_invalid_json():
+    left, right = socket.socketpair()
+    left.sendall(HEADER.pack(3) + b"{x}")
+
+    with pytest.raises(MalformedMessageError):
+        recv_frame(right)
+
+
+def test_peer_uid():
+    left, right = socket.socketpair()
+    with left, right:
+        assert peer_uid(right) == os.getuid()
+
+
+def test_requests_on_one_connection_keep_their_ids(server):
+    with connect(server) as client:
+        for request_id in (1, 2):
+            send_frame(client, {"id": request_id, "action": "echo", "kwargs": {"value": request_id}})
+            assert recv_frame(client) == {"id": request_id, "status": "success", "value": request_id}
+
+
+def test_errors_are_returned(server):
+    with connect(server) as client:
+        send_frame(client, {"id": 1, "action": "fail"})
+        assert recv_frame(client) == {"id": 1, "status": "error", "message": "boom"}
+
+        # a malformed frame does not close the connection
+        client.sendall(HEADER.pack(3) + b"{x}")
+        assert recv_frame(client)["message"] == "Invalid JSON"
+        send_frame(client, {"id": 2, "action": "echo", "kwargs": {"value": "ok"}})
+        assert recv_frame(client)["value"] == "ok"
+
+
+def test_batch(server):
+    with connect(server) as client:
+        send_frame(
+            client,
+            {
+                "id": 7,
+                "action": "batch",
+                "kwargs": {
+                    "requests": [
+                        {"action": "echo", "kwargs": {"value": "a"}},
+                        {"action": "fail"},
+                        {"action": "batch"},
+                    ]
+                },
+            },
+        )
+        response = recv_frame(client)
+
+    assert response["id"] == 7
+    assert response["status"] == "success"
+    assert response["results"][0] == {"status": "success", "value": "a"}
+    assert response["results"][1] == {"status": "error", "message": "boom"}
+    assert "nested" in response["results"][2]["message"]
+
+
+def test_slow_client_does_not_block_others(server):
+    with connect(server) as slow, connect(server) as fast:
+        send_frame(slow, {"id": 1, "action": "slow", "kwargs": {"seconds": 1}})
+        start = time.monotonic()
+        send_frame(fast, {"id": 2, "action": "echo", "kwargs": {"value": "x"}})
+
+        assert recv_frame(fast)["id"] == 2
+        assert time.monotonic() - start < 0.5
+        assert recv_frame(slow)["id"] == 1
+
+
+def test_stream_request(server):
+    streamed = []
+
+    response = stream_request("count", {"to": 3}, streamed.append, path=server)
+
+    assert response == {"id": 1, "status": "success"}
+    assert streamed == [{"id": 1, "value": 0}, {"id": 1, "value": 1}, {"id": 1, "value": 2}]
+
+
+def test_stream_request_without_daemon(tmp_path):
+    with pytest.raises(OSError):
+        stream_request("count", {"to": 1}, print, path=str(tmp_path / "missing.sock"))
@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+from pytest_mock import MockerFixture
+
+from peerstash.core.jobqueue import JobQueue
+from tests.mocks.db_mock import MockTask
+
+
+@pytest.fixture
+def tasks(mocker: MockerFixture):
+    tasks = {
+        "a": MockTask("a", "/p", None, "peerstash-alice", "0 3 * * *", "1d"),
+        "b": MockTask("b", "/p", None, "peerstash-alice", "0 3 * * *", "1d"),
+        "c": MockTask("c", "/p", None, "peerstash-bob", "0 3 * * *", "1d"),
+    }
+    mocker.patch("peerstash.core.jobqueue.db_get_task", side_effect=tasks.get)
+    return tasks
+
+
+@pytest.fixture
+def idle_queue(tasks):
+    # no workers so jobs stay queued
+    return JobQueue(workers=0, peer_concurrency=1)
+
+
+def test_submit_merges_pending_jobs(idle_queue: JobQueue):
+    assert idle_queue.submit("a", "backup")
+    assert not idle_queue.submit("a", "backup")
+    assert idle_queue.submit("a", "prune")
+
+    status = idle_queue.status()
+    assert status["depth"] == 2
+    assert [(j["task_name"], j["kind"]) for j in status["pending"]] == [
+        ("a", "backup"),
+        ("a", "prune"),
+    ]
+
+
+def test_submit_unknown_task(idle_queue: JobQueue):
+    assert not idle_queue.submit("missing", "backup")
+    assert idle_queue.status()["depth"] == 0
+
+
+def test_next_job_respects_task_and_peer(idle_queue: JobQueue):
+    idle_queue.submit("a", "backup")
+    idle_queue.submit("a", "prune")
+    idle_queue.submit("b", "backup")
+    idle_queue.submit("c", "backup")
+
+    with idle_queue._cond:
+        first = idle_queue._next_job()
+        # a is running and alice is busy, so only bob's job can start
+        second = idle_queue._next_job()
+        third = idle_queue._next_job()
+
+    assert first and first.task_name == "a" and first.kind == "backup"
+    assert second and second.task_name == "c"
+    assert third is None
+
+    status = idle_queue.status()
+    assert status["depth"] == 2
+    assert {j["task_name"] for j in status["running"]} == {"a", "c"}
+
+
+def test_peer_concurrency_allows_parallel_jobs(tasks):
+    queue = JobQueue(workers=0, peer_concurrency=2)
+    queue.submit("a", "backup")
+    queue.submit("b", "backup")
+
+    with queue._cond:
+        assert queue._next_job()
+        assert queue._next_job()
+
+
+def test_workers_run_jobs(tasks, mocker: MockerFixture):
+    done = threading.Event()
+    calls: list[tuple[str, str]] = []
+
+    def fake_run(kind):
+        def run(name):
+            calls.append((kind, name))
+            if len(calls) == 2:
+                done.set()
+
+        return run
+
+    mocker.patch("peerstash.core.jobqueue.run_backup", side_effect=fake_run("backup"))
+    mocker.patch("peerstash.core.jobqueue.prune_repo", side_effect=fake_run("prune"))
+
+    queue = JobQueue(workers=2, peer_concurrency=1)
+    queue.submit("a", "backup")
+    queue.submit("c", "prune")
+    assert done.wait(timeout=5)
+    queue.stop()
+
+    assert sorted(calls) == [("backup", "a"), ("prune", "c")]
+    status = queue.status()
+    assert status["depth"] == 0
+    assert status["running"] == []
+
+
+def test_stop_interrupts_running_jobs(tasks, mocker: MockerFixture):
+    started = threading.Event()
+    interrupted = threading.Event()
+
+    def fake_backup(name):
+        started.set()
+        # the restic command runs until it is interrupted
+        assert interrupted.wait(timeout=5)
+        raise RuntimeError("restic interrupted")
+
+    def fake_interrupt(skip):
+        interrupted.set()
+        return {1234}
+
+    mocker.patch("peerstash.core.jobqueue.run_backup", side_effect=fake_backup)
+    mock_interrupt = mocker.patch(
+        "peerstash.core.jobqueue.interrupt_restic", side_effect=fake_interrupt
+    )
+
+    queue = JobQueue(workers=1, peer_concurrency=1)
+    queue.submit("a", "backup")
+    queue.submit("c", "backup")
+    assert started.wait(timeout=5)
+    queue.stop(interrupt=True)
+
+    mock_interrupt.assert_called()
+    status = queue.status()
+    assert status["running"] == []
+    # jobs that did not start yet stay queued
+    assert status["depth"] == 1
+
+
+def test_run_job_failure(idle_queue: JobQueue, mocker: MockerFixture):
+    mocker.patch(
+        "peerstash.core.jobqueue.run_backup", side_effect=RuntimeError("peer offline")
+    )
+    idle_queue.submit("a", "backup")
+    with idle_queue._cond:
+        job = idle_queue._next_job()
+
+    assert job and idle_queue._run_job(job) == 1
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import stat
+import threading
+
+import pytest
+from pytest import MonkeyPatch
+
+from peerstash.core import logs
+from peerstash.core.logs import (get_log_context, set_log_context,
+                                 setup_logging, stop_logging)
+from peerstash.core.task_state import TaskState
+from peerstash.core.utils import log
+from tests.mocks.db_mock import MockTask
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch: MonkeyPatch):
+    path = tmp_path / "peerstash.log"
+    monkeypatch.setattr(logs, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(logs, "LOG_FILE", str(path))
+    level = logging.getLogger().level
+    yield path
+    stop_logging()
+    logging.getLogger().setLevel(level)
+
+
+def test_records_are_written_in_the_background(log_file, capsys):
+    setup_logging()
+    setup_logging()  # only set up once
+
+    log("[t] Running backup task...")
+    logging.getLogger("peerstash.test").warning("careful")
+    stop_logging()
+
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 2
+    assert lines[0].endswith("[INFO] [t] Running backup task...")
+    assert lines[1].endswith("[WARNING] careful")
+    assert capsys.readouterr().out == "[t] Running backup task...\n"
+
+
+def test_json_records_carry_the_job_context(
+    log_file, mock_db, monkeypatch: MonkeyPatch
+):
+    monkeypatch.setattr(logs, "LOG_OUTPUT", "json")
+    mock_db["tasks"]["t"] = task = MockTask(
+        "t", "/p", None, "peerstash-node1", "0 3 * * *", "1d", status="idle"
+    )
+    setup_logging()
+    logger = logging.getLogger("peerstash.test")
+
+    state = TaskState(task, "backup")
+    state.start()
+    state.phase("space_check")
+    logger.info("checking")
+    state.finish(0)
+    logger.info("done")
+    stop_logging()
+
+    records = [json.loads(line) for line in log_file.read_text().splitlines()]
+    checking = next(r for r in records if r["message"] == "checking")
+    assert checking["task"] == "t"
+    assert checking["kind"] == "backup"
+    assert checking["phase"] == "space_check"
+    assert checking["level"] == "INFO"
+    assert "task" not in records[-1]
+    assert get_log_context() == {}
+
+
+def test_daemon_rotates_the_log(log_file, monkeypatch: MonkeyPatch):
+    monkeypatch.setattr(logs, "LOG_MAX_BYTES", 200)
+    monkeypatch.setattr(logs, "LOG_BACKUPS", 2)
+    setup_logging(rotate=True)
+
+    for i in range(20):
+        logging.getLogger("peerstash.test").info(f"line {i}")
+    stop_logging()
+
+    rotated = sorted(p.name for p in log_file.parent.iterdir())
+    assert rotated == ["peerstash.log", "peerstash.log.1", "peerstash.log.2"]
+    assert "line 19" in log_file.read_text()
+    # the CLI (admin user) can still write to the new file
+    assert stat.S_IMODE(os.stat(log_file).st_mode) == 0o666
+
+
+def test_context_is_per_thread():
+    set_log_context({"task": "t"})
+    try:
+        result = []
+        thread = threading.Thread(target=lambda: result.append(get_log_context()))
+        thread.start()
+        thread.join()
+        assert result == [{}]
+    finally:
+        set_log_context({})
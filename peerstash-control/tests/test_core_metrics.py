@@ -0,0 +1,109 @@
+import urllib.error
+import urllib.request
+from datetime import datetime
+from threading import Thread
+
+import pytest
+from pytest_mock import MockerFixture
+
+from peerstash.core.db_schemas import PeerUsageRead, TaskRunRead
+from peerstash.core.metrics import (MetricsServer, interface_address,
+                                    render_metrics)
+from tests.mocks.db_mock import MockTask
+
+QUEUE_STATUS = {"depth": 2, "average_wait": 1.5, "pending": [], "running": [{}]}
+
+
+def make_run(kind: str, day: int, exit_code: int = 0, **kwargs) -> TaskRunRead:
+    return TaskRunRead(
+        id=day,
+        task_name="web",
+        kind=kind,
+        hostname="peerstash-node1",
+        started=datetime(2026, 3, day, 3),
+        duration=42.5,
+        phases={},
+        exit_code=exit_code,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def mock_state(mocker: MockerFixture):
+    task = MockTask(
+        "web", "/p", None, "peerstash-node1", "0 3 * * *", "1d", status="running"
+    )
+    mocker.patch("peerstash.core.metrics.db_list_tasks", return_value=[task])
+    mocker.patch("peerstash.core.metrics.db_count_snapshots", return_value={"web": 7})
+    mocker.patch(
+        "peerstash.core.metrics.db_latest_task_runs",
+        side_effect=lambda succeeded=False: (
+            [make_run("backup", 2)]
+            if succeeded
+            else [make_run("backup", 3, 3, bytes_added=1024), make_run("prune", 1)]
+        ),
+    )
+    mocker.patch(
+        "peerstash.core.metrics.db_list_peer_usage",
+        return_value=[
+            PeerUsageRead(
+                hostname="peerstash-node1",
+                total=1000,
+                used=600,
+                free=400,
+                updated=datetime(2026, 3, 3, 3),
+            )
+        ],
+    )
+
+
+def test_render_metrics(mock_state):
+    text = render_metrics(QUEUE_STATUS)
+    lines = text.splitlines()
+
+    labels = 'task="web",peer="node1"'
+    success = datetime(2026, 3, 2, 3).timestamp()
+    assert f'peerstash_task_last_success_timestamp_seconds{{{labels},kind="backup"}} {success}' in lines
+    assert f'peerstash_task_last_exit_code{{{labels},kind="backup"}} 3' in lines
+    assert f'peerstash_task_last_exit_code{{{labels},kind="prune"}} 0' in lines
+    assert f'peerstash_task_last_duration_seconds{{{labels},kind="backup"}} 42.5' in lines
+    assert f"peerstash_task_last_added_bytes{{{labels}}} 1024" in lines
+    assert f"peerstash_task_snapshots{{{labels}}} 7" in lines
+    assert f"peerstash_task_busy{{{labels}}} 1" in lines
+    assert "peerstash_queue_depth 2" in lines
+    assert "peerstash_queue_running_jobs 1" in lines
+    assert 'peerstash_peer_free_bytes{peer="node1"} 400' in lines
+    assert "# TYPE peerstash_peer_quota_bytes gauge" in lines
+    # unknown values are left out
+    assert "peerstash_task_last_processed_bytes{" not in text
+    assert "# EOF" not in text
+    assert render_metrics(openmetrics=True).endswith("# EOF\n")
+
+
+def test_metrics_server(mock_state, mocker: MockerFixture):
+    queue = mocker.MagicMock()
+    queue.status.return_value = QUEUE_STATUS
+    server = MetricsServer(("127.0.0.1", 0), queue)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        request = urllib.request.Request(
+            f"{url}/metrics", headers={"Accept": "application/openmetrics-text"}
+        )
+        with urllib.request.urlopen(request) as response:
+            assert response.headers["Content-Type"].startswith("application/openmetrics-text")
+            assert b"peerstash_queue_depth 2" in response.read()
+
+        with pytest.raises(urllib.error.HTTPError, match="404"):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_interface_address():
+    assert interface_address("lo") == "127.0.0.1"
+
+    with pytest.raises(OSError):
+        interface_address("missing0")
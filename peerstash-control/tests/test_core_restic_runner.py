@@ -0,0 +1,106 @@
+import subprocess
+import sys
+import threading
+
+from pytest_mock import MockerFixture
+
+from peerstash.core.restic_runner import ResticRunner, interrupt_restic
+from tests.mocks.db_mock import MockTask
+
+
+def test_for_task(mock_db):
+    task = MockTask("docs", "/p", None, "peerstash-alice", "0 3 * * *", "1d")
+
+    runner = ResticRunner.for_task(task)  # type: ignore
+
+    assert runner.repository.endswith("@peerstash-alice:2022/docs")
+    assert runner.password_file == "/var/lib/peerstash/restic_password"
+
+
+def test_command_passes_repository(mocker: MockerFixture):
+    runner = ResticRunner("sftp://u@h:2022/a", "/pw")
+
+    assert runner.command("snapshots", "latest") == [
+        "/usr/bin/restic",
+        "--json",
+        "-r",
+        "sftp://u@h:2022/a",
+        "--password-file",
+        "/pw",
+        "snapshots",
+        "latest",
+    ]
+
+
+def test_resticpy_commands_use_runner_repository(mocker: MockerFixture):
+    mock_snapshots = mocker.patch("restic.internal.snapshots.run", return_value=[])
+
+    ResticRunner("sftp://u@h:2022/a").snapshots(snapshot_id="latest")
+
+    base_cmd = mock_snapshots.call_args[0][0]
+    assert "sftp://u@h:2022/a" in base_cmd
+    assert mock_snapshots.call_args[1] == {"snapshot_id": "latest"}
+
+
+def test_check_and_prune(mocker: MockerFixture):
+    mock_run = mocker.patch("subprocess.run")
+    runner = ResticRunner("sftp://u@h:2022/a")
+
+    runner.check()
+    assert mock_run.call_args[0][0][-2:] == ["check", "--with-cache"]
+    # the output of a failed check is logged as text
+    assert mock_run.call_args[1]["text"] is True
+
+    runner.check(read_data_subset="2/14")
+    assert mock_run.call_args[0][0][-2:] == ["--read-data-subset", "2/14"]
+
+    runner.prune(max_repack_size="0")
+    assert mock_run.call_args[0][0][-3:] == ["prune", "--max-repack-size", "0"]
+    assert "sftp://u@h:2022/a" in mock_run.call_args[0][0]
+
+
+def test_parallel_runners_keep_their_repository(mocker: MockerFixture):
+    seen: dict[str, list[str]] = {}
+    barrier = threading.Barrier(2)
+
+    def fake_snapshots(base_cmd, **kwargs):
+        # both threads are inside restic at the same time
+        barrier.wait(timeout=5)
+        seen[kwargs["snapshot_id"]] = base_cmd
+        return []
+
+    mocker.patch("restic.internal.snapshots.run", side_effect=fake_snapshots)
+
+    threads = [
+        threading.Thread(
+            target=ResticRunner(f"sftp://u@h:2022/{name}").snapshots,
+            kwargs={"snapshot_id": name},
+        )
+        for name in ("a", "b")
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert seen["a"][3] == "sftp://u@h:2022/a"
+    assert seen["b"][3] == "sftp://u@h:2022/b"
+
+
+def test_interrupt_restic(mocker: MockerFixture):
+    # stand-ins for restic commands of two jobs
+    mocker.patch("peerstash.core.restic_runner.RESTIC_BIN", sys.executable)
+    cmd = [sys.executable, "-c", "import time; time.sleep(30)"]
+    first = subprocess.Popen(cmd)
+    second = subprocess.Popen(cmd)
+    try:
+        assert interrupt_restic(skip={second.pid}) == {first.pid}
+        assert first.wait(timeout=10) != 0
+        assert second.poll() is None
+
+        assert interrupt_restic(skip={first.pid}) == {second.pid}
+        assert second.wait(timeout=10) != 0
+    finally:
+        for process in (first, second):
+            process.kill()
+            process.wait()
@@ -0,0 +1,183 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pytest_mock import MockerFixture
+
+from peerstash.core.scheduler import Scheduler
+from peerstash.core.stagger import StaggerPlanner
+from tests.mocks.db_mock import MockTask
+
+
+@pytest.fixture
+def scheduler(mocker: MockerFixture):
+    mocker.patch("peerstash.core.scheduler.db_get_task", return_value=None)
+    mocker.patch("peerstash.core.stagger.db_list_task_runs", return_value=[])
+    # no stagger window so fire times are predictable
+    return Scheduler(mocker.MagicMock(), StaggerPlanner(window=0))
+
+
+def test_set_task_and_list_jobs(scheduler: Scheduler):
+    scheduler.set_task("t", "0 3 * * *", "0 4 * * 0")
+
+    jobs = scheduler.list_jobs()
+    assert {j["kind"] for j in jobs} == {"backup", "prune"}
+    assert all(j["task_name"] == "t" for j in jobs)
+
+
+def test_reschedule_replaces_jobs(scheduler: Scheduler):
+    scheduler.set_task("t", "0 3 * * *", "0 4 * * 0")
+    scheduler.set_task("t", "0 5 * * *", "0 4 * * 0")
+
+    backups = [j for j in scheduler.list_jobs() if j["kind"] == "backup"]
+    assert len(backups) == 1
+    assert backups[0]["next_run"].endswith("05:00:00")
+
+
+def test_remove_task(scheduler: Scheduler):
+    scheduler.set_task("t", "0 3 * * *", "0 4 * * 0")
+    scheduler.remove_task("t")
+
+    assert scheduler.list_jobs() == []
+    assert scheduler._pop_due(datetime.now() + timedelta(days=8)) == []
+
+
+def test_pop_due_reschedules(scheduler: Scheduler):
+    scheduler.set_task("t", "*/5 * * * *", "0 4 * * 0")
+
+    due = scheduler._pop_due(datetime.now() + timedelta(minutes=5))
+    assert due == [("t", "backup")]
+
+    # the next backup is queued 5 minutes after the one that fired
+    backups = [j for j in scheduler.list_jobs() if j["kind"] == "backup"]
+    assert len(backups) == 1
+    assert datetime.fromisoformat(backups[0]["next_run"]) > datetime.now() + timedelta(
+        minutes=4
+    )
+
+
+def test_load_from_db(scheduler: Scheduler, mocker: MockerFixture):
+    mocker.patch(
+        "peerstash.core.scheduler.db_list_tasks",
+        return_value=[
+            MockTask("a", "/p", None, "h", "0 3 * * *", "1d"),
+            MockTask("b", "/p", None, "h", "0 2 * * *", "1d"),
+        ],
+    )
+
+    scheduler.load()
+
+    assert {j["task_name"] for j in scheduler.list_jobs()} == {"a", "b"}
+
+
+def test_reschedule_compacts_stale_entries(scheduler: Scheduler):
+    for hour in range(20):
+        scheduler.set_task("t", f"0 {hour} * * *", "0 4 * * 0")
+    scheduler.set_task("u", "0 3 * * *", "0 4 * * 0")
+
+    # stale entries never outnumber the live ones
+    assert len(scheduler._heap) <= 2 * 4
+    assert len(scheduler.list_jobs()) == 4
+
+    scheduler.remove_task("t")
+    scheduler.remove_task("u")
+    assert scheduler._heap == []
+
+
+def test_load_replaces_existing_jobs(scheduler: Scheduler, mocker: MockerFixture):
+    scheduler.set_task("a", "0 1 * * *", "0 4 * * 0")
+    mocker.patch(
+        "peerstash.core.scheduler.db_list_tasks",
+        return_value=[MockTask("a", "/p", None, "h", "0 3 * * *", "1d")],
+    )
+
+    scheduler.load()
+
+    backups = [j for j in scheduler.list_jobs() if j["kind"] == "backup"]
+    assert len(backups) == 1
+    assert backups[0]["next_run"].endswith("03:00:00")
+    assert scheduler._heap[0] == min(scheduler._heap)
+
+
+def test_load_catches_up_missed_jobs(scheduler: Scheduler, mocker: MockerFixture):
+    long_ago = datetime.now() - timedelta(days=3)
+    overdue = MockTask("a", "/p", None, "h", "0 3 * * *", "1d")
+    overdue.last_backup = long_ago
+    older = MockTask("b", "/p", None, "h", "0 3 * * *", "1d")
+    older.last_backup = long_ago - timedelta(days=1)
+    skipped = MockTask("c", "/p", None, "h", "0 3 * * *", "1d")
+    skipped.last_backup = long_ago
+    skipped.catch_up = "skip"
+    up_to_date = MockTask("d", "/p", None, "h", "0 3 * * *", "1d")
+    up_to_date.last_backup = datetime.now()
+    mocker.patch(
+        "peerstash.core.scheduler.db_list_tasks",
+        return_value=[overdue, older, skipped, up_to_date],
+    )
+    mocker.patch("peerstash.core.scheduler.CATCH_UP_STAGGER_SECONDS", 60)
+
+    scheduler.load()
+
+    # the longest overdue task runs first, the next one a minute later
+    now = datetime.now()
+    assert scheduler._pop_due(now) == [("b", "backup")]
+    assert scheduler._pop_due(now) == []
+    assert scheduler._pop_due(now + timedelta(seconds=61)) == [("a", "backup")]
+
+
+def test_pop_due_catches_up_after_sleep(scheduler: Scheduler):
+    scheduler.set_task("once", "0 3 * * *", "0 4 * * 0")
+    scheduler.set_task("skip", "0 3 * * *", "0 4 * * 0", catch_up="skip")
+
+    # the daemon wakes up two weeks later
+    later = datetime.now() + timedelta(days=14)
+    due = scheduler._pop_due(later)
+    assert due == []
+    # each missed job of the "once" task is caught up, exactly once
+    assert sorted(scheduler._pop_due(later + timedelta(hours=1))) == [
+        ("once", "backup"),
+        ("once", "prune"),
+    ]
+    assert scheduler._pop_due(later + timedelta(hours=1)) == []
+    # the schedule resumes from the wake-up time
+    assert all(
+        datetime.fromisoformat(j["next_run"]) > later for j in scheduler.list_jobs()
+    )
+
+
+def test_jobs_firing_together_are_staggered(mocker: MockerFixture):
+    mocker.patch(
+        "peerstash.core.scheduler.db_get_task",
+        side_effect=lambda name: MockTask(name, "/p", None, "peer", "0 3 * * *", "1d"),
+    )
+    mocker.patch("peerstash.core.stagger.db_list_task_runs", return_value=[])
+    scheduler = Scheduler(mocker.MagicMock(), StaggerPlanner(window=600))
+    scheduler.set_task("a", "0 3 * * *", "0 4 * * 0")
+    scheduler.set_task("b", "0 3 * * *", "0 4 * * 0")
+
+    backups = {
+        j["task_name"]: datetime.fromisoformat(j["next_run"])
+        for j in scheduler.list_jobs()
+        if j["kind"] == "backup"
+    }
+    # the second backup to the same peer starts after the first one's expected duration
+    assert abs((backups["a"] - backups["b"]).total_seconds()) == 60
+
+    # when they fire, the later one is held back until its planned start
+    first, second = sorted(backups, key=backups.__getitem__)
+    assert scheduler._pop_due(backups[first]) == [(first, "backup")]
+    assert scheduler._pop_due(backups[first]) == []
+    assert scheduler._pop_due(backups[second]) == [(second, "backup")]
+
+
+def test_run_submits_due_jobs(scheduler: Scheduler, mocker: MockerFixture):
+    scheduler.set_task("t", "*/5 * * * *", "0 4 * * 0")
+    mocker.patch.object(scheduler, "_pop_due", return_value=[("t", "backup")])
+    # stop the loop after the first round
+    mocker.patch.object(
+        scheduler._cond,
+        "wait",
+        side_effect=lambda timeout: setattr(scheduler, "_stopped", True),
+    )
+    scheduler.run()
+
+    scheduler._queue.submit.assert_called_once_with("t", "backup")
@@ -0,0 +1,305 @@
+import errno
+import stat
+import subprocess
+import threading
+
+import pytest
+from paramiko.message import Message
+from paramiko.sftp import CMD_EXTENDED, CMD_EXTENDED_REPLY
+from paramiko.sftp_attr import SFTPAttributes
+from pytest_mock import MockerFixture
+
+from peerstash.core.sftp import (DISK_USAGE_TTL, SFTPPool, get_disk_usage,
+                                 invalidate_disk_usage, remove_tree)
+
+
+@pytest.fixture
+def mock_ssh(mocker: MockerFixture):
+    mocker.patch("peerstash.core.sftp.db_get_user", return_value="admin")
+
+    def open_sftp():
+        sftp = mocker.MagicMock()
+        sftp.get_channel.return_value.closed = False
+        return sftp
+
+    def new_client():
+        # every connection and session is a separate mock so they can be told apart
+        ssh = mocker.MagicMock()
+        ssh.open_sftp.side_effect = open_sftp
+        return ssh
+
+    return mocker.patch("paramiko.SSHClient", side_effect=new_client)
+
+
+def test_session_reuses_connection(mock_ssh):
+    pool = SFTPPool()
+
+    with pool.session("peerstash-alice") as first:
+        pass
+    with pool.session("peerstash-alice") as second:
+        pass
+
+    assert mock_ssh.call_count == 1
+    assert second is first
+
+
+def test_session_connects_per_peer(mock_ssh):
+    pool = SFTPPool()
+
+    with pool.session("peerstash-alice"):
+        with pool.session("peerstash-bob"):
+            pass
+
+    assert mock_ssh.call_count == 2
+
+
+def test_concurrent_sessions_use_separate_channels(mock_ssh):
+    pool = SFTPPool()
+
+    with pool.session("peerstash-alice") as first:
+        with pool.session("peerstash-alice") as second:
+            assert first is not second
+
+    assert mock_ssh.call_count == 1
+    assert len(pool._peers["peerstash-alice"].idle) == 2
+
+
+def test_unhealthy_connection_is_replaced(mock_ssh):
+    pool = SFTPPool()
+
+    with pool.session("peerstash-alice"):
+        pass
+    ssh = pool._peers["peerstash-alice"].ssh
+    ssh.get_transport.return_value.is_active.return_value = False
+
+    with pool.session("peerstash-alice"):
+        pass
+
+    assert mock_ssh.call_count == 2
+    ssh.close.assert_called_once()
+
+
+def test_idle_connection_is_closed(mock_ssh, mocker: MockerFixture):
+    pool = SFTPPool(idle_timeout=10)
+    clock = mocker.patch("time.monotonic", return_value=100.0)
+
+    with pool.session("peerstash-alice"):
+        pass
+    ssh = pool._peers["peerstash-alice"].ssh
+
+    clock.return_value = 200.0
+    with pool.session("peerstash-bob"):
+        pass
+
+    ssh.close.assert_called_once()
+    assert "peerstash-alice" not in pool._peers
+
+
+def test_connect_sets_keepalive(mock_ssh):
+    pool = SFTPPool(keepalive=15)
+
+    with pool.session("peerstash-alice"):
+        pass
+
+    ssh = pool._peers["peerstash-alice"].ssh
+    ssh.connect.assert_called_once_with(
+        "peerstash-alice",
+        port=2022,
+        username="admin",
+        key_filename="/home/admin/.ssh/id_ed25519",
+    )
+    ssh.get_transport.return_value.set_keepalive.assert_called_once_with(15)
+
+
+def test_closed_session_is_not_reused(mock_ssh):
+    pool = SFTPPool()
+
+    with pool.session("peerstash-alice") as first:
+        first.get_channel.return_value.closed = True
+    with pool.session("peerstash-alice") as second:
+        pass
+
+    assert second is not first
+    first.close.assert_called_once()
+
+
+def test_close_all(mock_ssh):
+    pool = SFTPPool()
+    with pool.session("peerstash-alice"):
+        pass
+
+    ssh = pool._peers["peerstash-alice"].ssh
+    pool.close()
+
+    ssh.close.assert_called_once()
+    assert pool._peers == {}
+
+
+class FakePeerFS:
+    """An in-memory folder tree served over a fake SFTP session."""
+
+    def __init__(self, tree: dict[str, list[str]]):
+        # folder -> entries, folders end with "/"
+        self.tree = tree
+        self.removed: list[str] = []
+        self.lock = threading.Lock()
+
+    def listdir_attr(self, path: str) -> list[SFTPAttributes]:
+        if path not in self.tree:
+            raise IOError(errno.ENOENT, "No such file")
+        entries = []
+        for name in self.tree[path]:
+            attr = SFTPAttributes()
+            attr.filename = name.rstrip("/")
+            attr.st_mode = (stat.S_IFDIR if name.endswith("/") else stat.S_IFREG) | 0o700
+            entries.append(attr)
+        return entries
+
+    def remove(self, path: str) -> None:
+        with self.lock:
+            self.removed.append(path)
+
+    def rmdir(self, path: str) -> None:
+        with self.lock:
+            self.removed.append(path + "/")
+
+
+@pytest.fixture
+def fake_peer(mocker: MockerFixture):
+    fs = FakePeerFS(
+        {
+            "repo": ["config", "data/", "keys/"],
+            "repo/data": ["00/", "01/"],
+            "repo/data/00": [f"00{i}" for i in range(5)],
+            "repo/data/01": [f"01{i}" for i in range(5)],
+            "repo/keys": ["k"],
+        }
+    )
+    session = mocker.patch("peerstash.core.sftp.sftp_session")
+    session.return_value.__enter__.return_value = fs
+    return fs
+
+
+def test_remove_tree(fake_peer: FakePeerFS):
+    progress = []
+
+    removed = remove_tree("peerstash-alice", "repo", workers=3, progress=lambda r, t: progress.append((r, t)))
+
+    assert removed == 12
+    files = [p for p in fake_peer.removed if not p.endswith("/")]
+    assert sorted(files) == sorted(
+        ["repo/config", "repo/keys/k"]
+        + [f"repo/data/00/00{i}" for i in range(5)]
+        + [f"repo/data/01/01{i}" for i in range(5)]
+    )
+    # folders are removed after their contents, children before parents
+    folders = fake_peer.removed[len(files):]
+    assert folders[-1] == "repo/"
+    assert folders.index("repo/data/00/") < folders.index("repo/data/")
+    assert progress[-1] == (12, 12)
+
+
+def test_remove_tree_reports_progress(fake_peer: FakePeerFS, mocker: MockerFixture):
+    mocker.patch("peerstash.core.sftp.REMOVE_PROGRESS_INTERVAL", 5)
+    progress = []
+
+    remove_tree("peerstash-alice", "repo", workers=1, progress=lambda r, t: progress.append((r, t)))
+
+    assert progress == [(5, 12), (10, 12), (12, 12)]
+
+
+def test_remove_tree_skips_missing(fake_peer: FakePeerFS, mocker: MockerFixture):
+    # files removed before an interruption are gone when the removal is resumed
+    mocker.patch.object(
+        fake_peer, "remove", side_effect=IOError(errno.ENOENT, "No such file")
+    )
+
+    assert remove_tree("peerstash-alice", "repo") == 12
+    assert remove_tree("peerstash-alice", "missing") == 0
+
+
+def statvfs_reply(frsize: int, blocks: int, bfree: int, bavail: int) -> Message:
+    msg = Message()
+    for value in (frsize, frsize, blocks, bfree, bavail, 0, 0, 0, 0, 0, 255):
+        msg.add_int64(value)
+    msg.rewind()
+    return msg
+
+
+@pytest.fixture
+def mock_statvfs_session(mocker: MockerFixture):
+    sftp = mocker.MagicMock()
+    sftp._request.return_value = (CMD_EXTENDED_REPLY, statvfs_reply(4096, 1000, 300, 200))
+    session = mocker.patch("peerstash.core.sftp.sftp_session")
+    session.return_value.__enter__.return_value = sftp
+    mocker.patch("peerstash.core.sftp.db_set_peer_usage")
+    return sftp
+
+
+def test_get_disk_usage_statvfs(mock_statvfs_session, mocker: MockerFixture):
+    mock_run = mocker.patch("subprocess.run")
+    mock_save = mocker.patch("peerstash.core.sftp.db_set_peer_usage")
+
+    total, used, free = get_disk_usage("alice", "host", 2022)
+
+    assert total == 1000 * 4096
+    assert used == 700 * 4096
+    assert free == 200 * 4096
+    mock_save.assert_called_once_with("host", (total, used, free))
+    mock_statvfs_session._request.assert_called_once_with(
+        CMD_EXTENDED, "statvfs@openssh.com", "."
+    )
+    mock_run.assert_not_called()
+
+
+def test_get_disk_usage_cached(mock_statvfs_session, mocker: MockerFixture):
+    clock = mocker.patch("time.monotonic", return_value=100.0)
+
+    get_disk_usage("alice", "host", 2022)
+    get_disk_usage("alice", "host", 2022)
+    assert mock_statvfs_session._request.call_count == 1
+
+    # a different peer is not cached
+    get_disk_usage("alice", "other", 2022)
+    assert mock_statvfs_session._request.call_count == 2
+
+    # the cache expires after the TTL
+    clock.return_value = 100.0 + DISK_USAGE_TTL + 1
+    get_disk_usage("alice", "host", 2022)
+    assert mock_statvfs_session._request.call_count == 3
+
+
+def test_invalidate_disk_usage(mock_statvfs_session):
+    get_disk_usage("alice", "host", 2022)
+    invalidate_disk_usage("host")
+    get_disk_usage("alice", "host", 2022)
+
+    assert mock_statvfs_session._request.call_count == 2
+
+
+def test_get_disk_usage_falls_back_to_df(mocker: MockerFixture):
+    mocker.patch(
+        "peerstash.core.sftp.sftp_session", side_effect=IOError("Operation unsupported")
+    )
+    mock_run = mocker.patch("subprocess.run")
+    # Simulate the raw output of `df` returning KiB blocks: Total, Used, Available
+    mock_run.return_value.stdout = "1000 300 700"
+
+    total, used, free = get_disk_usage("alice", "host", 2022)
+    assert total == 1024000  # 1000 * 1024
+    assert used == 307200  # 300 * 1024
+    assert free == 716800  # 700 * 1024
+
+    # the sftp process shares a persistent SSH connection to the peer
+    cmd = mock_run.call_args[0][0]
+    assert "ControlMaster=auto" in cmd
+    assert cmd[-1] == "alice@host"
+
+
+def test_get_disk_usage_failure(mocker: MockerFixture):
+    mocker.patch(
+        "peerstash.core.sftp.sftp_session", side_effect=IOError("Operation unsupported")
+    )
+    mocker.patch("subprocess.run", side_effect=subprocess.CalledProcessError(1, "sftp"))
+    with pytest.raises(RuntimeError, match="Could not get quota"):
+        get_disk_usage("alice", "host", 2022)
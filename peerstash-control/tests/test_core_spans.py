@@ -0,0 +1,58 @@
+import subprocess
+import sys
+import threading
+
+from peerstash.core.spans import Span, current_span
+
+
+def test_spans_nest_in_their_thread():
+    with Span("job") as job:
+        with Span("phase") as phase:
+            assert current_span() is phase
+            with Span("command", dry_run=True):
+                pass
+        assert current_span() is job
+
+        other = threading.Thread(target=lambda: Span("elsewhere").start().end())
+        other.start()
+        other.join()
+
+    assert current_span() is None
+    assert [child.name for child in job.children] == ["phase"]
+    assert [child.name for child in phase.children] == ["command"]
+    assert phase.wall <= job.wall
+
+
+def test_detached_span_is_not_a_child():
+    with Span("outer") as outer:
+        detached = Span("inner").start(attach=False)
+        assert current_span() is detached
+        detached.end()
+        assert current_span() is outer
+
+    assert outer.children == []
+
+
+def test_span_to_dict():
+    with Span("upload") as upload:
+        with Span("restic backup") as command:
+            command.set(data_added=10)
+
+    data = upload.to_dict()
+
+    assert data["name"] == "upload"
+    assert "attrs" not in data
+    assert data["children"][0]["attrs"] == {"data_added": 10}
+    assert set(data["children"][0]) == {"name", "wall", "cpu", "child_cpu", "attrs"}
+    assert "restic backup" in command.describe()
+    assert "data_added=10" in command.describe()
+
+
+def test_span_measures_subprocess_cpu():
+    burn = "import time\nwhile time.process_time() < 0.2: pass"
+
+    with Span("command") as span:
+        subprocess.run([sys.executable, "-c", burn], check=True)
+
+    assert span.child_cpu >= 0.2
+    assert span.cpu < span.child_cpu
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+from pytest_mock import MockerFixture
+
+from peerstash.core.db_schemas import TaskRunRead
+from peerstash.core.stagger import DEFAULT_DURATION, StaggerPlanner
+
+
+def make_run(duration: float, exit_code: int = 0) -> TaskRunRead:
+    return TaskRunRead(
+        id=1,
+        task_name="t",
+        kind="backup",
+        hostname="h",
+        started=datetime(2026, 3, 4, 3, 0),
+        duration=duration,
+        phases={},
+        exit_code=exit_code,
+    )
+
+
+@pytest.fixture
+def planner(mocker: MockerFixture):
+    mocker.patch("peerstash.core.stagger.db_list_task_runs", return_value=[])
+    return StaggerPlanner(window=600)
+
+
+def test_refresh_uses_median_of_successful_runs(
+    planner: StaggerPlanner, mocker: MockerFixture
+):
+    mocker.patch(
+        "peerstash.core.stagger.db_list_task_runs",
+        return_value=[make_run(100), make_run(5000, exit_code=1), make_run(120), make_run(90)],
+    )
+    planner.refresh("t", "backup")
+    assert planner.duration("t", "backup") == 100
+    assert planner.duration("t", "prune") == DEFAULT_DURATION
+
+    planner.forget("t")
+    assert planner.duration("t", "backup") == DEFAULT_DURATION
+
+
+def test_offset_is_deterministic(planner: StaggerPlanner):
+    group = [("a", "backup", "h1"), ("b", "backup", "h1"), ("c", "backup", "h2")]
+
+    offsets = [planner.offset(job, group) for job in group]
+
+    # same answer regardless of the order jobs are listed in
+    assert offsets == [planner.offset(job, list(reversed(group))) for job in group]
+    assert offsets == [StaggerPlanner(window=600).offset(job, group) for job in group]
+    assert all(0 <= offset <= 600 for offset in offsets)
+
+
+def test_offset_lays_out_jobs_of_a_peer_end_to_end(
+    planner: StaggerPlanner, mocker: MockerFixture
+):
+    mocker.patch(
+        "peerstash.core.stagger.db_list_task_runs", return_value=[make_run(200)]
+    )
+    group = [("a", "backup", "h"), ("b", "backup", "h"), ("c", "prune", "h")]
+    for name, kind, _ in group:
+        planner.refresh(name, kind)
+
+    offsets = sorted(planner.offset(job, group) for job in group)
+
+    assert offsets[1] - offsets[0] == 200
+    assert offsets[2] - offsets[1] == 200
+
+
+def test_offset_is_capped_by_the_window(planner: StaggerPlanner, mocker: MockerFixture):
+    mocker.patch(
+        "peerstash.core.stagger.db_list_task_runs", return_value=[make_run(1000)]
+    )
+    group = [("a", "backup", "h"), ("b", "backup", "h")]
+    for name, kind, _ in group:
+        planner.refresh(name, kind)
+
+    assert sorted(planner.offset(job, group) for job in group) == [0, 600]
+
+
+def test_refresh_survives_db_errors(planner: StaggerPlanner, mocker: MockerFixture):
+    mocker.patch(
+        "peerstash.core.stagger.db_list_task_runs", side_effect=Exception("locked")
+    )
+    planner.refresh("t", "backup")
+    assert planner.duration("t", "backup") == DEFAULT_DURATION
@@ -0,0 +1,154 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from peerstash.core import task_state
+from peerstash.core.backup import run_backup, schedule_backup
+from peerstash.core.task_state import InvalidTransitionError, TaskState
+from tests.mocks.db_mock import MockTask
+
+
+def make_task(status="idle"):
+    return MockTask("t", "/p", None, "peerstash-node1", "0 3 * * *", "1d", status=status)
+
+
+def test_backup_writes_start_and_finish_only(mock_db, mocker: MockerFixture):
+    mock_db["tasks"]["t"] = task = make_task()
+    mock_update = mocker.spy(task_state, "db_update_task")
+    mock_finish = mocker.spy(task_state, "db_finish_task")
+
+    state = TaskState(task, "backup")
+    state.start()
+    assert task.status == "running"
+    assert task.last_exit_code == -1
+    assert task.last_backup == state.started
+    for phase in ("space_check", "upload", "check"):
+        state.phase(phase)
+    state.finish(0, {"data_added": 10, "total_files_processed": 3})
+
+    assert mock_update.call_count == 1
+    assert mock_finish.call_count == 1
+    assert task.status == "idle"
+    assert task.last_exit_code == 0
+    run = mock_db["task_runs"][-1]
+    assert list(run.phases) == ["space_check", "upload", "check"]
+    assert run.bytes_added == 10
+    assert run.files_processed == 3
+
+
+def test_prune_sets_last_prune(mock_db):
+    mock_db["tasks"]["t"] = task = make_task()
+
+    state = TaskState(task, "prune")
+    state.start()
+
+    assert task.status == "pruning"
+    assert task.last_prune == state.started
+    assert task.last_backup is None
+
+
+def test_new_task_cannot_be_pruned(mock_db):
+    mock_db["tasks"]["t"] = task = make_task(status="new")
+
+    with pytest.raises(InvalidTransitionError, match="'new' to 'pruning'"):
+        TaskState(task, "prune").start()
+
+
+def test_invalid_phase(mock_db):
+    mock_db["tasks"]["t"] = task = make_task()
+    state = TaskState(task, "backup")
+    state.start()
+    state.phase("space_check")
+
+    with pytest.raises(InvalidTransitionError, match="'space_check' to 'check'"):
+        state.phase("check")
+
+
+def test_retried_phase_accumulates(mock_db, mocker: MockerFixture):
+    mock_db["tasks"]["t"] = task = make_task()
+    mocker.patch("peerstash.core.spans.time.perf_counter", side_effect=range(100))
+    state = TaskState(task, "backup")
+    state.start()
+
+    for phase in ("space_check", "upload", "prune", "space_check", "upload", "check"):
+        state.phase(phase)
+    state.finish(0)
+
+    phases = mock_db["task_runs"][-1].phases
+    assert phases == {"space_check": 2, "upload": 2, "prune": 1, "check": 1}
+
+
+@pytest.mark.parametrize(
+    "status, kind",
+    [
+        # a status of an older version
+        ("checking", "backup"),
+        # statuses left by a job that died
+        ("running", "backup"),
+        ("pruning", "backup"),
+        ("pruning", "prune"),
+    ],
+)
+def test_interrupted_run_is_recovered(mock_db, caplog, status, kind):
+    mock_db["tasks"]["t"] = task = make_task(status=status)
+
+    TaskState(task, kind).start()
+
+    assert task.status == task_state.JOB_STATUS[kind]
+    assert "interrupted run" in caplog.text
+
+
+def test_prune_during_backup_is_not_a_recovery(mock_db, caplog):
+    mock_db["tasks"]["t"] = task = make_task(status="running")
+
+    TaskState(task, "prune").start()
+
+    assert task.status == "pruning"
+    assert "interrupted run" not in caplog.text
+
+
+def test_finish_keeps_status_if_history_fails(mock_db, mocker: MockerFixture):
+    mock_db["tasks"]["t"] = task = make_task()
+    mocker.patch(
+        "peerstash.core.task_state.db_finish_task", side_effect=Exception("no table")
+    )
+    state = TaskState(task, "backup")
+    state.start()
+
+    state.finish(3)
+
+    assert task.status == "idle"
+    assert task.last_exit_code == 3
+
+
+def test_run_backup_commits_twice(
+    mock_db, mock_daemon_and_locks, mock_restic, mock_subprocess, mocker: MockerFixture
+):
+    schedule_backup(paths=["/test"], peer="node1", name="t")
+    mock_db["tasks"]["t"].status = "idle"
+    mock_update = mocker.spy(task_state, "db_update_task")
+    mock_finish = mocker.spy(task_state, "db_finish_task")
+
+    run_backup("t")
+
+    assert mock_update.call_count == 1
+    assert mock_finish.call_count == 1
+
+
+def test_run_backup_records_spans(
+    mock_db, mock_daemon_and_locks, mock_restic, mock_subprocess, caplog
+):
+    schedule_backup(paths=["/test"], peer="node1", name="t")
+    mock_db["tasks"]["t"].status = "idle"
+
+    with caplog.at_level("DEBUG"):
+        run_backup("t")
+
+    spans = mock_db["task_runs"][-1].spans
+    assert [s["name"] for s in spans] == ["lock", "space_check", "upload", "check"]
+    upload = spans[2]["children"][0]
+    assert upload["name"] == "restic backup"
+    assert upload["attrs"]["data_added"] == 1048576
+    assert upload["attrs"]["total_files_processed"] == 10
+    assert spans[3]["children"][0]["name"] == "restic check"
+    assert "[t] backup" in caplog.text
+    assert "[t]     restic backup" in caplog.text
@@ -1,16 +1,21 @@
+import json
 import subprocess
+from datetime import datetime
 from unittest.mock import MagicMock, mock_open
 
 import pytest
 from pytest_mock import MockerFixture
 
+from peerstash.core.ipc import HEADER
 from peerstash.core.utils import (Retention, acquire_task_lock,
                                   gen_restic_pass, generate_sha1,
-                                  get_disk_usage, get_file_content,
-                                  release_lock, send_to_daemon, sizeof_fmt,
-                                  update_crontab, validate_paths,
-                                  validate_retention, validate_schedule,
-                                  validate_task_name, verify_sudo_password)
+                                  get_file_content, next_fire_time,
+                                  prev_fire_time,
+                                  release_lock, send_batch_to_daemon,
+                                  send_to_daemon, sizeof_fmt,
+                                  validate_paths, validate_retention,
+                                  validate_schedule, validate_task_name,
+                                  verify_sudo_password)
 
 # --- Pure Functions & String Manipulation ---
 
@@ -102,23 +107,6 @@ def test_get_file_content_missing(mocker: MockerFixture):
     assert get_file_content("/test/path") is None
 
 
-def test_get_disk_usage_success(mocker: MockerFixture):
-    mock_run = mocker.patch("subprocess.run")
-    # Simulate the raw output of `df` returning KiB blocks: Total, Used, Available
-    mock_run.return_value.stdout = "1000 300 700"
-
-    total, used, free = get_disk_usage("alice", "host", 2022)
-    assert total == 1024000  # 1000 * 1024
-    assert used == 307200  # 300 * 1024
-    assert free == 716800  # 700 * 1024
-
-
-def test_get_disk_usage_failure(mocker: MockerFixture):
-    mocker.patch("subprocess.run", side_effect=subprocess.CalledProcessError(1, "sftp"))
-    with pytest.raises(RuntimeError, match="Could not get quota"):
-        get_disk_usage("alice", "host", 2022)
-
-
 def test_verify_sudo_password_success(mocker: MockerFixture):
     mock_run = mocker.patch("subprocess.run")
     verify_sudo_password("correct_pass")
@@ -144,29 +132,35 @@ def test_gen_restic_pass(mocker: MockerFixture):
     mock_chmod.assert_called_once_with(mocker.ANY, 0o400)
 
 
-def test_update_crontab_success(mocker: MockerFixture):
-    mock_run = mocker.patch("subprocess.run")
-    # Simulate existing crontab with one unrelated job and one peerstash job
-    mock_run.return_value.stdout = "0 0 * * * unrelated_job\n0 4 * * * peerstash backup my_task 10"
-    mock_run.return_value.returncode = 0
+def test_next_fire_time():
+    after = datetime(2026, 3, 4, 12, 30)  # a Wednesday
 
-    success, msg = update_crontab("my_task", ["0 5 * * * new_job"])
+    assert next_fire_time("0 3 * * *", after) == datetime(2026, 3, 5, 3, 0)
+    assert next_fire_time("*/15 * * * *", after) == datetime(2026, 3, 4, 12, 45)
+    # Sundays only
+    assert next_fire_time("0 4 * * 0", after) == datetime(2026, 3, 8, 4, 0)
+    # the start time itself is excluded
+    assert next_fire_time("30 12 * * *", after) == datetime(2026, 3, 5, 12, 30)
+    # schedules that skip years still resolve
+    assert next_fire_time("0 0 29 2 *", after) == datetime(2028, 2, 29, 0, 0)
 
-    assert success is True
-    # Verify the second subprocess call (crontab -) passed the unrelated job + the new job
-    stdin_data = mock_run.call_args_list[1][1]["input"]
-    assert "unrelated_job" in stdin_data
-    assert "new_job" in stdin_data
-    assert "peerstash backup my_task" not in stdin_data
 
+def test_prev_fire_time():
+    before = datetime(2026, 3, 4, 12, 30)  # a Wednesday
+
+    assert prev_fire_time("0 3 * * *", before) == datetime(2026, 3, 4, 3, 0)
+    assert prev_fire_time("*/15 * * * *", before) == datetime(2026, 3, 4, 12, 30)
+    # Sundays only
+    assert prev_fire_time("0 4 * * 0", before) == datetime(2026, 3, 1, 4, 0)
+    assert prev_fire_time("0 23 * * *", before) == datetime(2026, 3, 3, 23, 0)
+    assert prev_fire_time("0 0 29 2 *", before) == datetime(2024, 2, 29, 0, 0)
+    with pytest.raises(ValueError):
+        prev_fire_time("invalid_cron", before)
 
-def test_update_crontab_failure(mocker: MockerFixture):
-    mocker.patch(
-        "subprocess.run", side_effect=subprocess.CalledProcessError(1, "crontab")
-    )
-    success, msg = update_crontab("my_task")
-    assert success is False
-    assert "Crontab update failed" in msg
+
+def test_next_fire_time_invalid():
+    with pytest.raises(ValueError):
+        next_fire_time("invalid_cron", datetime(2026, 3, 4))
 
 
 def test_acquire_and_release_lock(mocker: MockerFixture):
@@ -196,31 +190,94 @@ def test_acquire_lock_blocking(mocker: MockerFixture):
         acquire_task_lock("test_bkp")
 
 
+def test_acquire_lock_reentrant(mocker: MockerFixture):
+    mocker.patch("os.path.exists", return_value=True)
+    m_open = mock_open()
+    mocker.patch("builtins.open", m_open)
+    mock_flock = mocker.patch("fcntl.flock")
+
+    # a prune started by a backup reuses the backup's lock
+    outer = acquire_task_lock("test_bkp")
+    inner = acquire_task_lock("test_bkp")
+    assert inner is outer
+    assert mock_flock.call_count == 1
+
+    release_lock(inner)
+    m_open().close.assert_not_called()
+    release_lock(outer)
+    m_open().close.assert_called_once()
+
+
+def test_acquire_lock_waits_for_timeout(mocker: MockerFixture):
+    mocker.patch("os.path.exists", return_value=True)
+    mocker.patch("builtins.open", mock_open())
+    mocker.patch("fcntl.flock", side_effect=[BlockingIOError(), None, None])
+    mock_sleep = mocker.patch("time.sleep")
+
+    lock = acquire_task_lock("test_bkp", timeout=10)
+    mock_sleep.assert_called_once()
+    release_lock(lock)
+
+
+class FakeDaemonSocket:
+    """Answers each framed request with the given responses, echoing its id."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.buffer = b""
+
+    def connect(self, path):
+        pass
+
+    def sendall(self, data):
+        request = json.loads(data[HEADER.size:])
+        self.requests.append(request)
+        response = json.dumps({"id": request["id"], **self.responses.pop(0)}).encode()
+        self.buffer += HEADER.pack(len(response)) + response
+
+    def recv(self, size):
+        # hand out small chunks to exercise reassembly of frames
+        chunk, self.buffer = self.buffer[: min(size, 7)], self.buffer[min(size, 7):]
+        return chunk
+
+
 def test_send_to_daemon_success(mocker: MockerFixture):
     mock_socket = mocker.patch("socket.socket")
-    mock_client = MagicMock()
-    # Simulate daemon returning a valid JSON success response
-    mock_client.recv.return_value = b'{"status": "success", "message": "Done"}'
-    mock_socket.return_value.__enter__.return_value = mock_client
+    client = FakeDaemonSocket({"status": "success", "message": "Done"})
+    mock_socket.return_value.__enter__.return_value = client
 
     response = send_to_daemon("create_task", {"task_name": "test"})
 
     assert response["status"] == "success"
-    # Ensure payload was properly encoded and sent
-    sent_data = mock_client.sendall.call_args[0][0].decode("utf-8")
-    assert "create_task" in sent_data
+    assert client.requests[0]["action"] == "create_task"
+    assert client.requests[0]["kwargs"] == {"task_name": "test"}
 
 
 def test_send_to_daemon_error_response(mocker: MockerFixture):
     mock_socket = mocker.patch("socket.socket")
-    mock_client = MagicMock()
-    mock_client.recv.return_value = b'{"status": "error", "message": "Bad request"}'
-    mock_socket.return_value.__enter__.return_value = mock_client
+    client = FakeDaemonSocket({"status": "error", "message": "Bad request"})
+    mock_socket.return_value.__enter__.return_value = client
 
     with pytest.raises(RuntimeError, match="Daemon Error: Bad request"):
         send_to_daemon("create_task")
 
 
+def test_send_batch_to_daemon(mocker: MockerFixture):
+    mock_socket = mocker.patch("socket.socket")
+    results = [{"status": "success"}, {"status": "error", "message": "Invalid"}]
+    client = FakeDaemonSocket({"status": "success", "results": results})
+    mock_socket.return_value.__enter__.return_value = client
+
+    response = send_batch_to_daemon(
+        [("remove_task", {"task_name": "a"}), ("remove_task", {"task_name": "!"})]
+    )
+
+    assert response == results
+    assert client.requests[0]["action"] == "batch"
+    assert len(client.requests[0]["kwargs"]["requests"]) == 2
+
+
 def test_send_to_daemon_not_found(mocker: MockerFixture):
     mock_socket = mocker.patch("socket.socket")
     mock_socket.return_value.__enter__.side_effect = FileNotFoundError()
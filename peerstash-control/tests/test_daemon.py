@@ -0,0 +1,49 @@
+import socket
+
+import pytest
+from pytest_mock import MockerFixture
+
+from peerstash.daemon import PeerstashDaemonHandler, is_admin
+
+
+@pytest.fixture
+def handler():
+    # a handler for one end of a connection, without serving it
+    left, right = socket.socketpair()
+    handler = PeerstashDaemonHandler.__new__(PeerstashDaemonHandler)
+    handler.request = right
+    yield handler
+    left.close()
+    right.close()
+
+
+def test_is_admin(mocker: MockerFixture):
+    mocker.patch("peerstash.daemon.db_get_user", return_value="alice")
+    mocker.patch("peerstash.daemon.pwd.getpwnam").return_value.pw_uid = 1000
+
+    assert is_admin(0)
+    assert is_admin(1000)
+    assert not is_admin(1001)
+
+
+def test_run_command_refuses_other_users(handler, mocker: MockerFixture):
+    mocker.patch("peerstash.daemon.peer_uid", return_value=1001)
+    mocker.patch("peerstash.daemon.is_admin", return_value=False)
+    mock_run = mocker.patch("peerstash.daemon.run_cli")
+
+    response = handler.run_command(["backup", "t"])
+
+    assert response["status"] == "error"
+    mock_run.assert_not_called()
+
+
+def test_run_command_for_admin(handler, mocker: MockerFixture):
+    mocker.patch("peerstash.daemon.peer_uid", return_value=1000)
+    mocker.patch("peerstash.daemon.is_admin", return_value=True)
+    mocker.patch("peerstash.daemon.capture_output")
+    mock_run = mocker.patch("peerstash.daemon.run_cli", return_value=0)
+
+    response = handler.run_command(["backup", "t"])
+
+    assert response == {"status": "success", "exit_code": 0}
+    mock_run.assert_called_once_with(["backup", "t"])
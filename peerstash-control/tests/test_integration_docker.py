@@ -67,7 +67,7 @@ def run_boot_setup_script():
 def run_real_daemon(run_boot_setup_script):
     """
     Spins up the real peerstash daemon in the background so we can
-    test IPC socket communication and real crontab modification.
+    test IPC socket communication and task scheduling.
     Requires the setup script to run first to ensure the DB exists.
     """
     socket_path = "/var/run/peerstash.sock"
@@ -244,7 +244,7 @@ def test_db_get_tasks_for_host_query():
 
 
 def test_daemon_create_and_remove_task():
-    """Tests socket IPC and verifies the real Linux crontab gets modified."""
+    """Tests socket IPC and verifies the daemon schedules the task."""
     task_name = "daemon_int_task"
 
     # 1. Create a task via the daemon
@@ -258,22 +258,18 @@ def test_daemon_create_and_remove_task():
     )
     assert response["status"] == "success"
 
-    # 2. Verify it actually wrote to the system crontab
-    cron_result = subprocess.run(["crontab", "-l"], capture_output=True, text=True)
-    assert cron_result.returncode == 0
-    assert task_name in cron_result.stdout
-    assert "15 2 * * *" in cron_result.stdout
-    assert "30 3 * * *" in cron_result.stdout
+    # 2. Verify the daemon scheduled both jobs
+    jobs = send_to_daemon("list_jobs")["jobs"]
+    kinds = {j["kind"] for j in jobs if j["task_name"] == task_name}
+    assert kinds == {"backup", "prune"}
 
     # 3. Remove the task via the daemon
     response_remove = send_to_daemon("remove_task", {"task_name": task_name})
     assert response_remove["status"] == "success"
 
-    # 4. Verify it was scrubbed from the system crontab
-    cron_result_after = subprocess.run(
-        ["crontab", "-l"], capture_output=True, text=True
-    )
-    assert task_name not in cron_result_after.stdout
+    # 4. Verify it was removed from the schedule
+    jobs_after = send_to_daemon("list_jobs")["jobs"]
+    assert not any(j["task_name"] == task_name for j in jobs_after)
 
 
 def test_daemon_sync_hosts():
@@ -330,10 +326,9 @@ def test_e2e_schedule_and_remove():
     # Verify DB
     assert db_task_exists(task_name) is True
 
-    # Verify Crontab (via Daemon)
-    cron_result = subprocess.run(["crontab", "-l"], capture_output=True, text=True)
-    assert task_name in cron_result.stdout
-    assert "30 5 * * *" in cron_result.stdout
+    # Verify Schedule (via Daemon)
+    jobs = send_to_daemon("list_jobs")["jobs"]
+    assert any(j["task_name"] == task_name for j in jobs)
 
     # 2. Remove Schedule
     remove_schedule(task_name)
@@ -341,11 +336,9 @@ def test_e2e_schedule_and_remove():
     # Verify DB scrubbed
     assert db_task_exists(task_name) is False
 
-    # Verify Crontab scrubbed
-    cron_result_after = subprocess.run(
-        ["crontab", "-l"], capture_output=True, text=True
-    )
-    assert task_name not in cron_result_after.stdout
+    # Verify Schedule scrubbed
+    jobs_after = send_to_daemon("list_jobs")["jobs"]
+    assert not any(j["task_name"] == task_name for j in jobs_after)
 
 
 def test_sftpgo_api_key_generation():
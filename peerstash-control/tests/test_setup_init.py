@@ -0,0 +1,62 @@
+import os
+import sqlite3
+
+import pytest
+from pytest import MonkeyPatch
+from pytest_mock import MockerFixture
+
+import peerstash.core.backup as backup_mod
+import peerstash.setup as setup_mod
+from peerstash.core.db_migrations import MIGRATIONS, get_schema_version
+
+
+@pytest.fixture
+def mount_root(tmp_path, monkeypatch: MonkeyPatch, mocker: MockerFixture):
+    root = tmp_path / "peerstash_mnt"
+    root.mkdir()
+    monkeypatch.setattr(setup_mod, "MOUNT_ROOT", str(root))
+    monkeypatch.setattr(backup_mod, "MOUNT_ROOT", str(root))
+    # no fusermount here
+    mocker.patch("peerstash.core.backup.subprocess.run")
+    return root
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch: MonkeyPatch, mocker: MockerFixture):
+    path = str(tmp_path / "peerstash.db")
+    monkeypatch.setattr(setup_mod, "DB_PATH", path)
+    mocker.patch("peerstash.setup.os.chown")
+    mocker.patch("peerstash.setup.os.popen").return_value.read.return_value = "1000"
+    return path
+
+
+def test_unmount_stale_repos_skips_marker_files(mount_root):
+    # created by setup.sh before peerstash-init runs
+    for marker in (".nomedia", ".trackerignore", ".hidden"):
+        (mount_root / marker).touch()
+    (mount_root / "t").mkdir()
+
+    setup_mod._unmount_stale_repos()
+
+    assert sorted(os.listdir(mount_root)) == [".hidden", ".nomedia", ".trackerignore"]
+
+
+def test_unmount_stale_repos_failure_is_not_fatal(mount_root, mocker: MockerFixture):
+    (mount_root / "t").mkdir()
+    mocker.patch("peerstash.setup.unmount_task", side_effect=OSError("busy"))
+
+    setup_mod._unmount_stale_repos()
+
+
+def test_init_migrates_before_restoring(db_path, mocker: MockerFixture):
+    # a database of an older version
+    mock_migrate = mocker.patch("peerstash.setup.migrate", return_value=0)
+    setup_mod.init_db_and_restore()
+    mocker.stop(mock_migrate)
+    mocker.patch("peerstash.setup._restore_known_hosts", side_effect=OSError("no home"))
+
+    with pytest.raises(OSError, match="no home"):
+        setup_mod.init_db_and_restore()
+
+    with sqlite3.connect(db_path) as conn:
+        assert get_schema_version(conn) == len(MIGRATIONS)